@@ -0,0 +1,248 @@
+"""
+Annotate a recorded therapy session with per-frame emotion predictions
+
+The video is split into chunks that are processed in parallel, one
+EmotionAI instance per worker process. Writes a per-frame CSV and/or NPZ
+of probabilities and bounding boxes, plus an optional annotated video.
+
+Usage:
+    python annotate_video.py session.mp4 -o session_emotions --workers 4
+    python annotate_video.py session.mp4 -o session_emotions --annotated session_annotated.mp4
+"""
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from modules.frame import Frame
+from modules.labels import EMOTIONS
+
+_worker_ai = None
+
+
+def _get_ai(model_path, backend):
+    """One EmotionAI per worker process, created on first use"""
+    global _worker_ai
+    if _worker_ai is None:
+        # Parallelism comes from the process pool; keep each worker single-threaded
+        cv2.setNumThreads(1)
+        from modules.emotion_ai import EmotionAI
+        # Offline analysis: detect on every frame and never reuse cached crops
+        _worker_ai = EmotionAI(model_path=model_path, backend=backend, detect_every=1, gate_threshold=0)
+    return _worker_ai
+
+
+def _resolve_backend(model_path, backend):
+    """Run the backend selection once so workers don't all benchmark at the same time"""
+    ai = _get_ai(model_path, backend)
+    return ai.backend.name if ai.backend else backend
+
+
+def _process_chunk(task):
+    """
+    Classify frames [start, end) of the video
+
+    The smoother is warmed up on the frames just before `start` so chunk
+    boundaries don't reset the smoothed labels.
+    """
+    video_path, start, end, model_path, backend, segment_path = task
+    ai = _get_ai(model_path, backend)
+    ai.reset_smoothing()
+
+    warmup_start = max(0, start - ai.history_size)
+    capture = cv2.VideoCapture(video_path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, warmup_start)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    n = end - start
+    probs = np.zeros((n, len(EMOTIONS)), dtype=np.float32)
+    smoothed = np.zeros((n, len(EMOTIONS)), dtype=np.float32)
+    bboxes = np.full((n, 4), -1, dtype=np.int32)
+    faces = np.zeros(n, dtype=bool)
+    labels = np.full(n, -1, dtype=np.int8)
+    confidence = np.zeros(n, dtype=np.float32)
+
+    writer = None
+    started = time.perf_counter()
+    for index in range(warmup_start, end):
+        ret, image = capture.read()
+        if not ret:
+            break
+        # Video time, not processing time, drives track expiry and smoothing
+        frame = Frame(image, timestamp=index / fps, index=index)
+        result = ai.predict(frame)
+        i = index - start
+        if i < 0:
+            continue
+
+        if result['face_detected'] and result['probabilities']:
+            faces[i] = True
+            bboxes[i] = result['bbox']
+            probs[i] = [result['probabilities'][e] for e in EMOTIONS]
+            smoothed[i] = [result['smoothed_probabilities'][e] for e in EMOTIONS]
+            labels[i] = EMOTIONS.index(result['emotion'])
+            confidence[i] = result['confidence']
+        elif result['face_detected']:
+            faces[i] = True
+            bboxes[i] = result['bbox']
+
+        if segment_path:
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(segment_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+            writer.write(ai.draw_results(frame, result))
+
+    capture.release()
+    if writer is not None:
+        writer.release()
+    return {
+        'start': start,
+        'probs': probs,
+        'smoothed': smoothed,
+        'bboxes': bboxes,
+        'faces': faces,
+        'labels': labels,
+        'confidence': confidence,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def split_chunks(total_frames, workers, chunks_per_worker=4, min_chunk=100):
+    """Split [0, total_frames) into contiguous ranges, a few per worker for load balancing"""
+    n_chunks = max(1, min(workers * chunks_per_worker, total_frames // min_chunk))
+    bounds = np.linspace(0, total_frames, n_chunks + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def concat_segments(segments, output_path, fps, size):
+    """
+    Join annotated chunk videos, without re-encoding when ffmpeg is available
+
+    Raises:
+        IOError: No chunk produced a segment (no frame could be decoded)
+    """
+    segments = [s for s in segments if os.path.exists(s)]
+    if not segments:
+        raise IOError(f"No annotated frames to write to {output_path}: none of the video's frames could be decoded")
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_file = Path(segments[0]).with_name('segments.txt')
+        list_file.write_text(''.join(f"file '{Path(s).resolve()}'\n" for s in segments))
+        ret = subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                              '-i', str(list_file), '-c', 'copy', str(output_path)])
+        if ret.returncode == 0:
+            return
+        print("[WARN] ffmpeg concat failed, re-encoding with OpenCV")
+
+    writer = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for segment in segments:
+        capture = cv2.VideoCapture(segment)
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            writer.write(frame)
+        capture.release()
+    writer.release()
+
+
+def write_csv(path, results, fps):
+    with open(path, 'w', newline='') as f:
+        out = csv.writer(f)
+        out.writerow(['frame', 'time_s', 'face', 'x', 'y', 'w', 'h', 'emotion', 'confidence'] + EMOTIONS)
+        for i in range(len(results['faces'])):
+            label = results['labels'][i]
+            out.writerow(
+                [i, f"{i / fps:.3f}", int(results['faces'][i])]
+                + results['bboxes'][i].tolist()
+                + [EMOTIONS[label] if label >= 0 else '', f"{results['confidence'][i]:.4f}"]
+                + [f"{p:.4f}" for p in results['probs'][i]]
+            )
+
+
+def annotate(video_path, output_base, workers=None, model_path='models/mini_xception.tflite', backend='auto',
+             formats=('csv', 'npz'), annotated_path=None):
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        raise IOError(f"Could not open {video_path}")
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    capture.release()
+    if total <= 0:
+        raise IOError(f"{video_path} reports no frames")
+
+    workers = workers or os.cpu_count() or 1
+    chunks = split_chunks(total, workers)
+    print(f"[INFO] {video_path}: {total} frames at {fps:.1f} fps, {len(chunks)} chunks on {workers} workers")
+
+    temp_dir = tempfile.mkdtemp(prefix='neuropy_annotate_') if annotated_path else None
+    segments = [os.path.join(temp_dir, f"segment_{i:04d}.mp4") if temp_dir else None for i in range(len(chunks))]
+
+    started = time.perf_counter()
+    # spawn: TensorFlow and MediaPipe are not fork-safe
+    with mp.get_context('spawn').Pool(workers) as pool:
+        backend = pool.apply(_resolve_backend, (model_path, backend))
+        tasks = [(str(video_path), a, b, model_path, backend, seg) for (a, b), seg in zip(chunks, segments)]
+        parts = []
+        for part in pool.imap_unordered(_process_chunk, tasks):
+            parts.append(part)
+            print(f"[INFO] {len(parts)}/{len(tasks)} chunks done")
+    elapsed = time.perf_counter() - started
+
+    parts.sort(key=lambda p: p['start'])
+    keys = ('probs', 'smoothed', 'bboxes', 'faces', 'labels', 'confidence')
+    results = {key: np.concatenate([p[key] for p in parts]) for key in keys}
+    print(f"[OK] Processed {total} frames in {elapsed:.1f} s ({total / elapsed:.1f} frames/s, "
+          f"{total / fps / elapsed:.2f}x real time)")
+
+    output_base = Path(output_base)
+    if 'csv' in formats:
+        write_csv(output_base.with_suffix('.csv'), results, fps)
+        print(f"[OK] Wrote {output_base.with_suffix('.csv')}")
+    if 'npz' in formats:
+        np.savez_compressed(output_base.with_suffix('.npz'), emotions=np.array(EMOTIONS), fps=fps,
+                            frame=np.arange(total), **results)
+        print(f"[OK] Wrote {output_base.with_suffix('.npz')}")
+    if annotated_path:
+        try:
+            concat_segments(segments, annotated_path, fps, size)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        print(f"[OK] Wrote {annotated_path}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Annotate a recorded session with emotion predictions")
+    parser.add_argument('video')
+    parser.add_argument('-o', '--output', help="Output path without extension (defaults to the video name)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--format', default='csv,npz', help="Comma-separated: csv, npz")
+    parser.add_argument('--annotated', help="Also write an annotated video to this path")
+    parser.add_argument('--model', default='models/mini_xception.tflite')
+    parser.add_argument('--backend', default='auto')
+    args = parser.parse_args(argv)
+
+    output = args.output or str(Path(args.video).with_suffix(''))
+    try:
+        annotate(args.video, output, args.workers, args.model, args.backend,
+                 formats=[f.strip() for f in args.format.split(',') if f.strip()],
+                 annotated_path=args.annotated)
+    except IOError as e:
+        print(f"[ERROR] {e}")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
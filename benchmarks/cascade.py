@@ -0,0 +1,93 @@
+"""
+Accuracy and latency of confidence-cascaded inference
+
+Classifies the same face crops with the main model alone and with the
+cascade (cheap model first, main model only for uncertain faces), and
+reports the escalation rate, mean classification latency of both and how
+often the cascade's top-1 label agrees with the main model's. Sweep
+--margin / --confidence to pick thresholds for a device.
+
+Usage (from the repository root):
+    python -m benchmarks.cascade recordings/session1.mp4 --model "models/mini_xception ha.tflite"
+    python -m benchmarks.cascade faces/ --margin 0.3 --confidence 0.6
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+from modules.emotion_ai import EmotionAI
+from benchmarks.hot_path_allocations import collect_crops
+from benchmarks.paths import results_path
+
+
+def classify_all(ai, crops):
+    """Top-1 label index and classify_face() seconds per crop"""
+    labels, seconds = [], []
+    for face_roi in crops:
+        face = ai.preprocess_face_into(face_roi)
+        t0 = time.perf_counter()
+        preds = ai.classify_face(face, face_roi)
+        seconds.append(time.perf_counter() - t0)
+        labels.append(int(np.argmax(preds)))
+    return np.array(labels), np.array(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cascade vs single-model inference")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or folders of images")
+    parser.add_argument('--model', default='models/mini_xception.tflite', help="Main (escalation) model")
+    parser.add_argument('--cascade', default='auto', help="First-pass model path, or 'auto'")
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--margin', type=float, default=0.2)
+    parser.add_argument('--confidence', type=float, default=0.5)
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('-o', '--output', default=results_path('cascade_results.json'))
+    args = parser.parse_args(argv)
+
+    ai = EmotionAI(model_path=args.model, backend=args.backend, detect_every=1, gate_threshold=0,
+                   cascade=args.cascade, cascade_margin=args.margin, cascade_confidence=args.confidence)
+    if ai.cascade is None:
+        print("[ERROR] Cascade could not be set up for this model")
+        return 2
+    crops = collect_crops(ai, args.inputs, args.max_frames)
+    if not crops:
+        print("[ERROR] No faces found in the inputs")
+        return 2
+
+    cascade, ai.cascade = ai.cascade, None
+    classify_all(ai, crops[:10])  # Warm up
+    main_labels, main_seconds = classify_all(ai, crops)
+    ai.cascade = cascade
+    classify_all(ai, crops[:10])
+    cascade.runs = cascade.escalations = 0
+    cascade_labels, cascade_seconds = classify_all(ai, crops)
+    ai.cleanup()
+
+    stats = cascade.stats()
+    agreement = float(np.mean(main_labels == cascade_labels))
+    main_ms, cascade_ms = main_seconds.mean() * 1000.0, cascade_seconds.mean() * 1000.0
+    print(f"\n{len(crops)} faces, main {args.model}, first pass {stats['model']}")
+    print(f"escalation rate: {stats['escalation_rate']:.1%} (margin {args.margin}, confidence {args.confidence})")
+    print(f"mean latency: main only {main_ms:.3f} ms, cascade {cascade_ms:.3f} ms ({main_ms / cascade_ms:.2f}x)")
+    print(f"top-1 agreement with main only: {agreement:.1%}")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'faces': len(crops),
+            'model': args.model,
+            'first_pass': stats['model'],
+            'margin': args.margin,
+            'confidence': args.confidence,
+            'escalation_rate': stats['escalation_rate'],
+            'main_mean_ms': main_ms,
+            'cascade_mean_ms': cascade_ms,
+            'agreement': agreement
+        }, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
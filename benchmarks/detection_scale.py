@@ -0,0 +1,131 @@
+"""
+Face detection time and hit rate at different detection scales
+
+Runs EmotionAI.detect_faces over recorded videos or image folders once per
+detection scale and reports latency percentiles, the share of frames with
+a face, the faces found at scale 1.0 that were missed, and how well the
+mapped-back boxes agree with the scale 1.0 ones (mean best IoU).
+
+Usage (from the repository root):
+    python -m benchmarks.detection_scale recordings/session1.mp4 --scales 1 0.75 0.5 0.33 0.25
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+from modules.emotion_ai import EmotionAI
+from modules.frame import Frame
+from benchmarks.emotion_pipeline import iter_frames, percentiles
+from benchmarks.paths import results_path
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def run_scale(ai, frames, scale):
+    """
+    Detect on every frame at one scale
+
+    Each frame gets a fresh Frame so the downscale and color conversion are
+    part of the measured time, as they are live.
+
+    Returns:
+        (per-frame latencies in seconds, per-frame list of bboxes)
+    """
+    ai.detection_scale = scale
+    ai.detect_faces(Frame(frames[0]))  # Warm up MediaPipe at this input size
+    latencies, boxes = [], []
+    for image in frames:
+        frame = Frame(image)
+        start = time.perf_counter()
+        faces = ai.detect_faces(frame)
+        latencies.append(time.perf_counter() - start)
+        boxes.append([bbox for _, bbox in faces])
+    return latencies, boxes
+
+
+def match_reference(boxes, reference, min_iou=0.3):
+    """
+    Best IoU of every reference face against the faces found at this scale
+
+    Returns:
+        (IoUs of matched reference faces, number of reference faces missed)
+    """
+    overlaps, missed = [], 0
+    for found, expected in zip(boxes, reference):
+        for ref in expected:
+            best = max((iou(ref, b) for b in found), default=0.0)
+            if best >= min_iou:
+                overlaps.append(best)
+            else:
+                missed += 1
+    return overlaps, missed
+
+
+def run_benchmark(inputs, scales, max_frames=300):
+    frames = list(iter_frames(inputs, max_frames=max_frames))
+    if not frames:
+        return None
+    ai = EmotionAI(detect_every=1, gate_threshold=0)
+    reference = None
+    results = {'frames': len(frames), 'frame_size': list(frames[0].shape[1::-1]), 'scales': {}}
+    # Scale 1.0 first: it is the reference for the agreement numbers
+    for scale in sorted(set(scales) | {1.0}, reverse=True):
+        latencies, boxes = run_scale(ai, frames, scale)
+        if reference is None:
+            reference = boxes
+        hits = [bool(b) for b in boxes]
+        overlaps, missed = match_reference(boxes, reference)
+        results['scales'][str(scale)] = {
+            'detect': percentiles(latencies),
+            'hit_rate': float(np.mean(hits)),
+            'missed_vs_full': missed,
+            'mean_iou_vs_full': float(np.mean(overlaps)) if overlaps else None,
+        }
+    ai.cleanup()
+    return results
+
+
+def print_report(results):
+    w, h = results['frame_size']
+    print(f"\nFrames: {results['frames']} at {w}x{h}")
+    print(f"{'scale':>7}{'size':>11}{'p50 ms':>9}{'p95 ms':>9}{'hit rate':>10}{'missed':>8}{'IoU':>7}")
+    for scale, r in results['scales'].items():
+        s = float(scale)
+        size = f"{round(w * s)}x{round(h * s)}"
+        iou_text = f"{r['mean_iou_vs_full']:.3f}" if r['mean_iou_vs_full'] is not None else '-'
+        print(f"{s:>7.2f}{size:>11}{r['detect']['p50_ms']:>9.2f}{r['detect']['p95_ms']:>9.2f}"
+              f"{r['hit_rate']:>10.1%}{r['missed_vs_full']:>8}{iou_text:>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face detection time and hit rate per detection scale")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or folders of images")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.75, 0.5, 0.375, 0.25])
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('-o', '--output', default=results_path('detection_scale_results.json'))
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.inputs, args.scales, args.max_frames)
+    if results is None:
+        print("[ERROR] No frames could be read from the inputs")
+        return 2
+    print_report(results)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Offline per-stage benchmark for the EmotionAI pipeline
+
+Drives EmotionAI from recorded videos or image folders (no camera needed)
+and reports per-stage latency percentiles, throughput, peak RSS and
+allocation volume. Results are written as JSON and can be compared with a
+saved baseline to flag regressions.
+
+Usage (from the repository root):
+    python -m benchmarks.emotion_pipeline recordings/session1.mp4 faces/ -o results.json
+    python -m benchmarks.emotion_pipeline recordings/session1.mp4 --baseline baseline.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from modules.emotion_ai import EmotionAI
+from modules.frame_source import open_source
+from benchmarks.paths import results_path
+
+STAGES = ['detect_face', 'preprocess_face', 'predict_emotion', 'smooth_prediction', 'draw_results']
+
+
+def iter_frames(inputs, max_frames=None):
+    """Yield BGR frames from video files and image folders, in order, as fast as possible"""
+    count = 0
+    for spec in inputs:
+        source = open_source(str(spec), realtime=False)
+        if not source.open():
+            print(f"[WARN] Could not open {spec}")
+            continue
+        try:
+            while True:
+                ret, frame = source.read()
+                if not ret:
+                    break
+                yield frame
+                count += 1
+                if max_frames and count >= max_frames:
+                    return
+        finally:
+            source.release()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if unavailable"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS reports bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def run_stages(ai, frame, call):
+    """
+    Run one frame through every stage
+
+    Args:
+        call: call(stage, fn, *args) wrapper that runs fn(*args) and may
+            record measurements for the stage
+
+    Returns:
+        The face ROI from detect_face (None when no face was found)
+    """
+    face_roi, bbox = call('detect_face', ai.detect_face, frame)
+    result = {'emotion': 'No Face', 'confidence': 0.0, 'probabilities': {}, 'bbox': None, 'face_detected': False}
+    if face_roi is not None:
+        preprocessed = call('preprocess_face', ai.preprocess_face, face_roi)
+        preds = call('predict_emotion', ai.classify_face, preprocessed)
+        result = {'emotion': 'Neutral', 'confidence': 0.0, 'probabilities': {}, 'bbox': bbox, 'face_detected': True}
+        if preds is not None:
+            emotion, confidence, _ = call('smooth_prediction', ai.smooth_prediction, preds)
+            result.update(emotion=emotion, confidence=confidence)
+    call('draw_results', ai.draw_results, frame, result)
+    return face_roi
+
+
+def _untimed(stage, fn, *args):
+    return fn(*args)
+
+
+class StageTimer:
+    """call() wrapper collecting per-stage wall-clock samples"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def __call__(self, stage, fn, *args):
+        start = time.perf_counter()
+        value = fn(*args)
+        self.samples[stage].append(time.perf_counter() - start)
+        return value
+
+
+class AllocationTracker:
+    """call() wrapper recording the tracemalloc peak and net blocks of each stage"""
+
+    def __init__(self):
+        self.peaks = {stage: [] for stage in STAGES}
+        self.blocks = {stage: 0 for stage in STAGES}
+
+    def __call__(self, stage, fn, *args):
+        before_blocks = sys.getallocatedblocks()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        value = fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        self.peaks[stage].append(peak - current)
+        self.blocks[stage] += sys.getallocatedblocks() - before_blocks
+        return value
+
+
+def percentiles(samples):
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    if ms.size == 0:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'count': int(ms.size), 'mean_ms': float(ms.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def measure_allocations(ai, frames):
+    """
+    Allocation volume per stage, measured in a separate pass because
+    tracemalloc slows everything down
+
+    Returns:
+        {stage: {'alloc_peak_bytes': mean tracemalloc peak per call (NumPy
+                 buffers included), 'retained_blocks': net blocks still
+                 alive after the pass}}
+    """
+    tracker = AllocationTracker()
+    tracemalloc.start()
+    try:
+        for frame in frames:
+            run_stages(ai, frame, tracker)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        stage: {
+            'alloc_peak_bytes': float(np.mean(tracker.peaks[stage])) if tracker.peaks[stage] else 0.0,
+            'retained_blocks': tracker.blocks[stage],
+        }
+        for stage in STAGES
+    }
+
+
+def run_benchmark(inputs, model_path='models/mini_xception.tflite', backend='auto', max_frames=None, alloc_frames=50):
+    ai = EmotionAI(model_path=model_path, backend=backend, detect_every=1, gate_threshold=0)
+    timer = StageTimer()
+    frames_seen = 0
+    faces = 0
+
+    # Warm up the detector and interpreter so first-call setup is not measured
+    for frame in iter_frames(inputs, max_frames=3):
+        run_stages(ai, frame, _untimed)
+    ai.reset_smoothing()
+
+    start = time.perf_counter()
+    for frame in iter_frames(inputs, max_frames=max_frames):
+        face_roi = run_stages(ai, frame, timer)
+        frames_seen += 1
+        faces += face_roi is not None
+    elapsed = time.perf_counter() - start
+
+    alloc_sample = list(iter_frames(inputs, max_frames=alloc_frames)) if alloc_frames else []
+    allocations = measure_allocations(ai, alloc_sample) if alloc_sample else {}
+    ai.cleanup()
+
+    return {
+        'meta': {
+            'inputs': [str(p) for p in inputs],
+            'model': str(model_path),
+            'backend': ai.backend.name if ai.backend else None,
+            'machine': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'frames': frames_seen,
+        'faces_detected': int(faces),
+        'throughput_fps': frames_seen / elapsed if elapsed > 0 else 0.0,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'stages': {stage: percentiles(timer.samples[stage]) for stage in STAGES},
+        'allocations': allocations,
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance=0.10):
+    """
+    Compare results against a baseline run
+
+    Returns:
+        List of human-readable regression messages (empty if none)
+    """
+    regressions = []
+    for stage, current in results['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous or 'p50_ms' not in previous or 'p50_ms' not in current:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if current[key] > previous[key] * (1.0 + tolerance):
+                regressions.append(f"{stage} {key}: {previous[key]:.2f} -> {current[key]:.2f}")
+
+    old_fps = baseline.get('throughput_fps')
+    if old_fps and results['throughput_fps'] < old_fps * (1.0 - tolerance):
+        regressions.append(f"throughput: {old_fps:.1f} -> {results['throughput_fps']:.1f} frames/s")
+
+    old_rss, new_rss = baseline.get('peak_rss_bytes'), results.get('peak_rss_bytes')
+    if old_rss and new_rss and new_rss > old_rss * (1.0 + tolerance):
+        regressions.append(f"peak RSS: {old_rss / 2**20:.1f} -> {new_rss / 2**20:.1f} MiB")
+    return regressions
+
+
+def print_report(results):
+    print(f"\nFrames: {results['frames']}  faces: {results['faces_detected']}  "
+          f"throughput: {results['throughput_fps']:.1f} frames/s")
+    if results['peak_rss_bytes']:
+        print(f"Peak RSS: {results['peak_rss_bytes'] / 2**20:.1f} MiB")
+    print(f"{'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'alloc KiB':>12}")
+    for stage, stats in results['stages'].items():
+        if not stats.get('count'):
+            continue
+        alloc = results['allocations'].get(stage, {}).get('alloc_peak_bytes', 0.0) / 1024.0
+        print(f"{stage:<20}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{alloc:>12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmark for EmotionAI")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or folders of images")
+    parser.add_argument('--model', default='models/mini_xception.tflite')
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--alloc-frames', type=int, default=50, help="Frames used for the allocation pass (0 to skip)")
+    parser.add_argument('-o', '--output', default=results_path('benchmark_results.json'))
+    parser.add_argument('--baseline', help="Previous results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.inputs, args.model, args.backend, args.max_frames, args.alloc_frames)
+    if not results['frames']:
+        print("[ERROR] No frames could be read from the inputs")
+        return 2
+    print_report(results)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[WARN] {len(regressions)} regression(s) vs {args.baseline}:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"[OK] No regressions vs {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
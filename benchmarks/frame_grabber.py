@@ -0,0 +1,101 @@
+"""
+Time the UI tick spends getting a frame: direct read vs FrameGrabber
+
+Simulates CameraCapture's clock tick at --fps against a real-time source
+(webcam index, or a recording paced like one). The direct mode calls
+read() on the tick, as CameraCapture does by default; the threaded mode
+only takes FrameGrabber.get_frame(). Reports per-tick acquisition time,
+how many distinct frames each mode delivered and the grabber's buffer use.
+
+Usage (from the repository root):
+    python -m benchmarks.frame_grabber recordings/session1.mp4 --seconds 10
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from modules.frame import Frame
+from modules.frame_grabber import FrameGrabber
+from modules.frame_source import open_source
+from benchmarks.paths import results_path
+
+
+def run_ticks(get_frame, fps, seconds):
+    """Call get_frame once per tick; returns per-tick seconds and distinct frames seen"""
+    ticks, last_index, frames = [], None, 0
+    interval = 1.0 / fps
+    end = time.monotonic() + seconds
+    next_tick = time.monotonic()
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        frame = get_frame()
+        ticks.append(time.perf_counter() - start)
+        if frame is not None and frame.index != last_index:
+            last_index = frame.index
+            frames += 1
+        next_tick += interval
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+    return ticks, frames
+
+
+def summarize(ticks, frames, seconds):
+    ms = np.asarray(ticks) * 1000.0
+    return {
+        'ticks': len(ticks),
+        'frames': frames,
+        'frames_per_second': frames / seconds,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'max_ms': float(ms.max())
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frame acquisition time on the UI tick: direct vs threaded")
+    parser.add_argument('input', help="Camera index, video file or folder of images")
+    parser.add_argument('--fps', type=float, default=30.0, help="UI tick rate")
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('-o', '--output', default=results_path('frame_grabber_results.json'))
+    args = parser.parse_args(argv)
+
+    source = open_source(args.input, realtime=True, loop=True, fps=30)
+    if not source.open():
+        print(f"[ERROR] Could not open {source.describe()}")
+        return 2
+
+    count = {'n': 0}
+
+    def read_direct():
+        ok, image = source.read()
+        if not ok:
+            return None
+        count['n'] += 1
+        return Frame(image, index=count['n'])
+
+    direct = summarize(*run_ticks(read_direct, args.fps, args.seconds), args.seconds)
+
+    grabber = FrameGrabber(source)
+    grabber.start()
+    threaded = summarize(*run_ticks(grabber.get_frame, args.fps, args.seconds), args.seconds)
+    grabber.stop()
+    grabber_stats = grabber.stats()
+    source.release()
+
+    print(f"\n{source.describe()}, UI tick {args.fps:.0f} Hz for {args.seconds:.0f} s")
+    print(f"{'mode':<10}{'ticks':>7}{'frames/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for name, r in (('direct', direct), ('threaded', threaded)):
+        print(f"{name:<10}{r['ticks']:>7}{r['frames_per_second']:>10.1f}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{r['max_ms']:>9.3f}")
+    print(f"grabber: {grabber_stats['buffers']} buffers ({grabber_stats['extra_buffers']} added), "
+          f"{grabber_stats['failures']} failed reads, read p50 {grabber_stats['read'].get('p50_ms', 0):.2f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump({'direct': direct, 'threaded': threaded, 'grabber': grabber_stats}, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
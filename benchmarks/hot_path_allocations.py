@@ -0,0 +1,130 @@
+"""
+Allocation check for the live single-face hot path
+
+Feeds face crops from recorded videos or image folders through the steps
+predict() runs per frame once the face is located (preprocess_face_into,
+the crop gate, classify_face, smooth_prediction) under tracemalloc, and
+compares them with the allocating batch path (preprocess_face + run()).
+
+NumPy reports its data buffers to tracemalloc, so an image or batch
+buffer allocated anywhere in a stage shows up in that stage's transient
+peak. The hot path passes when every stage stays within a small budget
+for Python object churn (view headers, scalars), i.e. no image or batch
+buffer is allocated per frame.
+
+Usage (from the repository root):
+    python -m benchmarks.hot_path_allocations recordings/session1.mp4 --model "models/mini_xception ha.tflite"
+"""
+import argparse
+import sys
+import tracemalloc
+import numpy as np
+
+from modules.emotion_ai import EmotionAI
+from benchmarks.emotion_pipeline import iter_frames
+
+# Transient bytes allowed per stage call for Python object churn (timing
+# floats, NumPy scalars, tensor() view headers: roughly 100-400 bytes). Any
+# image buffer is well above it: a 48x48 crop alone is 2304 bytes.
+HEADER_BUDGET = 512
+
+
+def collect_crops(ai, inputs, max_frames):
+    """Detect faces up front so detection is not part of the measurement"""
+    crops = []
+    for frame in iter_frames(inputs, max_frames=max_frames):
+        face_roi, _ = ai.detect_face(frame)
+        if face_roi is not None and face_roi.size:
+            crops.append(face_roi.copy())
+    return crops
+
+
+def hot_path(ai, face_roi):
+    """The per-frame steps of EmotionAI._predict_unlocked after locate_face()"""
+    yield 'preprocess'
+    crop = ai.preprocess_face_into(face_roi)
+    yield 'gate'
+    preds = ai.crop_gate.lookup(crop)
+    if preds is None:
+        yield 'invoke'
+        preds = ai.classify_face(crop)
+        yield 'gate'
+        ai.crop_gate.store(crop, preds)
+    yield 'smooth'
+    ai.smooth_prediction(preds)
+
+
+def batch_path(ai, face_roi):
+    """The allocating path used by the offline tools"""
+    yield 'preprocess'
+    batch = ai.preprocess_face(face_roi)
+    yield 'invoke'
+    ai.backend.run(batch)
+
+
+def measure(ai, crops, path):
+    """
+    Run path() on every crop under tracemalloc
+
+    Returns:
+        {stage: list of transient peak bytes per call}
+    """
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for face_roi in crops:
+            steps = path(ai, face_roi)
+            stage = next(steps, None)
+            while stage is not None:
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                next_stage = next(steps, None)
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.setdefault(stage, []).append(peak - current)
+                stage = next_stage
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the live inference hot path does not allocate")
+    parser.add_argument('inputs', nargs='+', help="Video files and/or folders of images")
+    parser.add_argument('--model', default='models/mini_xception.tflite')
+    parser.add_argument('--backend', default='tflite')
+    parser.add_argument('--max-frames', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    # Gate disabled so every frame reaches the model
+    ai = EmotionAI(model_path=args.model, backend=args.backend, detect_every=1, gate_threshold=0, instrument=False)
+    crops = collect_crops(ai, args.inputs, args.max_frames)
+    if not crops:
+        print("[ERROR] No faces found in the inputs")
+        return 2
+
+    # Warm up so lazily created buffers and interpreter state are not counted
+    for path in (batch_path, hot_path):
+        for face_roi in crops[:3]:
+            for _ in path(ai, face_roi):
+                pass
+
+    print(f"\n{len(crops)} face crops, {ai.backend.name} backend, {ai.input_size}x{ai.input_size} input")
+    print(f"{'path':<8}{'stage':<12}{'mean B':>10}{'max B':>10}")
+    failed = []
+    for name, path in (('batch', batch_path), ('hot', hot_path)):
+        for stage, peaks in measure(ai, crops, path).items():
+            worst = max(peaks)
+            print(f"{name:<8}{stage:<12}{np.mean(peaks):>10.0f}{worst:>10d}")
+            if name == 'hot' and worst > HEADER_BUDGET:
+                failed.append(stage)
+    ai.cleanup()
+
+    if failed:
+        print(f"[WARN] Hot path allocates NumPy buffers in: {', '.join(failed)}")
+        return 1
+    print(f"[OK] Hot path is allocation-free (no stage above {HEADER_BUDGET} transient bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
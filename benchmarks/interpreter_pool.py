@@ -0,0 +1,107 @@
+"""
+Inference throughput of a BackendPool by pool size and thread count
+
+Worker threads check interpreters out of a pool and run batches of face
+crops for a fixed time; the table shows faces/s for each pool size, with
+one interpreter (everything serialized on it) as the baseline. Throughput
+should grow with the pool up to the number of cores.
+
+Usage (from the repository root):
+    python -m benchmarks.interpreter_pool --sizes 1 2 4 --batch 1
+    python -m benchmarks.interpreter_pool recordings/session1.mp4 --threads-per-interpreter 2 --no-xnnpack
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+from modules.backends import BackendPool
+from modules.preprocessing import preprocess_bgr_batch
+from benchmarks.emotion_pipeline import iter_frames
+from benchmarks.paths import results_path
+
+
+def load_faces(inputs, size, count, max_frames):
+    """Centre crops of recorded frames, or random faces without inputs, preprocessed to size x size"""
+    frames = list(iter_frames(inputs, max_frames=max_frames)) if inputs else []
+    if not frames:
+        rng = np.random.default_rng(0)
+        return rng.integers(0, 256, size=(count, size, size, 1), dtype=np.uint8)
+    crops = []
+    for frame in frames:
+        h, w = frame.shape[:2]
+        side = min(h, w) // 2
+        crops.append(frame[(h - side) // 2:(h + side) // 2, (w - side) // 2:(w + side) // 2])
+    return preprocess_bgr_batch(crops, size)
+
+
+def run_pool(pool, faces, batch, workers, seconds):
+    """Faces classified per second by `workers` threads sharing the pool"""
+    counts = [0] * workers
+    deadline = time.monotonic() + seconds
+
+    def work(i):
+        offset = i
+        while time.monotonic() < deadline:
+            idx = np.arange(offset, offset + batch) % len(faces)
+            backend = pool.checkout()
+            try:
+                backend.run(faces[idx])
+            finally:
+                pool.checkin(backend)
+            counts[i] += batch
+            offset += batch * workers
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Interpreter pool throughput")
+    parser.add_argument('inputs', nargs='*', help="Video files and/or folders of images (default: random faces)")
+    parser.add_argument('--model', default='models/mini_xception.tflite')
+    parser.add_argument('--backend', default='tflite', choices=['tflite', 'tflite_runtime'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=None, help="Pool sizes (default: 1 up to the core count)")
+    parser.add_argument('--threads-per-interpreter', type=int, default=1)
+    parser.add_argument('--no-xnnpack', action='store_true')
+    parser.add_argument('--batch', type=int, default=1, help="Faces per run() call")
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--max-frames', type=int, default=100)
+    parser.add_argument('-o', '--output', default=results_path('interpreter_pool_results.json'))
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    sizes = args.sizes or sorted({1, 2, cores // 2, cores} - {0})
+    results = []
+    faces = None
+    print(f"\nCPUs: {cores}  batch: {args.batch}  threads/interpreter: {args.threads_per_interpreter}  "
+          f"XNNPACK: {'off' if args.no_xnnpack else 'on'}")
+    print(f"{'pool':>6}{'faces/s':>12}{'speedup':>10}")
+    for size in sizes:
+        pool = BackendPool(args.model, size, args.backend, num_threads=args.threads_per_interpreter,
+                           xnnpack=not args.no_xnnpack)
+        if faces is None:
+            faces = load_faces(args.inputs, pool.input_size, 64, args.max_frames)
+        run_pool(pool, faces, args.batch, size, 0.3)  # Warm up every member
+        rate = run_pool(pool, faces, args.batch, size, args.seconds)
+        pool.close()
+        results.append({'size': size, 'faces_per_second': rate})
+        print(f"{size:>6}{rate:>12.0f}{rate / results[0]['faces_per_second']:>9.2f}x")
+
+    with open(args.output, 'w') as f:
+        json.dump({'cpus': cores, 'batch': args.batch, 'threads_per_interpreter': args.threads_per_interpreter,
+                   'xnnpack': not args.no_xnnpack, 'results': results}, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,11 @@
+"""Where the benchmarks write their result files by default"""
+from pathlib import Path
+
+# Git-ignored, so benchmark runs from the repository root leave the tree clean
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def results_path(name):
+    """Default -o path: benchmarks/results/<name>, creating the folder if needed"""
+    RESULTS_DIR.mkdir(exist_ok=True)
+    return str(RESULTS_DIR / name)
@@ -0,0 +1,119 @@
+"""
+Serial vs staged (capture -> detect -> classify) throughput
+
+Runs the same recording through EmotionAI.predict() in a plain loop and
+through EmotionPipeline, then reports frames/s for both plus the
+pipeline's per-stage latency, queue depths and drops. The 'block' policy
+processes every frame (a fair throughput comparison); 'drop_oldest'
+shows how many frames live use would skip.
+
+Usage (from the repository root):
+    python -m benchmarks.pipeline_throughput recordings/session1.mp4 --policy block
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from modules.emotion_ai import EmotionAI
+from modules.frame import Frame
+from modules.frame_source import FrameSource, open_source
+from modules.pipeline import EmotionPipeline
+from benchmarks.emotion_pipeline import iter_frames
+from benchmarks.paths import results_path
+
+
+def run_serial(ai, inputs, max_frames):
+    count = 0
+    start = time.perf_counter()
+    for image in iter_frames(inputs, max_frames=max_frames):
+        ai.predict(Frame(image))
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def run_pipelined(ai, spec, max_frames, queue_size, policy):
+    results = []
+    source = _Limited(open_source(str(spec), realtime=False), max_frames)
+    pipeline = EmotionPipeline(ai, source, callback=results.append, queue_size=queue_size, policy=policy)
+    start = time.perf_counter()
+    if not pipeline.start():
+        return 0, 0.0, {}
+    pipeline.wait()
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    pipeline.stop()
+    return len(results), elapsed, stats
+
+
+class _Limited(FrameSource):
+    """Wraps a FrameSource so it ends after max_frames reads"""
+
+    def __init__(self, source, max_frames):
+        self.source = source
+        self.max_frames = max_frames
+        self.realtime = source.realtime
+        self.count = 0
+
+    def open(self):
+        return self.source.open()
+
+    def read(self, out=None):
+        if self.max_frames and self.count >= self.max_frames:
+            return False, None
+        self.count += 1
+        return self.source.read(out)
+
+    def release(self):
+        self.source.release()
+
+    def describe(self):
+        return self.source.describe()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serial vs staged pipeline throughput")
+    parser.add_argument('input', help="Video file or folder of images")
+    parser.add_argument('--model', default='models/mini_xception.tflite')
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--queue-size', type=int, default=2)
+    parser.add_argument('--policy', default='block', choices=['block', 'drop_oldest'])
+    parser.add_argument('--detect-every', type=int, default=1)
+    parser.add_argument('-o', '--output', default=results_path('pipeline_results.json'))
+    args = parser.parse_args(argv)
+
+    ai = EmotionAI(model_path=args.model, backend=args.backend, detect_every=args.detect_every)
+    run_serial(ai, [args.input], 5)  # Warm up detector and interpreter
+
+    ai.reset_smoothing()
+    serial_frames, serial_seconds = run_serial(ai, [args.input], args.max_frames)
+    ai.reset_smoothing()
+    ai.face_tracker.reset()
+    piped_frames, piped_seconds, stats = run_pipelined(ai, args.input, args.max_frames, args.queue_size, args.policy)
+    ai.cleanup()
+    if not serial_frames or not piped_seconds:
+        print("[ERROR] No frames could be read from the input")
+        return 2
+
+    serial_fps = serial_frames / serial_seconds
+    piped_fps = piped_frames / piped_seconds
+    print(f"\nCPUs: {os.cpu_count()}  policy: {args.policy}  queue size: {args.queue_size}")
+    print(f"serial:    {serial_frames} frames, {serial_fps:.1f} frames/s")
+    print(f"pipelined: {piped_frames} results, {piped_fps:.1f} results/s ({piped_fps / serial_fps:.2f}x)")
+    print(f"{'stage':<10}{'processed':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, s in stats['stages'].items():
+        if s.get('count'):
+            print(f"{name:<10}{s['processed']:>10}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}")
+    for name, q in stats['queues'].items():
+        print(f"queue {name}: max depth {q['max_depth']}/{q['capacity']}, dropped {q['dropped']}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'serial_fps': serial_fps, 'pipelined_fps': piped_fps, 'pipeline': stats}, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
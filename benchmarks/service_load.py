@@ -0,0 +1,133 @@
+"""
+Load test for the shared emotion inference service
+
+Starts N client threads, each with its own connection, that send face
+crops ('classify') or whole frames ('predict') as fast as the service
+answers, then reports request throughput, client round-trip latency and
+the service's own queue-time and batch-size statistics. Frames come from
+recordings or image folders; without inputs, synthetic crops are sent, so
+no camera is needed either way.
+
+Usage (from the repository root, with emotion_service.py running):
+    python -m benchmarks.service_load --clients 4 --seconds 10
+    python -m benchmarks.service_load recordings/session1.mp4 --mode predict --clients 3
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import numpy as np
+
+from modules.inference_service import DEFAULT_ADDRESS, EmotionServiceClient
+from benchmarks.emotion_pipeline import iter_frames
+from benchmarks.paths import results_path
+
+
+def load_payloads(inputs, mode, max_frames):
+    """Frames (predict mode) or face-sized crops (classify mode) to send"""
+    frames = list(iter_frames(inputs, max_frames=max_frames)) if inputs else []
+    if mode == 'predict':
+        return frames
+    if frames:
+        # Centre crops stand in for detected faces
+        crops = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            side = min(h, w) // 2
+            crops.append(np.ascontiguousarray(frame[(h - side) // 2:(h + side) // 2, (w - side) // 2:(w + side) // 2]))
+        return crops
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (120, 120, 3), dtype=np.uint8) for _ in range(32)]
+
+
+def run_client(address, payloads, mode, crops_per_request, deadline, out):
+    client = EmotionServiceClient(address)
+    latencies, faces, errors = [], 0, 0
+    i = 0
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        try:
+            if mode == 'predict':
+                results = client.predict_faces(payloads[i % len(payloads)])
+            else:
+                results = client.classify([payloads[(i + k) % len(payloads)] for k in range(crops_per_request)])
+        except (OSError, EOFError, RuntimeError) as e:
+            errors += 1
+            print(f"[WARN] Request failed: {e}")
+            time.sleep(0.5)
+            continue
+        latencies.append(time.perf_counter() - t0)
+        # A face without probabilities is the service's fallback for a failed batch
+        failed = sum(1 for r in results if not r.get('probabilities'))
+        if failed:
+            errors += 1
+        faces += len(results) - failed
+        i += 1
+    client.cleanup()
+    out.append({'latencies': latencies, 'faces': faces, 'errors': errors})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the emotion inference service")
+    parser.add_argument('inputs', nargs='*', help="Video files and/or folders of images (default: synthetic crops)")
+    parser.add_argument('--address', default=DEFAULT_ADDRESS)
+    parser.add_argument('--mode', default='classify', choices=['classify', 'predict'])
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--crops-per-request', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--max-frames', type=int, default=100)
+    parser.add_argument('-o', '--output', default=results_path('service_load_results.json'))
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads(args.inputs, args.mode, args.max_frames)
+    if not payloads:
+        print("[ERROR] No frames could be read from the inputs")
+        return 2
+
+    out = []
+    deadline = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=run_client, args=(args.address, payloads, args.mode,
+                                                          args.crops_per_request, deadline, out))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([x for r in out for x in r['latencies']]) * 1000.0
+    if not len(latencies):
+        print("[ERROR] No request succeeded; is emotion_service.py running?")
+        return 2
+    service = EmotionServiceClient(args.address)
+    stats = service.service_stats()
+    service.cleanup()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"\n{args.clients} clients, {args.mode} mode, {elapsed:.1f} s")
+    print(f"requests: {len(latencies)} ({len(latencies) / elapsed:.1f}/s), "
+          f"faces: {sum(r['faces'] for r in out)}, errors: {sum(r['errors'] for r in out)}")
+    print(f"round trip ms: p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}")
+    queue = stats['queue']
+    if queue.get('count'):
+        print(f"service queue ms: p50 {queue['p50_ms']:.2f}  p95 {queue['p95_ms']:.2f}")
+    print(f"service batches: {stats['batches']}, mean size {stats['mean_batch_size']:.2f}, "
+          f"sizes {stats['batch_sizes']}")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'clients': args.clients,
+            'mode': args.mode,
+            'seconds': elapsed,
+            'requests_per_second': len(latencies) / elapsed,
+            'round_trip_ms': {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)},
+            'service': stats
+        }, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Shared emotion inference service for several kiosks on one machine
+
+Loads TensorFlow/MediaPipe once and serves EmotionAI over a Unix or TCP
+socket, batching concurrent requests (see modules/inference_service.py).
+Kiosks connect with NEUROPY_INFERENCE_SERVICE=<address>; both sides must
+share NEUROPY_SERVICE_KEY, which is required for TCP addresses.
+
+Usage:
+    python emotion_service.py --address unix:/tmp/neuropy-emotion.sock
+    NEUROPY_SERVICE_KEY=<secret> python emotion_service.py --address tcp:127.0.0.1:6000 --max-batch 8 --max-wait-ms 10
+    python emotion_service.py --workers 4 --interpreters 4   # 4-core device
+"""
+import argparse
+import sys
+
+from modules.inference_service import DEFAULT_ADDRESS, EmotionInferenceService, parse_address, service_authkey
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared emotion inference service")
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="unix:/path, tcp:host:port or host:port")
+    parser.add_argument('--model', default='models/mini_xception.tflite')
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--max-batch', type=int, default=8, help="Most faces per model invocation")
+    parser.add_argument('--max-wait-ms', type=float, default=10.0,
+                        help="How long a request may wait for others to join its batch")
+    parser.add_argument('--workers', type=int, default=1, help="Batches classified concurrently")
+    parser.add_argument('--interpreters', type=int, default=None,
+                        help="Pooled interpreters for batched inference (default: one per worker)")
+    parser.add_argument('--threads', type=int, default=1, help="Threads per pooled interpreter")
+    args = parser.parse_args(argv)
+    if args.interpreters is None:
+        args.interpreters = args.workers
+    elif args.interpreters < args.workers:
+        print(f"[WARN] {args.workers} workers share {args.interpreters} interpreter(s); their batches will take turns")
+
+    # Check the key before spending seconds loading the model
+    try:
+        authkey = service_authkey(parse_address(args.address))
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 2
+
+    from modules.emotion_ai import EmotionAI
+    # Requests from different kiosks are unrelated: no tracking or crop reuse across them
+    ai = EmotionAI(model_path=args.model, backend=args.backend, detect_every=1, gate_threshold=0,
+                   interpreters=args.interpreters, interpreter_threads=args.threads)
+    service = EmotionInferenceService(ai, args.address, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000.0,
+                                      authkey=authkey, workers=args.workers)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Stopping emotion service")
+    finally:
+        service.stop()
+        ai.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
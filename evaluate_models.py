@@ -0,0 +1,182 @@
+"""
+Evaluate the mini_xception model variants on a labeled face dataset
+
+Expects a FER-2013-style directory with one sub-folder per emotion
+(angry/, disgust/, fear/, happy/, neutral/, sad/, surprise/) containing
+face images. Images are preprocessed in vectorized batches with the same
+code EmotionAI uses, each model variant is evaluated in its own worker
+process, and accuracy, a confusion matrix and images/s are reported.
+
+Usage:
+    python evaluate_models.py datasets/fer2013/test
+    python evaluate_models.py datasets/fer2013/test --models "models/mini_xception ha.tflite" --save-accuracy
+"""
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.paths import results_path
+from modules.backends import available_backends, create_backend
+from modules.labels import EMOTIONS
+from modules.model_registry import ACCURACY_FILE
+from modules.preprocessing import preprocess_bgr_batch
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def load_dataset(root, limit_per_class=None):
+    """
+    Load every labeled image as BGR, as the camera delivers faces
+
+    Grayscale files (FER-2013) load with three equal channels, which the
+    shared preprocessing converts back to exactly their gray levels.
+
+    Returns:
+        (images, labels) - images is an (N, h, w, 3) uint8 array when all
+        images share a size (FER-2013 is 48x48), otherwise a list of BGR arrays
+    """
+    root = Path(root)
+    images, labels = [], []
+    for folder in sorted(p for p in root.iterdir() if p.is_dir()):
+        name = folder.name.capitalize()
+        if name not in EMOTIONS:
+            print(f"[WARN] Skipping unknown label folder {folder.name}")
+            continue
+        files = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        for path in files[:limit_per_class]:
+            image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append(image)
+                labels.append(EMOTIONS.index(name))
+
+    labels = np.asarray(labels, dtype=np.int64)
+    if images and all(img.shape == images[0].shape for img in images):
+        images = np.stack(images)
+    return images, labels
+
+
+def evaluate_model(model_path, backend_name, images, labels, batch_size=64):
+    """
+    Worker: run one model variant over the whole dataset in batches
+
+    Returns:
+        dict with accuracy, confusion matrix and timing for this variant
+    """
+    cv2.setNumThreads(1)
+    if backend_name:
+        backend = create_backend(backend_name, model_path)
+    else:
+        backend = available_backends(model_path)[0](model_path)
+    size = backend.input_size
+    n = len(labels)
+
+    predictions = np.empty(n, dtype=np.int64)
+    batch_buffer = np.empty((batch_size, size, size, 1), dtype=np.uint8)
+    preprocess_seconds = 0.0
+    inference_seconds = 0.0
+    for start in range(0, n, batch_size):
+        end = min(n, start + batch_size)
+        t0 = time.perf_counter()
+        batch = preprocess_bgr_batch(images[start:end], size, out=batch_buffer[:end - start])
+        t1 = time.perf_counter()
+        probs = backend.run(batch)[:, :len(EMOTIONS)]
+        t2 = time.perf_counter()
+        predictions[start:end] = np.argmax(probs, axis=1)
+        preprocess_seconds += t1 - t0
+        inference_seconds += t2 - t1
+    backend.close()
+
+    confusion = np.zeros((len(EMOTIONS), len(EMOTIONS)), dtype=np.int64)
+    np.add.at(confusion, (labels, predictions), 1)
+    total_seconds = preprocess_seconds + inference_seconds
+    return {
+        'model': str(model_path),
+        'backend': backend.name,
+        'input_size': size,
+        'images': n,
+        'accuracy': float(np.trace(confusion) / n) if n else 0.0,
+        'confusion': confusion.tolist(),
+        'preprocess_seconds': preprocess_seconds,
+        'inference_seconds': inference_seconds,
+        'images_per_second': n / total_seconds if total_seconds > 0 else 0.0,
+    }
+
+
+def print_confusion(confusion):
+    short = [e[:4] for e in EMOTIONS]
+    print("   true\\pred " + ''.join(f"{s:>6}" for s in short))
+    for name, row in zip(short, confusion):
+        print(f"   {name:<10}" + ''.join(f"{v:>6}" for v in row))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate mini_xception variants on a labeled dataset")
+    parser.add_argument('dataset', help="Directory with one sub-folder per emotion")
+    parser.add_argument('--models', nargs='*', help="Model files (default: every variant in models/)")
+    parser.add_argument('--backend', default=None, help="Force a backend name (default: first available)")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per model)")
+    parser.add_argument('--limit', type=int, default=None, help="Max images per class")
+    parser.add_argument('-o', '--output', default=results_path('evaluation_results.json'))
+    parser.add_argument('--save-accuracy', action='store_true',
+                        help=f"Record accuracies in models/{ACCURACY_FILE} for ModelRegistry")
+    args = parser.parse_args(argv)
+
+    models = [Path(m) for m in args.models] if args.models else \
+        [p for p in sorted(Path('models').glob('*')) if p.is_file() and available_backends(p)]
+    if not models:
+        print("[ERROR] No model variants found")
+        return 2
+
+    images, labels = load_dataset(args.dataset, args.limit)
+    if not len(labels):
+        print(f"[ERROR] No labeled images found in {args.dataset}")
+        return 2
+    print(f"[INFO] {len(labels)} images, {len(models)} model variants")
+
+    # spawn: TensorFlow is not fork-safe
+    workers = args.workers or len(models)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool:
+        futures = [pool.submit(evaluate_model, str(m), args.backend, images, labels, args.batch_size) for m in models]
+        results = []
+        for model, future in zip(models, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"[ERROR] {model.name}: {e}")
+
+    print(f"\n{'model':<28}{'backend':<16}{'input':>6}{'accuracy':>10}{'images/s':>11}")
+    for r in results:
+        print(f"{Path(r['model']).name:<28}{r['backend']:<16}{r['input_size']:>6}"
+              f"{r['accuracy']:>10.2%}{r['images_per_second']:>11.0f}")
+    for r in results:
+        print(f"\n{Path(r['model']).name}")
+        print_confusion(r['confusion'])
+
+    with open(args.output, 'w') as f:
+        json.dump({'dataset': str(args.dataset), 'emotions': EMOTIONS, 'results': results}, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+
+    if args.save_accuracy:
+        accuracy_path = Path('models') / ACCURACY_FILE
+        try:
+            with open(accuracy_path) as f:
+                accuracy = json.load(f)
+        except (OSError, ValueError):
+            accuracy = {}
+        accuracy.update({Path(r['model']).name: r['accuracy'] for r in results})
+        with open(accuracy_path, 'w') as f:
+            json.dump(accuracy, f, indent=2)
+        print(f"[OK] Accuracies saved to {accuracy_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,8 +9,15 @@ from kivy.graphics import Color
 from kivy.utils import get_color_from_hex
 from kivy.clock import Clock
 from kivy.app import App
+import os
+import time
 
 from modules.camera import CameraCapture
+from modules.frame_source import open_source
+from modules.inference_process import InferenceProcess
+from modules.inference_service import EmotionServiceClient
+from modules.pipeline import EmotionPipeline
+from modules.rate_control import AdaptiveRateController
 
 class Confetti(BoxLayout):
     def __init__(self, **kwargs):
@@ -98,10 +105,29 @@ class EmotionSelectionScreen(Screen):
             container.add_widget(EmotionCard(emotion_name=name, emotion_emoji=emoji, emotion_color=color, emotion_image=img))
 
 class EmotionPracticeScreen(Screen):
+    # Inference interval while the camera reports a static scene
+    IDLE_INFERENCE_INTERVAL = 2.0
+    # Floors and ceilings for the adaptive display and inference rates
+    RATE_LIMITS = {
+        'min_camera_fps': 10,
+        'max_camera_fps': 30,
+        'min_inference_interval': 0.1,
+        'max_inference_interval': 1.0,
+    }
+    # Seconds between rate controller updates
+    RATE_UPDATE_INTERVAL = 1.0
+    # Face tracks must outlive the longest gap between two inferences, or
+    # every idle-mode frame would start a new track with empty smoothing
+    TRACK_MAX_AGE = 1.5 * max(IDLE_INFERENCE_INTERVAL, RATE_LIMITS['max_inference_interval'])
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.camera = None
+        self.pipeline = None
+        self.last_submit_time = 0.0
         self.emotion_update_event = None
+        self.rate_controller = AdaptiveRateController(**self.RATE_LIMITS)
+        self.rate_event = None
         self.target_emotion = None
         self.success_shown = False
         
@@ -117,19 +143,81 @@ class EmotionPracticeScreen(Screen):
         if self.camera is None:
             self.setup_camera()
         Clock.schedule_once(lambda dt: self.camera.start(), 0.5)
-        self.emotion_update_event = Clock.schedule_interval(self.update_emotion, 0.2)
+        self.rate_event = Clock.schedule_interval(self.adapt_rates, self.RATE_UPDATE_INTERVAL)
+        if self.pipeline is not None:
+            # Pipeline mode: capture, detection and classification run on their own threads
+            return
+        App.get_running_app().emotion_ai.start_async(self.provide_feedback)
+        self.emotion_update_event = Clock.schedule_interval(self.update_emotion, self.rate_controller.inference_interval)
     
     def setup_camera(self):
-        self.camera = CameraCapture(camera_index=0, fps=30)
+        # NEUROPY_FRAME_SOURCE=<video file or image folder> replays recordings instead of the webcam
+        frame_source = os.environ.get('NEUROPY_FRAME_SOURCE')
+        # NEUROPY_PIPELINE=1 runs capture -> detect -> classify as a staged pipeline; the camera widget only displays
+        emotion_ai = App.get_running_app().emotion_ai
+        if os.environ.get('NEUROPY_PIPELINE') == '1' and isinstance(emotion_ai, (InferenceProcess, EmotionServiceClient)):
+            print("[WARN] NEUROPY_PIPELINE needs in-process inference; ignored")
+        elif os.environ.get('NEUROPY_PIPELINE') == '1':
+            source = open_source(frame_source if frame_source is not None else 0, loop=True, fps=30)
+            controller = self.rate_controller
+            self.pipeline = EmotionPipeline(emotion_ai, source, callback=self.on_pipeline_result,
+                                            capture_fps=controller.camera_fps,
+                                            detect_interval=controller.inference_interval)
+            frame_source = self.pipeline.display_source()
+        # NEUROPY_THREADED_CAPTURE=1 reads the camera on a background thread; the pipeline already captures off the UI thread
+        threaded = os.environ.get('NEUROPY_THREADED_CAPTURE') == '1' and self.pipeline is None
+        self.camera = CameraCapture(camera_index=0, fps=self.rate_controller.camera_fps, frame_source=frame_source,
+                                    threaded_capture=threaded)
+        self.camera.bind(scene_active=self.on_scene_active)
         self.ids.camera_container.add_widget(self.camera)
     
+    def adapt_rates(self, dt):
+        """Let the rate controller retune the display and inference rates from what it measures"""
+        if self.pipeline is not None:
+            latency = self.pipeline.end_to_end.mean
+        else:
+            latency = App.get_running_app().emotion_ai.async_latency.mean
+        controller = self.rate_controller
+        if not controller.update(Clock.get_fps(), latency):
+            return
+        self.camera.set_fps(controller.camera_fps)
+        if self.pipeline is not None:
+            self.throttle_pipeline()
+        if self.emotion_update_event is not None:
+            self.emotion_update_event.cancel()
+            self.emotion_update_event = Clock.schedule_interval(self.update_emotion, controller.inference_interval)
+        print(f"[INFO] Rates: camera {controller.camera_fps} fps, inference every "
+              f"{controller.inference_interval:.2f} s ({controller.reason})")
+    
+    def on_pipeline_result(self, result):
+        # Called on the pipeline's classify thread; hop to the UI thread
+        Clock.schedule_once(lambda dt: self.provide_feedback(result) if self.pipeline.running else None)
+    
+    def throttle_pipeline(self):
+        """Apply the controller's rates, and the idle interval while the scene is static, to the pipeline"""
+        controller = self.rate_controller
+        interval = controller.inference_interval if self.camera.scene_active else self.IDLE_INFERENCE_INTERVAL
+        self.pipeline.set_rates(controller.camera_fps, interval)
+    
+    def on_scene_active(self, camera, active):
+        # Motion resumed: run inference right away instead of waiting for the idle tick
+        if self.pipeline is not None:
+            self.throttle_pipeline()
+            if active:
+                self.pipeline.detect_next()
+        elif active:
+            self.update_emotion(0)
+    
     def update_emotion(self, dt):
         if not self.camera or not self.camera.is_running: return
         frame = self.camera.get_frame()
         if frame is None: return
-        app = App.get_running_app()
-        result = app.emotion_ai.predict(frame)
-        self.provide_feedback(result)
+        now = time.monotonic()
+        if not self.camera.scene_active and now - self.last_submit_time < self.IDLE_INFERENCE_INTERVAL:
+            return
+        self.last_submit_time = now
+        # Inference runs on the EmotionAI worker; provide_feedback is called back on the UI thread
+        App.get_running_app().emotion_ai.submit_frame(frame)
     
     def provide_feedback(self, result):
         if not result['face_detected']:
@@ -156,6 +244,9 @@ class EmotionPracticeScreen(Screen):
     def go_back(self):
         self.camera.stop()
         if self.emotion_update_event: Clock.unschedule(self.emotion_update_event)
+        self.emotion_update_event = None
+        if self.rate_event: Clock.unschedule(self.rate_event)
+        App.get_running_app().emotion_ai.stop_async()
         App.get_running_app().root.current = 'games'
     
     def return_to_selection(self):
@@ -24,7 +24,8 @@ from pathlib import Path
 import win32com.client
 
 # Import modules and models
-from modules.emotion_ai import EmotionAI
+from modules.inference_process import InferenceProcess
+from modules.inference_service import EmotionServiceClient
 from models import init_db, Event, AACCategory, AACButton
 from games import GamesHubScreen, EmotionSelectionScreen, EmotionPracticeScreen, MemoryMatchScreen, RoutineGameScreen, SmartBubbleAppScreen, VisualRealLifeAppScreen
 
@@ -401,7 +402,16 @@ class AutismLearningHubApp(App):
         self.seed_data()
 
         # Modules
-        self.emotion_ai = EmotionAI()
+        # NEUROPY_INFERENCE_PROCESS=1 runs EmotionAI in a separate process so the UI never waits on (or crashes with) the model
+        # NEUROPY_INFERENCE_SERVICE=<address> sends frames to a shared emotion_service.py instead of loading the model here
+        if os.environ.get('NEUROPY_INFERENCE_SERVICE'):
+            self.emotion_ai = EmotionServiceClient(os.environ['NEUROPY_INFERENCE_SERVICE'])
+        elif os.environ.get('NEUROPY_INFERENCE_PROCESS') == '1':
+            self.emotion_ai = InferenceProcess(ai_kwargs={'track_max_age': EmotionPracticeScreen.TRACK_MAX_AGE})
+        else:
+            # Imported here: MediaPipe and TensorFlow are only needed when the model runs in this process
+            from modules.emotion_ai import EmotionAI
+            self.emotion_ai = EmotionAI(track_max_age=EmotionPracticeScreen.TRACK_MAX_AGE)
         
         # UI
         sm = ScreenManager()
@@ -419,6 +429,9 @@ class AutismLearningHubApp(App):
         
         return sm
 
+    def on_stop(self):
+        self.emotion_ai.cleanup()
+
     def seed_data(self):
         # ---------------------------------------------------------------
         # AAC CATEGORIES & BUTTONS
@@ -0,0 +1,607 @@
+import importlib.util
+import json
+import os
+import platform
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from pathlib import Path
+
+from modules.preprocessing import apply_input_lut, input_lut, preprocess_bgr_batch
+
+
+class InferenceBackend:
+    """
+    Common interface for the engines that can run a Mini-Xception model
+
+    Every backend takes an (N, H, W, 1) uint8 batch of preprocessed faces
+    and returns an (N, classes) float32 array of probabilities. The gray
+    levels are mapped to the model's input encoding (float scaling or
+    quantized integers) through input_lut, built once when the model loads.
+    """
+
+    name = None
+    suffixes = ()
+    reference = False  # Trusted engine for its model format; others are checked against it
+
+    def __init__(self, model_path):
+        self.model_path = Path(model_path)
+        self.input_shape = None  # (H, W, C)
+        self.input_dtype = np.uint8
+        self.input_quantization = (0.0, 0)  # (scale, zero_point); scale 0 = not quantized
+        self.input_lut = None  # Gray level -> input encoding, see _build_input_lut()
+
+    @classmethod
+    def available(cls):
+        """True if the engine this backend needs can be imported"""
+        return False
+
+    @classmethod
+    def supports(cls, model_path):
+        return Path(model_path).suffix.lower() in cls.suffixes
+
+    @property
+    def input_size(self):
+        return int(self.input_shape[0])
+
+    def _build_input_lut(self):
+        """Call once input_dtype and input_quantization are known"""
+        self.input_lut = input_lut(self.input_dtype, tuple(self.input_quantization))
+
+    def encode(self, batch, out=None):
+        """Map a uint8 batch to the model's input encoding (see preprocessing.input_lut)"""
+        return apply_input_lut(batch, self.input_lut, out)
+
+    def run(self, batch):
+        """
+        Run the model on a batch
+
+        Args:
+            batch: uint8 array of shape (N, H, W, 1)
+
+        Returns:
+            float32 array of shape (N, classes)
+        """
+        raise NotImplementedError
+
+    def run_single(self, face, out):
+        """
+        Run the model on one face and write the scores into a caller-owned buffer
+
+        Backends override this to avoid per-call allocations; the default
+        goes through run().
+
+        Args:
+            face: uint8 array of shape (1, H, W, 1)
+            out: float32 array, filled with the first len(out) class scores
+
+        Returns:
+            out
+        """
+        np.copyto(out, self.run(face)[0, :len(out)])
+        return out
+
+    def close(self):
+        pass
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter from the full TensorFlow package"""
+
+    name = 'tflite'
+    suffixes = ('.tflite',)
+    reference = True
+
+    def __init__(self, model_path, num_threads=None, xnnpack=True):
+        """
+        Args:
+            model_path: .tflite file
+            num_threads: Threads for the interpreter (and its XNNPACK
+                delegate); None lets TFLite decide
+            xnnpack: Apply the default XNNPACK delegate (False runs the
+                builtin kernels only)
+        """
+        super().__init__(model_path)
+        self.num_threads = num_threads
+        self.xnnpack = xnnpack
+        self.interpreter = self._create_interpreter(str(self.model_path), num_threads, xnnpack)
+        self.interpreter.allocate_tensors()
+        self._refresh_details()
+
+    @classmethod
+    def available(cls):
+        return _module_available('tensorflow')
+
+    def _create_interpreter(self, model_path, num_threads, xnnpack):
+        import tensorflow as tf
+        resolver = tf.lite.experimental.OpResolverType
+        return tf.lite.Interpreter(
+            model_path=model_path, num_threads=num_threads,
+            experimental_op_resolver_type=resolver.AUTO if xnnpack else resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+
+    def _refresh_details(self):
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        details = self.input_details[0]
+        self.input_shape = tuple(int(v) for v in details['shape'][1:])
+        self.input_dtype = details['dtype']
+        self.input_quantization = details['quantization']
+        self._build_input_lut()
+        # Accessors returning NumPy views of the interpreter's own tensor buffers
+        self._input_view = self.interpreter.tensor(details['index'])
+        self._output_view = self.interpreter.tensor(self.output_details[0]['index'])
+        self._output_quantization = self.output_details[0]['quantization']
+
+    def run(self, batch):
+        input_index = self.input_details[0]['index']
+        if self.input_details[0]['shape'][0] != len(batch):
+            # Resize the batch dimension so every face goes through one invoke()
+            self.interpreter.resize_tensor_input(input_index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self._refresh_details()
+        self.interpreter.set_tensor(input_index, self.encode(batch))
+        self.interpreter.invoke()
+        output = self.output_details[0]
+        preds = self.interpreter.get_tensor(output['index'])
+
+        # Quantized models emit integer scores; map them back to probabilities
+        scale, zero_point = output['quantization']
+        if scale:
+            return (preds.astype(np.float32) - zero_point) * scale
+        return preds.astype(np.float32, copy=False)
+
+    def run_single(self, face, out):
+        """
+        Allocation-free single-face inference
+
+        The face is encoded (input_lut) straight into the interpreter's
+        input tensor and the scores are dequantized straight from its output
+        tensor into `out`. The tensor() views are only held for the duration
+        of each statement: invoke() refuses to run while NumPy arrays still
+        reference the interpreter's buffers.
+        """
+        if self.input_details[0]['shape'][0] != 1:
+            # A batched run() resized the input; go back to a single face
+            self.interpreter.resize_tensor_input(self.input_details[0]['index'], (1,) + self.input_shape)
+            self.interpreter.allocate_tensors()
+            self._refresh_details()
+        self.encode(face, self._input_view())
+        self.interpreter.invoke()
+        np.copyto(out, self._output_view()[0, :len(out)])
+        scale, zero_point = self._output_quantization
+        if scale:
+            if zero_point:
+                out -= zero_point
+            out *= scale
+        return out
+
+
+class TFLiteRuntimeBackend(TFLiteBackend):
+    """Slim standalone TFLite runtime (tflite_runtime or ai_edge_litert), no TensorFlow import"""
+
+    name = 'tflite_runtime'
+    reference = False
+
+    @staticmethod
+    def _interpreter_module():
+        try:
+            import tflite_runtime.interpreter as interpreter
+        except ImportError:
+            import ai_edge_litert.interpreter as interpreter
+        return interpreter
+
+    @classmethod
+    def available(cls):
+        return _module_available('tflite_runtime', 'ai_edge_litert')
+
+    def _create_interpreter(self, model_path, num_threads, xnnpack):
+        module = self._interpreter_module()
+        resolver = module.OpResolverType
+        return module.Interpreter(
+            model_path=model_path, num_threads=num_threads,
+            experimental_op_resolver_type=resolver.AUTO if xnnpack else resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+
+
+class KerasBackend(InferenceBackend):
+    """Keras model from an .h5 file, called directly instead of through predict()"""
+
+    name = 'keras'
+    suffixes = ('.h5', '.keras')
+    reference = True
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(str(self.model_path), compile=False)
+        self.input_shape = tuple(int(v) for v in self.model.input_shape[1:])
+        self.input_dtype = np.float32
+        self._build_input_lut()
+
+    @classmethod
+    def available(cls):
+        return TFLiteBackend.available()
+
+    def run(self, batch):
+        # model(...) skips predict()'s per-call dataset/callback setup
+        return np.asarray(self.model(self.encode(batch), training=False), dtype=np.float32)
+
+
+class OpenCVDNNBackend(InferenceBackend):
+    """OpenCV DNN module (TFLite importer needs OpenCV >= 4.8, or an exported .onnx)"""
+
+    name = 'opencv_dnn'
+    suffixes = ('.tflite', '.onnx')
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        self.net = cv2.dnn.readNet(str(self.model_path))
+        self.input_dtype = np.float32
+        # Input shape is not exposed by cv2.dnn; take it from the TFLite header when possible
+        self.input_shape = _tflite_input_shape(self.model_path) or (48, 48, 1)
+        self._build_input_lut()
+        # cv2.dnn imports some graphs it then cannot run: fail here, where
+        # callers can pick another backend, rather than on the first face
+        self.run(np.zeros((1,) + self.input_shape, dtype=np.uint8))
+
+    @classmethod
+    def available(cls):
+        return hasattr(cv2, 'dnn') and hasattr(cv2.dnn, 'readNetFromTFLite')
+
+    def run(self, batch):
+        blob = np.ascontiguousarray(self.encode(batch).transpose(0, 3, 1, 2))  # NHWC -> NCHW
+        self.net.setInput(blob)
+        return np.asarray(self.net.forward(), dtype=np.float32).reshape(len(batch), -1)
+
+
+def _tflite_input_shape(model_path):
+    """
+    (H, W, C) input shape of a .tflite file, read from its flatbuffer
+
+    Walks Model.subgraphs[0] -> inputs[0] -> tensors[i].shape directly, so
+    no interpreter has to be built (or TensorFlow imported) for it.
+
+    Returns:
+        Tuple of ints, or None if the file is not a readable TFLite model
+    """
+    if Path(model_path).suffix.lower() != '.tflite':
+        return None
+    try:
+        data = Path(model_path).read_bytes()
+
+        def u32(pos):
+            return struct.unpack_from('<I', data, pos)[0]
+
+        def field(table, index):
+            """Position of a table field, or None if it is absent"""
+            vtable = table - struct.unpack_from('<i', data, table)[0]
+            entry = 4 + 2 * index
+            if entry >= struct.unpack_from('<H', data, vtable)[0]:
+                return None
+            offset = struct.unpack_from('<H', data, vtable + entry)[0]
+            return table + offset if offset else None
+
+        def vector(pos):
+            """(start, length) of the vector a field points to"""
+            start = pos + u32(pos)
+            return start + 4, u32(start)
+
+        def element_table(pos, i):
+            start, _ = vector(pos)
+            return start + 4 * i + u32(start + 4 * i)
+
+        model = u32(0)
+        subgraph = element_table(field(model, 2), 0)  # Model.subgraphs
+        inputs, _ = vector(field(subgraph, 1))  # SubGraph.inputs
+        tensor = element_table(field(subgraph, 0), struct.unpack_from('<i', data, inputs)[0])  # SubGraph.tensors
+        start, length = vector(field(tensor, 0))  # Tensor.shape
+        shape = struct.unpack_from(f'<{length}i', data, start)
+    except (OSError, TypeError, struct.error):
+        return None
+    return tuple(int(v) for v in shape[1:]) if len(shape) == 4 else None
+
+
+class BackendPool:
+    """
+    Several independent backends for one model, shared by worker threads
+
+    A TFLite interpreter must not be used by two threads at once, so one
+    interpreter serializes every caller. The pool preallocates `size`
+    backends; a thread checks one out, runs it and checks it back in, and
+    callers only wait when all of them are busy. run() also splits a
+    multi-face batch across idle members, so one large batch uses several
+    cores. invoke() releases the GIL, so pooled interpreters do run in
+    parallel.
+    """
+
+    def __init__(self, model_path, size=None, backend='tflite', num_threads=1, xnnpack=True):
+        """
+        Args:
+            model_path: Model file every member loads
+            size: Number of backends (default: one per CPU core)
+            backend: Backend name (a TFLite backend for the thread/XNNPACK options)
+            num_threads: Threads per interpreter; size x num_threads should
+                not exceed the core count
+            xnnpack: Use the XNNPACK delegate in every interpreter
+        """
+        self.model_path = Path(model_path)
+        self.size = max(1, int(size or os.cpu_count() or 1))
+        options = {'num_threads': num_threads, 'xnnpack': xnnpack} if backend in ('tflite', 'tflite_runtime') else {}
+        self.backends = [create_backend(backend, model_path, **options) for _ in range(self.size)]
+        self.name = self.backends[0].name
+        self.input_shape = self.backends[0].input_shape
+        self._idle = list(self.backends)
+        self._cond = threading.Condition()
+        self._executor = None
+        self.checkouts = 0
+        self.waits = 0  # Checkouts that found every member busy
+        self.max_in_use = 0
+
+    @property
+    def input_size(self):
+        return int(self.input_shape[0])
+
+    def checkout(self, timeout=None):
+        """
+        Take an idle backend, waiting for one if all are busy
+
+        Returns:
+            InferenceBackend, or None on timeout
+        """
+        with self._cond:
+            if not self._idle:
+                self.waits += 1
+                if not self._cond.wait_for(lambda: self._idle, timeout):
+                    return None
+            backend = self._idle.pop()
+            self.checkouts += 1
+            self.max_in_use = max(self.max_in_use, self.size - len(self._idle))
+            return backend
+
+    def checkin(self, backend):
+        with self._cond:
+            self._idle.append(backend)
+            self._cond.notify()
+
+    def run(self, batch):
+        """Backend.run() on a pooled member; batches larger than one are split across members"""
+        chunks = min(self.size, len(batch))
+        if chunks <= 1:
+            return self._run_on_member(batch)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='backend-pool')
+        parts = self._executor.map(self._run_on_member, np.array_split(batch, chunks))
+        return np.concatenate(list(parts))
+
+    def _run_on_member(self, batch):
+        backend = self.checkout()
+        try:
+            return backend.run(batch)
+        finally:
+            self.checkin(backend)
+
+    def run_single(self, face, out):
+        """Backend.run_single() on a pooled member"""
+        backend = self.checkout()
+        try:
+            return backend.run_single(face, out)
+        finally:
+            self.checkin(backend)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for backend in self.backends:
+            backend.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'in_use': self.size - len(self._idle),
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits
+            }
+
+
+# Preference order when several backends tie or no benchmark is run
+BACKENDS = [TFLiteRuntimeBackend, TFLiteBackend, OpenCVDNNBackend, KerasBackend]
+
+DEFAULT_CACHE_PATH = Path.home() / '.cache' / 'neuropy' / 'backends.json'
+
+# Real images the backends must agree on before one replaces the reference
+PARITY_IMAGE_DIRS = [Path(__file__).resolve().parent.parent / 'assets' / name for name in ('emotions', 'images')]
+
+
+def _module_available(*names):
+    """True if any of the top-level packages is installed, without importing it"""
+    return any(importlib.util.find_spec(name) is not None for name in names)
+
+
+def available_backends(model_path):
+    """Backend classes that are installed and can load this model file"""
+    return [b for b in BACKENDS if b.supports(model_path) and b.available()]
+
+
+def create_backend(name, model_path, **options):
+    """Instantiate a backend by name; options (e.g. num_threads) go to its constructor"""
+    for backend_class in BACKENDS:
+        if backend_class.name == name:
+            return backend_class(model_path, **options)
+    raise ValueError(f"Unknown inference backend '{name}', expected one of {[b.name for b in BACKENDS]}")
+
+
+def _cache_key(model_path):
+    """Cache entries are per machine and per model file version"""
+    stat = Path(model_path).stat()
+    return '|'.join([
+        platform.node(),
+        platform.machine(),
+        str(Path(model_path).resolve()),
+        str(stat.st_size),
+        str(int(stat.st_mtime)),
+    ])
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache_path, cache):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"[WARN] Could not write backend cache {cache_path}: {e}")
+
+
+def benchmark_backend(backend, batch, runs=20, warmup=3):
+    """
+    Time a backend on a batch
+
+    Returns:
+        (median latency in ms, output of the last run)
+    """
+    for _ in range(warmup):
+        preds = backend.run(batch)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        preds = backend.run(batch)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings)), preds
+
+
+def parity_batch(size, image_dirs=None):
+    """
+    Parity-check input: the repository's images, preprocessed like live crops
+
+    Random noise sits far from anything the model was trained on, so
+    engines can disagree on it while agreeing on faces (or the reverse).
+    Falls back to noise only when no image can be read.
+
+    Returns:
+        uint8 array of shape (N, size, size, 1)
+    """
+    images = []
+    for directory in image_dirs if image_dirs is not None else PARITY_IMAGE_DIRS:
+        for path in sorted(Path(directory).glob('*')):
+            image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append(image)
+    if not images:
+        print("[WARN] No parity images found; comparing backends on random input")
+        return np.random.default_rng(0).integers(0, 256, size=(8, size, size, 1), dtype=np.uint8)
+    return preprocess_bgr_batch(images, size)
+
+
+def top1_agreement(preds, reference):
+    """Fraction of rows whose top-1 class matches the reference (0.0 if the shapes differ)"""
+    if preds.shape != reference.shape:
+        return 0.0
+    return float(np.mean(np.argmax(preds, axis=1) == np.argmax(reference, axis=1)))
+
+
+def select_backend(model_path, cache_path=DEFAULT_CACHE_PATH, batch_size=1, runs=20, min_agreement=0.9,
+                   refresh=False):
+    """
+    Pick the fastest backend for a model on this machine
+
+    Every available backend is timed on the same batch. Its labels are
+    then checked against one designated reference engine (the backend
+    class marked `reference` for the model format: TensorFlow's own TFLite
+    interpreter, or Keras for .h5). The check runs the repository's images
+    (see parity_batch) and compares top-1 labels, not raw probabilities:
+    legitimate runtimes differ slightly in their kernels, so only a
+    backend whose labels disagree on more than (1 - min_agreement) of the
+    images is rejected. Without the reference engine installed, the first
+    backend that loads stands in for it. The decision is cached on disk.
+
+    Args:
+        model_path: Model file to load
+        cache_path: JSON file holding previous decisions
+        batch_size: Batch size of the timed benchmark input
+        runs: Timed runs per backend
+        min_agreement: Minimum fraction of parity images whose top-1 label
+            must match the reference
+        refresh: Ignore any cached decision and benchmark again
+
+    Returns:
+        A loaded InferenceBackend instance, or None if nothing can load the model
+    """
+    model_path = Path(model_path)
+    key = _cache_key(model_path)
+    cache = _load_cache(cache_path)
+    cached = cache.get(key)
+    if cached and not refresh:
+        # Only the cached engine is probed and imported
+        for backend_class in BACKENDS:
+            if backend_class.name == cached['backend'] and backend_class.supports(model_path) and backend_class.available():
+                try:
+                    print(f"[OK] Using cached backend choice: {cached['backend']}")
+                    return backend_class(model_path)
+                except Exception as e:
+                    print(f"[WARN] Cached backend {cached['backend']} failed to load: {e}")
+
+    candidates = available_backends(model_path)
+    if not candidates:
+        return None
+
+    if len(candidates) == 1:
+        return candidates[0](model_path)
+
+    # The reference loads first so every other backend is compared with it
+    candidates.sort(key=lambda backend_class: not backend_class.reference)
+    print(f"[BENCH] Benchmarking {len(candidates)} inference backends for {model_path.name}...")
+    rng = np.random.default_rng(0)
+    reference = None
+    batch = None
+    parity = None
+    results = {}
+    best, best_latency = None, None
+    for backend_class in candidates:
+        try:
+            backend = backend_class(model_path)
+            if batch is None:
+                batch = rng.integers(0, 256, size=(batch_size,) + backend.input_shape, dtype=np.uint8)
+                parity = parity_batch(backend.input_size)
+            latency, _ = benchmark_backend(backend, batch, runs=runs)
+            preds = backend.run(parity)
+        except Exception as e:
+            print(f"   {backend_class.name}: failed ({e})")
+            results[backend_class.name] = {'error': str(e)}
+            continue
+
+        if reference is None:
+            reference = preds
+            if not backend_class.reference:
+                print(f"   [WARN] No reference engine for {model_path.suffix} loaded; comparing against {backend_class.name}")
+        agreement = top1_agreement(preds, reference)
+        accepted = agreement >= min_agreement
+        results[backend_class.name] = {'latency_ms': latency, 'agreement': agreement, 'parity': accepted}
+        print(f"   {backend_class.name}: {latency:.2f} ms, top-1 agreement {agreement:.0%}"
+              f"{'' if accepted else ' (rejected: labels differ from the reference)'}")
+
+        if accepted and (best_latency is None or latency < best_latency):
+            if best is not None:
+                best.close()
+            best, best_latency = backend, latency
+        else:
+            backend.close()
+
+    if best is None:
+        return None
+
+    print(f"[OK] Selected backend: {best.name}")
+    cache[key] = {'backend': best.name, 'results': results}
+    _save_cache(cache_path, cache)
+    return best
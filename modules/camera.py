@@ -1,30 +1,83 @@
+import time
 import cv2
 import numpy as np
 from kivy.uix.image import Image
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
+from kivy.properties import BooleanProperty
+
+from modules.frame import Frame
+from modules.frame_grabber import FrameGrabber
+from modules.frame_source import open_source
 
 class CameraCapture(Image):
     """
     Camera capture widget using OpenCV
     Integrates with Kivy for display and provides frames for emotion detection
+    
+    Frames come from a FrameSource: the live camera by default, or a video
+    file / image folder for reproducible, camera-free runs.
+    
+    A cheap motion gate (frame differencing on a small grayscale copy) drives
+    `scene_active`: it turns False after `idle_timeout` seconds without motion,
+    which drops display updates to `idle_fps`, and flips back to True on the
+    first frame that moves. Consumers can bind to it to idle their own work.
+    
+    Each frame read is wrapped once in a Frame shared by the display and by
+    consumers of get_frame(), so color conversions and downscaled copies are
+    computed at most once per frame and never copied. get_frame() returns
+    that Frame; get_frame_array() returns the bare BGR array, as
+    get_frame() did before.
+    
+    With threaded_capture the source is read on a FrameGrabber thread into
+    preallocated buffers; the clock tick only picks up the newest frame, so
+    the UI never waits on camera I/O.
     """
     
-    def __init__(self, camera_index=0, fps=30, **kwargs):
+    # True while the scene is moving (or has moved within idle_timeout)
+    scene_active = BooleanProperty(True)
+    
+    # Size of the grayscale copy used for motion detection
+    MOTION_SIZE = (160, 120)
+    
+    def __init__(self, camera_index=0, fps=30, motion_threshold=4.0, idle_timeout=2.0, idle_fps=2,
+                 frame_source=None, threaded_capture=False, **kwargs):
         """
         Initialize camera capture
         
         Args:
             camera_index: Camera device index (0 for default camera)
             fps: Frames per second for capture
+            motion_threshold: Mean absolute gray-level difference between
+                consecutive frames that counts as motion
+            idle_timeout: Seconds without motion before the scene goes idle
+            idle_fps: Display update rate while the scene is idle
+            frame_source: Optional FrameSource, video file or image folder to
+                read instead of the camera (see modules.frame_source.open_source)
+            threaded_capture: Read frames on a background thread (FrameGrabber)
+                instead of on the Kivy clock
         """
         super().__init__(**kwargs)
         
         self.camera_index = camera_index
         self.fps = fps
-        self.capture = None
+        self.frame_source = frame_source  # Not `source`: that is Image's own property
+        self.capture = None  # Opened FrameSource
+        self.threaded_capture = threaded_capture
+        self.grabber = None
         self.is_running = False
         self.current_frame = None
+        self.frame_count = 0
+        
+        # Motion gate state
+        self.motion_threshold = motion_threshold
+        self.idle_timeout = idle_timeout
+        self.idle_fps = idle_fps
+        self.motion_level = 0.0
+        self.last_motion_time = 0.0
+        self._last_display_time = 0.0
+        self._prev_small = None
+        self._displayed_index = None
         
         # Allow stretch to fill widget
         self.allow_stretch = True
@@ -36,20 +89,21 @@ class CameraCapture(Image):
             return
         
         try:
-            # Open camera
-            self.capture = cv2.VideoCapture(self.camera_index)
+            # Open camera (or the replay source)
+            spec = self.frame_source if self.frame_source is not None else self.camera_index
+            self.capture = open_source(spec, loop=True, fps=self.fps)
             
-            if not self.capture.isOpened():
-                print(f"❌ Failed to open camera {self.camera_index}")
+            if not self.capture.open():
+                print(f"❌ Failed to open {self.capture.describe()}")
+                self.capture = None
                 return
             
-            # Set camera properties for better performance
-            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            self.capture.set(cv2.CAP_PROP_FPS, self.fps)
-            
             self.is_running = True
             
+            if self.threaded_capture:
+                self.grabber = FrameGrabber(self.capture)
+                self.grabber.start()
+            
             # Schedule frame updates
             Clock.schedule_interval(self.update_frame, 1.0 / self.fps)
             
@@ -68,21 +122,44 @@ class CameraCapture(Image):
             return
         
         try:
-            # Read frame
-            ret, frame = self.capture.read()
-            
-            if not ret:
-                print("❌ Failed to read frame from camera")
-                return
+            now = time.monotonic()
+            if self.grabber is not None:
+                # Newest frame from the grab thread; nothing to do if it has not moved on
+                frame = self.grabber.get_frame()
+                if frame is None or frame.index == self._displayed_index:
+                    return
+                self._displayed_index = frame.index
+                self.frame_count += 1
+            else:
+                # Read frame
+                ret, frame = self.capture.read()
+                
+                if not ret:
+                    print("❌ Failed to read frame from camera")
+                    return
+                
+                # Shared, read-only frame for display and emotion detection
+                if isinstance(frame, Frame):
+                    # Pipeline sources hand out their newest Frame on every read: a
+                    # repeat is no new frame for the motion gate or the frame count
+                    if frame.index == self._displayed_index:
+                        return
+                    self._displayed_index = frame.index
+                else:
+                    frame = Frame(frame, timestamp=now, index=self.frame_count)
+                self.frame_count += 1
+                self.current_frame = frame
             
-            # Store current frame for emotion detection
-            self.current_frame = frame.copy()
+            self._update_motion(frame, now)
             
-            # Convert BGR to RGB for Kivy display
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # While the scene is idle, only refresh the display at idle_fps
+            if not self.scene_active and now - self._last_display_time < 1.0 / self.idle_fps:
+                return
+            self._last_display_time = now
             
-            # Flip horizontally for mirror effect
-            rgb_frame = cv2.flip(rgb_frame, 1)
+            # Mirrored RGB for Kivy display; the unflipped RGB view it is
+            # derived from is reused by face detection
+            rgb_frame = frame.mirrored('rgb')
             
             # Convert to Kivy texture
             h, w = rgb_frame.shape[:2]
@@ -98,25 +175,89 @@ class CameraCapture(Image):
         except Exception as e:
             print(f"❌ Error updating frame: {e}")
     
+    def set_fps(self, fps):
+        """Change the capture/display rate, rescheduling the frame updates if running"""
+        if fps == self.fps:
+            return
+        self.fps = fps
+        if self.is_running:
+            Clock.unschedule(self.update_frame)
+            Clock.schedule_interval(self.update_frame, 1.0 / self.fps)
+    
+    def _update_motion(self, frame, now):
+        """Frame differencing on a downscaled grayscale view; updates scene_active"""
+        # Cached on the frame (and shared with the face tracker at the same size)
+        small = frame.view('gray', self.MOTION_SIZE)
+        prev, self._prev_small = self._prev_small, small
+        if prev is None:
+            self.last_motion_time = now
+            return
+        
+        self.motion_level = cv2.mean(cv2.absdiff(small, prev))[0]
+        
+        if self.motion_level >= self.motion_threshold:
+            self.last_motion_time = now
+            if not self.scene_active:
+                self.scene_active = True
+        elif self.scene_active and now - self.last_motion_time > self.idle_timeout:
+            self.scene_active = False
+    
     def get_frame(self):
         """
         Get current frame for processing
         
+        With threaded_capture this is the grabber's newest frame, handed out
+        without a copy; .timestamp and .index give its capture time and
+        sequence number.
+        
+        Changed: this used to return the BGR ndarray itself. Callers that
+        still need the array use get_frame_array() (or frame.bgr).
+        
         Returns:
-            frame: Current BGR frame (numpy array) or None
+            frame: Current Frame (read-only; .bgr is the BGR array) or None
         """
+        if self.grabber is not None:
+            return self.grabber.get_frame()
         return self.current_frame
     
+    def get_frame_array(self, copy=False):
+        """
+        Current frame as a BGR ndarray, as get_frame() returned it before Frames
+        
+        Args:
+            copy: Return a writable copy; without it the array is the shared,
+                read-only frame (copy it before drawing on it)
+        
+        Returns:
+            (H, W, 3) uint8 array or None
+        """
+        frame = self.get_frame()
+        if frame is None:
+            return None
+        return frame.bgr.copy() if copy else frame.bgr
+    
+    def capture_stats(self):
+        """FrameGrabber counters with threaded_capture, otherwise None"""
+        return self.grabber.stats() if self.grabber is not None else None
+    
     def stop(self):
         """Stop camera capture"""
         if not self.is_running:
             return
         
         self.is_running = False
+        self._prev_small = None
+        self._displayed_index = None
+        self.scene_active = True
         
         # Unschedule frame updates
         Clock.unschedule(self.update_frame)
         
+        # The grab thread must be gone before its source is released
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        
         # Release camera
         if self.capture:
             self.capture.release()
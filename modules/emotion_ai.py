@@ -1,9 +1,292 @@
+import threading
+import time
 import cv2
 import numpy as np
 import mediapipe as mp
-import tensorflow as tf
 from pathlib import Path
 
+from modules.backends import BackendPool, create_backend, select_backend
+from modules.face_tracks import FaceTrackManager
+from modules.frame import as_frame
+from modules.instrumentation import LatencyHistogram, PipelineStats
+from modules.labels import EMOTIONS
+from modules.preprocessing import preprocess_bgr_batch, preprocess_bgr_into
+from modules.smoothing import create_smoother
+
+
+class FaceTracker:
+    """
+    Cheap face tracker used between full MediaPipe detections
+    
+    Keeps a template of the last detected face on a downscaled grayscale
+    frame and relocates it with normalized cross-correlation inside a
+    search window around the previous position.
+    """
+    
+    def __init__(self, scale=0.25, search_margin=0.5, min_score=0.6):
+        """
+        Args:
+            scale: Downscale factor applied to frames before matching
+            search_margin: Search window padding, as a fraction of the bbox size
+            min_score: Match score below which the track is considered lost
+        """
+        self.scale = scale
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.template = None
+        self.bbox = None  # Last known (x, y, w, h) in full-resolution pixels
+        self.last_score = 0.0
+    
+    @property
+    def active(self):
+        return self.template is not None
+    
+    def _small_gray(self, frame):
+        # Shared with the camera's motion gate when the sizes match
+        return as_frame(frame).scaled(self.scale, 'gray')
+    
+    def init(self, frame, bbox):
+        """Start tracking the face at bbox (full-resolution pixels)"""
+        gray = self._small_gray(frame)
+        x, y, w, h = [int(round(v * self.scale)) for v in bbox]
+        template = gray[y:y+h, x:x+w]
+        if template.shape[0] < 4 or template.shape[1] < 4:
+            self.reset()
+            return
+        self.template = template.copy()
+        self.bbox = bbox
+        self.last_score = 1.0
+    
+    def update(self, frame):
+        """
+        Relocate the tracked face in a new frame
+        
+        Returns:
+            (bbox, score) - bbox is None when the match falls below min_score
+        """
+        if self.template is None:
+            return None, 0.0
+        
+        gray = self._small_gray(frame)
+        gh, gw = gray.shape
+        th, tw = self.template.shape
+        x, y = [int(round(v * self.scale)) for v in self.bbox[:2]]
+        
+        # Search window around the previous position, clipped to the frame
+        mx = int(tw * self.search_margin)
+        my = int(th * self.search_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(gw, x + tw + mx), min(gh, y + th + my)
+        if x1 - x0 < tw or y1 - y0 < th:
+            self.reset()
+            return None, 0.0
+        
+        scores = cv2.matchTemplate(gray[y0:y1, x0:x1], self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (bx, by) = cv2.minMaxLoc(scores)
+        self.last_score = float(score)
+        if score < self.min_score:
+            self.reset()
+            return None, self.last_score
+        
+        _, _, w, h = self.bbox
+        fh, fw = frame.shape[:2]
+        nx = min(max(0, int(round((x0 + bx) / self.scale))), max(0, fw - w))
+        ny = min(max(0, int(round((y0 + by) / self.scale))), max(0, fh - h))
+        self.bbox = (nx, ny, w, h)
+        return self.bbox, self.last_score
+    
+    def reset(self):
+        self.template = None
+        self.bbox = None
+
+
+class CropGate:
+    """
+    Change gate between preprocessing and inference
+    
+    Compares each preprocessed face crop with the last one that was actually
+    classified (mean absolute pixel difference) and hands back the cached
+    prediction while the crop stays below the threshold.
+    """
+    
+    def __init__(self, threshold=2.0, max_reuse=10):
+        """
+        Args:
+            threshold: Mean absolute difference (0-255 gray levels) under which
+                the cached prediction is reused; 0 disables the gate
+            max_reuse: Force a fresh inference after this many consecutive hits
+        """
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self._last_crop = None
+        self._diff = None
+        self._prediction = None
+        self._cached = None
+        self._reuse_count = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def lookup(self, crop):
+        """Return the cached prediction if crop is close enough to the last one, else None"""
+        if (self.threshold <= 0 or self._cached is None or crop is None
+                or crop.shape != self._last_crop.shape or self._reuse_count >= self.max_reuse):
+            self.misses += 1
+            return None
+        
+        cv2.absdiff(crop, self._last_crop, dst=self._diff)
+        diff = cv2.mean(self._diff.reshape(crop.shape[1:3]))[0]
+        if diff >= self.threshold:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._reuse_count += 1
+        return self._cached
+    
+    def store(self, crop, prediction):
+        """Remember the crop that produced prediction (both copied into reused buffers)"""
+        if crop is None:
+            return
+        if self._last_crop is None or self._last_crop.shape != crop.shape:
+            self._last_crop = np.empty_like(crop)
+            self._diff = np.empty_like(crop)
+        np.copyto(self._last_crop, crop)
+        if prediction is None:
+            self._cached = None
+        else:
+            # The prediction may live in a buffer the model overwrites on the next call
+            if self._prediction is None or self._prediction.shape != prediction.shape:
+                self._prediction = np.empty_like(prediction)
+            np.copyto(self._prediction, prediction)
+            self._cached = self._prediction
+        self._reuse_count = 0
+    
+    def reset(self):
+        self._cached = None
+        self._reuse_count = 0
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class ModelCascade:
+    """
+    Cheap first-pass model in front of the main one
+    
+    Every face goes through the small model first; its answer is kept when
+    the top-1 probability and the gap to the runner-up are both large
+    enough, and the face is escalated to the main model otherwise. Clear
+    faces (most frames) then only pay for the small model.
+    """
+    
+    def __init__(self, backend, num_classes, margin=0.2, min_confidence=0.5):
+        """
+        Args:
+            backend: InferenceBackend running the small model
+            num_classes: Number of leading scores to keep (len(EMOTIONS))
+            margin: Escalate when top-1 minus top-2 probability is below this
+            min_confidence: Escalate when the top-1 probability is below this
+        """
+        self.backend = backend
+        self.margin = margin
+        self.min_confidence = min_confidence
+        size = backend.input_size
+        self._face_buffer = np.zeros((1, size, size, 1), dtype=np.uint8)
+        self._scratch = np.empty((size, size, 3), dtype=np.uint8)
+        self._probs = np.zeros(num_classes, dtype=np.float32)
+        self.runs = 0
+        self.escalations = 0
+        self.latency = LatencyHistogram()  # Whole classification, escalation included
+    
+    def _fit(self, face, face_roi=None):
+        """
+        The face at the small model's input size
+        
+        The main model's preprocessed face is used as is when the sizes
+        match. Otherwise the face is preprocessed again from the original
+        crop; resampling the other model's input would lose detail (or
+        invent it). Without the crop, that input is resized as a fallback.
+        """
+        size = self._face_buffer.shape[1]
+        if face.shape[1] == size:
+            return face
+        if face_roi is not None:
+            preprocess_bgr_into(face_roi, self._face_buffer[0, :, :, 0], self._scratch)
+        else:
+            cv2.resize(face[0, :, :, 0], (size, size), dst=self._face_buffer[0, :, :, 0],
+                       interpolation=cv2.INTER_AREA)
+        return self._face_buffer
+    
+    def run(self, preprocessed_face, face_roi=None):
+        """
+        Small-model scores for one face
+        
+        Args:
+            preprocessed_face: (1, H, W, 1) input of the main model
+            face_roi: BGR crop it came from, preprocessed again when the
+                small model's input size differs
+        
+        Returns:
+            The reused probability buffer if the answer is confident,
+            None if the face should be escalated
+        """
+        self.runs += 1
+        probs = self.backend.run_single(self._fit(preprocessed_face, face_roi), self._probs)
+        # minMaxLoc reads the top two without the temporaries argmax()/max() allocate. It
+        # needs a row: OpenCV 4.x treats a 1-D array as a column and reports the index as y
+        row = probs.reshape(1, -1)
+        _, top, _, (idx, _) = cv2.minMaxLoc(row)
+        probs[idx] = -1.0
+        _, second, _, _ = cv2.minMaxLoc(row)
+        probs[idx] = top
+        if top >= self.min_confidence and top - second >= self.margin:
+            return probs
+        self.escalations += 1
+        return None
+    
+    def run_batch(self, batch, face_rois=None):
+        """
+        Small-model scores for a batch
+        
+        Args:
+            batch: (N, H, W, 1) input of the main model
+            face_rois: The N BGR crops it came from (see run())
+        
+        Returns:
+            ((N, num_classes) scores, boolean mask of rows to escalate)
+        """
+        size = self._face_buffer.shape[1]
+        if batch.shape[1] != size:
+            if face_rois is not None:
+                batch = preprocess_bgr_batch(face_rois, size)
+            else:
+                batch = np.stack([cv2.resize(face[:, :, 0], (size, size), interpolation=cv2.INTER_AREA)
+                                  for face in batch])[..., np.newaxis]
+        preds = self.backend.run(batch)[:, :len(self._probs)]
+        top2 = np.partition(preds, -2, axis=1)[:, -2:]
+        escalate = (top2[:, 1] < self.min_confidence) | (top2[:, 1] - top2[:, 0] < self.margin)
+        self.runs += len(preds)
+        self.escalations += int(escalate.sum())
+        return preds, escalate
+    
+    def close(self):
+        self.backend.close()
+    
+    def stats(self):
+        return {
+            'model': self.backend.model_path.name,
+            'runs': self.runs,
+            'escalations': self.escalations,
+            'escalation_rate': self.escalations / self.runs if self.runs else 0.0,
+            'latency': self.latency.snapshot()
+        }
+
+
 class EmotionAI:
     """
     Affective Mirror - Real-time emotion detection using MediaPipe and Mini-Xception
@@ -16,23 +299,53 @@ class EmotionAI:
     """
     
     # Emotion labels for FER-2013 dataset (7 emotions)
-    EMOTIONS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
+    EMOTIONS = EMOTIONS
     
-    def __init__(self, model_path='models/mini_xception.tflite'):
+    def __init__(self, model_path='models/mini_xception.tflite', detect_every=5, gate_threshold=2.0,
+                 smoothing='window', backend='auto', instrument=True, detection_scale=1.0,
+                 cascade=None, cascade_margin=0.2, cascade_confidence=0.5,
+                 interpreters=1, interpreter_threads=1, xnnpack=True, track_max_age=1.0):
         """
         Initialize the Emotion AI module
         
         Args:
             model_path: Path to the Mini-Xception TFLite model
+            detect_every: Run full face detection every N predict() calls and
+                track the face in between (1 = detect on every frame)
+            gate_threshold: Mean absolute crop difference below which the
+                previous prediction is reused (0 = always run the model)
+            smoothing: Temporal smoothing strategy ('window', 'ema' or 'hysteresis')
+            backend: Inference backend name ('tflite', 'tflite_runtime', 'keras',
+                'opencv_dnn'), or 'auto' to benchmark the available ones
+            instrument: Keep rolling per-stage timings and counters (see stats())
+            detection_scale: Run face detection on the frame downscaled by this
+                factor (e.g. 0.5); faces are still cropped from the full frame
+            cascade: Run a cheap model first and escalate to model_path only
+                for uncertain faces: 'auto' picks the smallest quantized
+                variant in models/, or pass a model path (None = off)
+            cascade_margin: Minimum top-1 minus top-2 probability for the
+                cheap model's answer to stand
+            cascade_confidence: Minimum top-1 probability for the same
+            interpreters: With more than 1, batched classification
+                (classify_faces, predict_all) runs on a BackendPool of this
+                many interpreters, so concurrent callers and large batches
+                use several cores; the single-face path keeps its own
+            interpreter_threads: Threads per pooled interpreter
+            xnnpack: Use the XNNPACK delegate in pooled interpreters
+            track_max_age: Seconds a face track (and its smoothing history)
+                survives without a match; keep it above the longest gap
+                between two predictions
         """
         self.model_path = Path(model_path)
-        self.interpreter = None
-        self.keras_model = None  # Fallback for H5 model
-        self.input_details = None
-        self.output_details = None
+        self.backend_name = backend
+        self.backend = None  # InferenceBackend running the model
         self.using_h5 = False  # Track which model type is loaded
         self.input_size = 48  # Default, will be updated from model
         
+        # Hot-path timings and counters, read with stats()
+        self.perf = PipelineStats(enabled=instrument)
+        self.overlay_enabled = False  # draw_results() renders fps and stage latencies
+        
         # Initialize MediaPipe Face Detection
         # min_detection_confidence: Lower for better detection on edge devices
         # model_selection: 0 for short-range (< 2m), 1 for full-range
@@ -41,91 +354,293 @@ class EmotionAI:
             min_detection_confidence=0.5,
             model_selection=0  # Short-range model (faster)
         )
+        # Short-range faces fill much of the frame and are found just as well at
+        # lower resolution; benchmarks/detection_scale.py measures the trade-off
+        self.detection_scale = detection_scale
+        
+        # Face tracking between full detections
+        self.detect_every = max(1, int(detect_every))
+        self.face_tracker = FaceTracker()
+        self._frames_since_detection = 0
+        self.detection_count = 0
+        self.track_count = 0
+        
+        # Skip inference on crops that barely changed since the last one
+        self.crop_gate = CropGate(threshold=gate_threshold)
         
         # Load TFLite model (or H5 as fallback)
+        self.interpreters = max(1, int(interpreters))
+        self.interpreter_threads = interpreter_threads
+        self.xnnpack = xnnpack
+        self.backend_pool = None  # BackendPool for batched inference, see _open_pool()
+        self._allocate_buffers()
         self._load_model()
+        self.backend_pool = self._open_pool(self.backend)
+        
+        # Optional cheap first-pass model (see ModelCascade)
+        self.cascade_spec = cascade
+        self.cascade_margin = cascade_margin
+        self.cascade_confidence = cascade_confidence
+        self.cascade = self._open_cascade() if cascade else None
         
-        # Cache for smoothing predictions
-        self.emotion_history = []
+        # Temporal smoothing over probability vectors
         self.history_size = 5  # Number of frames to average
+        self.smoother = create_smoother(smoothing, len(self.EMOTIONS), window=self.history_size)
+        
+        # Per-face tracks, each with its own smoother, so two children never share a history
+        self.face_tracks = FaceTrackManager(len(self.EMOTIONS), smoothing, window=self.history_size,
+                                            max_age=track_max_age)
+        
+        # Serializes predict() between the UI thread and the async worker
+        self._predict_lock = threading.Lock()
+        # TFLite interpreters are not thread-safe: callers outside predict()
+        # (the service's batcher threads) take turns on the single main and
+        # cascade interpreters; a BackendPool needs no lock
+        self._model_lock = threading.Lock()
+        
+        # Asynchronous inference: single-slot mailbox, latest frame wins
+        self._mailbox = None
+        self._mailbox_cond = threading.Condition()
+        self._worker = None
+        self._worker_stop = None  # Per-session stop token of the current worker
+        self._async_running = False
+        self._result_callback = None
+        self.submitted_frames = 0
+        self.processed_frames = 0
+        self.dropped_frames = 0  # Frames replaced in the mailbox before the worker got to them
+        self.async_latency = LatencyHistogram()  # Worker time per predict(), read by rate controllers
         
     def _load_model(self):
         """Load the TFLite Mini-Xception model (or H5 as fallback)"""
+        h5_path = Path("models/mini_xception.h5")
         try:
             # Try TFLite first
             if self.model_path.exists():
-                print(f"[LOAD] Loading TFLite model from {self.model_path}...")
-                self.interpreter = tf.lite.Interpreter(model_path=str(self.model_path))
-                self.interpreter.allocate_tensors()
-                
-                # Get input and output tensors
-                self.input_details = self.interpreter.get_input_details()
-                self.output_details = self.interpreter.get_output_details()
-                
-                # Get input size from model (height dimension)
-                input_shape = self.input_details[0]['shape']
-                self.input_size = input_shape[1]  # Assuming shape is [batch, height, width, channels]
-                
-                print(f"[OK] TFLite model loaded successfully")
-                print(f"   Input shape: {input_shape}")
-                print(f"   Expected input size: {self.input_size}x{self.input_size}")
-                print(f"   Output shape: {self.output_details[0]['shape']}")
-                return
-            
-            # Fallback to H5 if TFLite doesn't exist
-            h5_path = Path("models/mini_xception.h5")
-            if h5_path.exists():
+                path = self.model_path
+            elif h5_path.exists():
+                # Fallback to H5 if TFLite doesn't exist
                 print(f"[WARN] TFLite model not found, using H5 model as fallback...")
-                print(f"[LOAD] Loading H5 model from {h5_path}...")
-                
-                # Load Keras model without compiling
-                self.keras_model = tf.keras.models.load_model(str(h5_path), compile=False)
-                self.using_h5 = True
-                
-                # Get input size from model
-                input_shape = self.keras_model.input_shape
-                self.input_size = input_shape[1]  # Assuming shape is (None, height, width, channels)
-                
-                print(f"[OK] H5 model loaded successfully")
-                print(f"   Input shape: {input_shape}")
-                print(f"   Expected input size: {self.input_size}x{self.input_size}")
-                print(f"   Output shape: {self.keras_model.output_shape}")
-                print(f"   [TIP] Run 'python convert_model.py' to create TFLite model for better performance")
+                path = h5_path
+            else:
+                # No model found
+                print(f"[WARN] No model found!")
+                print(f"   TFLite: {self.model_path} - Not found")
+                print(f"   H5: {h5_path} - Not found")
+                print(f"   Please run 'python download_model.py' to download the model")
                 return
             
-            # No model found
-            print(f"[WARN] No model found!")
-            print(f"   TFLite: {self.model_path} - Not found")
-            print(f"   H5: {h5_path} - Not found")
-            print(f"   Please run 'python download_model.py' to download the model")
+            self._set_backend(self._open_backend(path))
             
         except Exception as e:
             print(f"[ERROR] Error loading model: {e}")
             import traceback
             traceback.print_exc()
-            self.interpreter = None
-            self.keras_model = None
+            self.backend = None
+    
+    def _open_backend(self, path):
+        """Load a model file with the configured backend (None if nothing can run it)"""
+        print(f"[LOAD] Loading model from {path}...")
+        if self.backend_name == 'auto':
+            backend = select_backend(path)
+        else:
+            try:
+                backend = create_backend(self.backend_name, path)
+            except Exception as e:
+                # Without a model every face would come back Neutral 0.0; use whatever can run it
+                print(f"[WARN] {self.backend_name} backend cannot run {path}: {e}")
+                print(f"   Falling back to automatic backend selection")
+                backend = select_backend(path)
+        if backend is None:
+            print(f"[WARN] No inference backend can run {path}")
+            return None
+        
+        print(f"[OK] Model loaded successfully ({backend.name} backend)")
+        print(f"   Input shape: {backend.input_shape}")
+        print(f"   Expected input size: {backend.input_size}x{backend.input_size}")
+        if backend.name == 'keras':
+            print(f"   [TIP] Run 'python convert_model.py' to create TFLite model for better performance")
+        return backend
+    
+    def _open_cascade(self):
+        """Load the cascade's first-pass model (None if there is no cheaper variant)"""
+        if self.backend is None:
+            return None
+        if self.cascade_spec == 'auto':
+            from modules.model_registry import ModelRegistry
+            variant = ModelRegistry(self.model_path.parent).cascade_variant(self.backend.model_path)
+            if variant is None:
+                print(f"[WARN] No quantized model faster than {self.backend.model_path.name}; cascade disabled")
+                return None
+            path = variant.path
+        else:
+            path = Path(self.cascade_spec)
+        try:
+            backend = self._open_backend(path)
+        except Exception as e:
+            print(f"[ERROR] Error loading cascade model: {e}")
+            return None
+        if backend is None:
+            return None
+        print(f"[OK] Cascade: {path.name} first, {self.backend.model_path.name} when unsure")
+        return ModelCascade(backend, len(self.EMOTIONS), self.cascade_margin, self.cascade_confidence)
+    
+    def _open_pool(self, backend):
+        """Pool of extra interpreters for the batched path (None when not configured or not TFLite)"""
+        if self.interpreters <= 1 or backend is None or backend.name not in ('tflite', 'tflite_runtime'):
+            return None
+        pool = BackendPool(backend.model_path, self.interpreters, backend.name,
+                           num_threads=self.interpreter_threads, xnnpack=self.xnnpack)
+        print(f"[OK] Interpreter pool: {pool.size} x {self.interpreter_threads} thread(s), "
+              f"XNNPACK {'on' if self.xnnpack else 'off'}")
+        return pool
+    
+    def _set_backend(self, backend):
+        self.backend = backend
+        if backend is not None:
+            self.using_h5 = backend.name == 'keras'
+            self.input_size = backend.input_size
+        self._allocate_buffers()
+    
+    def _allocate_buffers(self):
+        """Buffers reused every frame by preprocess_face_into() and classify_face()"""
+        size = self.input_size
+        self._face_buffer = np.zeros((1, size, size, 1), dtype=np.uint8)
+        self._face_scratch = np.zeros((size, size, 3), dtype=np.uint8)
+        self._probs = np.zeros(len(self.EMOTIONS), dtype=np.float32)
+    
+    def switch_model(self, model_path, backend=None):
+        """
+        Swap to another model variant without restarting the app
+        
+        The new model is loaded while the current one keeps serving
+        predict(); the swap itself happens under the predict lock.
+        
+        Args:
+            model_path: Model file, e.g. ModelRegistry.select(...).path
+            backend: Optional backend name; keeps the current setting if None
+            
+        Returns:
+            True if the new model is active, False if it failed to load
+        """
+        if backend is not None:
+            self.backend_name = backend
+        model_path = Path(model_path)
+        if not model_path.exists():
+            print(f"[WARN] Model not found: {model_path}")
+            return False
+        try:
+            new_backend = self._open_backend(model_path)
+        except Exception as e:
+            print(f"[ERROR] Error loading model: {e}")
+            return False
+        if new_backend is None:
+            return False
+        new_pool = self._open_pool(new_backend)
+        
+        with self._predict_lock:
+            previous, previous_pool = self.backend, self.backend_pool
+            self.model_path = model_path
+            self._set_backend(new_backend)
+            self.backend_pool = new_pool
+            # Cached crops and smoothed probabilities belong to the old model
+            self.crop_gate.reset()
+            self.reset_smoothing()
+        if previous is not None:
+            previous.close()
+        if previous_pool is not None:
+            previous_pool.close()
+        
+        if self.cascade_spec:
+            # The cheap model is picked relative to the main one
+            cascade = self._open_cascade()
+            with self._predict_lock:
+                previous_cascade, self.cascade = self.cascade, cascade
+            if previous_cascade is not None:
+                previous_cascade.close()
+        return True
     
     def detect_face(self, frame):
         
         if frame is None or frame.size == 0:
             return None, None
         
-        # Convert BGR to RGB for MediaPipe
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        perf = self.perf
+        t0 = time.perf_counter()
+        
+        # RGB view for MediaPipe, cached on the frame (shared with the display at full scale)
+        frame = as_frame(frame)
+        rgb_frame = self._detection_view(frame)
+        t1 = time.perf_counter()
+        perf.record('color_convert', t1 - t0)
         
         # Detect faces
         results = self.face_detection.process(rgb_frame)
+        t2 = time.perf_counter()
+        perf.record('detect', t2 - t1)
         
         if not results.detections:
             return None, None
         
         # Get the first (most confident) face detection
         detection = results.detections[0]
+        x, y, width, height = self._detection_to_bbox(detection, frame.shape)
+        
+        # Extract face ROI
+        face_roi = frame.crop((x, y, width, height))
+        perf.record('crop', time.perf_counter() - t2)
+        
+        return face_roi, (x, y, width, height)
+    
+    def detect_faces(self, frame):
+        """
+        Detect every face in the frame
+        
+        Args:
+            frame: BGR image or Frame
+            
+        Returns:
+            List of (face_roi, bbox) tuples, one per detection (empty if none)
+        """
+        if frame is None or frame.size == 0:
+            return []
+        
+        perf = self.perf
+        t0 = time.perf_counter()
+        frame = as_frame(frame)
+        rgb_frame = self._detection_view(frame)
+        t1 = time.perf_counter()
+        perf.record('color_convert', t1 - t0)
+        results = self.face_detection.process(rgb_frame)
+        t2 = time.perf_counter()
+        perf.record('detect', t2 - t1)
+        
+        if not results.detections:
+            return []
         
-        # Get bounding box
+        faces = []
+        for detection in results.detections:
+            x, y, width, height = self._detection_to_bbox(detection, frame.shape)
+            if width <= 0 or height <= 0:
+                continue
+            faces.append((frame.crop((x, y, width, height)), (x, y, width, height)))
+        perf.record('crop', time.perf_counter() - t2)
+        return faces
+    
+    def _detection_view(self, frame):
+        """RGB image MediaPipe runs on: the full frame, or a cached downscaled view"""
+        if self.detection_scale >= 1.0:
+            return frame.rgb
+        return frame.scaled(self.detection_scale, 'rgb')
+    
+    def _detection_to_bbox(self, detection, frame_shape):
+        """
+        Convert a MediaPipe detection to a padded (x, y, w, h) pixel box
+        
+        The detection's bounding box is relative, so passing the full frame's
+        shape maps a box found on a downscaled view back to full resolution.
+        """
         bboxC = detection.location_data.relative_bounding_box
-        h, w, _ = frame.shape
+        h, w = frame_shape[:2]
         
         # Convert relative coordinates to absolute pixels
         x = int(bboxC.xmin * w)
@@ -140,110 +655,513 @@ class EmotionAI:
         width = min(w - x, width + 2 * padding)
         height = min(h - y, height + 2 * padding)
         
-        # Extract face ROI
-        face_roi = frame[y:y+height, x:x+width]
-        
-        return face_roi, (x, y, width, height)
+        return x, y, width, height
 
     def preprocess_face(self, face_roi):
         """Preprocess face for Mini‑Xception model.
 
         Steps:
-        1. Convert to grayscale.
-        2. Resize to model's expected input size (dynamic based on loaded model).
+        1. Resize to model's expected input size (dynamic based on loaded model).
+        2. Convert to grayscale.
         3. Keep pixel values as uint8 (0‑255) for integer‑quantized TFLite model.
         4. Expand dimensions to (1, H, W, 1).
         """
         if face_roi is None or face_roi.size == 0:
             return None
-        gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-        target = (self.input_size, self.input_size)
-        resized = cv2.resize(gray, target, interpolation=cv2.INTER_AREA)
-        preprocessed = np.expand_dims(resized, axis=0)   # (1, H, W)
-        preprocessed = np.expand_dims(preprocessed, axis=-1)  # (1, H, W, 1)
-        return preprocessed.astype(np.uint8)
+        t0 = time.perf_counter()
+        preprocessed = preprocess_bgr_batch([face_roi], self.input_size)
+        self.perf.record('resize', time.perf_counter() - t0)
+        return preprocessed
 
-    def predict_emotion(self, preprocessed_face):
-        """Run inference and return (emotion, confidence, probabilities)."""
+    def preprocess_face_into(self, face_roi):
+        """
+        Allocation-free preprocess_face() for the live hot path
+        
+        Returns:
+            The reused (1, H, W, 1) uint8 input buffer (overwritten by the
+            next call), or None for an empty crop
+        """
+        if face_roi is None or face_roi.size == 0:
+            return None
+        t0 = time.perf_counter()
+        preprocess_bgr_into(face_roi, self._face_buffer[0, :, :, 0], self._face_scratch)
+        self.perf.record('resize', time.perf_counter() - t0)
+        return self._face_buffer
+
+    def preprocess_faces(self, face_rois):
+        """
+        Preprocess several face crops into a single batch
+        
+        Each crop goes through the same steps as preprocess_face() (see
+        modules.preprocessing) and is resized straight into its slot of the
+        batch tensor.
+        
+        Args:
+            face_rois: List of BGR face crops
+            
+        Returns:
+            uint8 array of shape (N, H, W, 1), or None if there are no usable crops
+        """
+        face_rois = [roi for roi in face_rois if roi is not None and roi.size > 0]
+        if not face_rois:
+            return None
+        return preprocess_bgr_batch(face_rois, self.input_size)
+
+    def _run_model(self, batch):
+        """Invoke the loaded model on an (N, H, W, 1) batch and return (N, len(EMOTIONS)) probabilities"""
+        t0 = time.perf_counter()
+        # Some exported variants carry an extra output class; only score the labels we know
+        pool = self.backend_pool
+        if pool is not None:
+            preds = pool.run(batch)
+        else:
+            with self._model_lock:
+                preds = self.backend.run(batch)
+        preds = preds[:, :len(self.EMOTIONS)]
+        self.perf.record('invoke', time.perf_counter() - t0)
+        return preds
+
+    def _decode_predictions(self, preds):
+        """Turn one row of model probabilities into (emotion, confidence, probabilities)"""
+        idx = int(np.argmax(preds))
+        emotion = self.EMOTIONS[idx]
+        confidence = float(preds[idx])
+        probabilities = {self.EMOTIONS[i]: float(preds[i]) for i in range(len(self.EMOTIONS))}
+        return emotion, confidence, probabilities
+
+    def classify_face(self, preprocessed_face, face_roi=None):
+        """
+        Run inference on one preprocessed face
+        
+        With a cascade, the cheap model answers first and the main model
+        only runs when that answer is uncertain.
+        
+        Args:
+            preprocessed_face: (1, H, W, 1) array from preprocess_face_into()
+            face_roi: The BGR crop it came from; lets a cascade model with
+                another input size preprocess the crop itself
+        
+        Returns:
+            float32 probability vector over EMOTIONS (a reused buffer,
+            overwritten by the next call; copy it to keep it), or None if no
+            model is loaded or inference failed
+        """
         if preprocessed_face is None:
-            return "Neutral", 0.0, {}
-        if self.interpreter is None and self.keras_model is None:
-            return "Neutral", 0.0, {}
+            return None
+        if self.backend is None:
+            return None
         try:
-            if self.using_h5 and self.keras_model is not None:
-                preds = self.keras_model.predict(preprocessed_face, verbose=0)[0]
-            else:
-                self.interpreter.set_tensor(self.input_details[0]['index'], preprocessed_face.astype(np.uint8))
-                self.interpreter.invoke()
-                preds = self.interpreter.get_tensor(self.output_details[0]['index'])[0]
-            idx = int(np.argmax(preds))
-            emotion = self.EMOTIONS[idx]
-            confidence = float(preds[idx])
-            probabilities = {self.EMOTIONS[i]: float(preds[i]) for i in range(len(self.EMOTIONS))}
-            return emotion, confidence, probabilities
+            t0 = time.perf_counter()
+            cascade = self.cascade
+            with self._model_lock:
+                preds = cascade.run(preprocessed_face, face_roi) if cascade is not None else None
+                if preds is None:
+                    preds = self.backend.run_single(preprocessed_face, self._probs)
+            elapsed = time.perf_counter() - t0
+            self.perf.record('invoke', elapsed)
+            if cascade is not None:
+                cascade.latency.record(elapsed)
+            return preds
         except Exception as e:
+            self.perf.count('errors')
             print(f"[ERROR] Error during prediction: {e}")
             import traceback
             traceback.print_exc()
+            return None
+
+    def predict_emotion(self, preprocessed_face):
+        """Run inference and return (emotion, confidence, probabilities)."""
+        preds = self.classify_face(preprocessed_face)
+        if preds is None:
             return "Neutral", 0.0, {}
+        return self._decode_predictions(preds)
+
+    def predict_emotions(self, batch):
+        """
+        Classify a batch of preprocessed faces with a single model invocation
+        
+        Args:
+            batch: (N, H, W, 1) array from preprocess_faces()
+            
+        Returns:
+            List of (emotion, confidence, probabilities), one per face
+        """
+        if batch is None or len(batch) == 0:
+            return []
+        preds = self.classify_faces(batch)
+        if preds is None:
+            return [("Neutral", 0.0, {})] * len(batch)
+        return [self._decode_predictions(row) for row in preds]
+
+    def classify_faces(self, batch, face_rois=None):
+        """
+        Batched classify_face()
+        
+        Args:
+            batch: (N, H, W, 1) array from preprocess_faces()
+            face_rois: The N BGR crops it came from (see classify_face())
+        
+        Returns:
+            (N, len(EMOTIONS)) float32 probabilities, or None if no model is
+            loaded or inference failed
+        """
+        if batch is None or len(batch) == 0 or self.backend is None:
+            return None
+        try:
+            cascade = self.cascade
+            if cascade is None:
+                return self._run_model(batch)
+            t0 = time.perf_counter()
+            with self._model_lock:
+                preds, escalate = cascade.run_batch(batch, face_rois)
+            if escalate.any():
+                preds[escalate] = self._run_model(batch[escalate])
+            cascade.latency.record((time.perf_counter() - t0) / len(batch))
+            return preds
+        except Exception as e:
+            self.perf.count('errors')
+            print(f"[ERROR] Error during batch prediction: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
 
-    def smooth_prediction(self, emotion, confidence):
-        """Smooth predictions over recent frames to reduce jitter."""
-        self.emotion_history.append((emotion, confidence))
-        if len(self.emotion_history) > self.history_size:
-            self.emotion_history.pop(0)
-        counts = {}
-        total_conf = 0.0
-        for emo, conf in self.emotion_history:
-            counts[emo] = counts.get(emo, 0) + 1
-            total_conf += conf
-        smoothed_emotion = max(counts, key=counts.get)
-        smoothed_confidence = total_conf / len(self.emotion_history)
-        return smoothed_emotion, smoothed_confidence
+    def smooth_prediction(self, preds, smoother=None):
+        """
+        Smooth predictions over recent frames to reduce jitter.
+        
+        Args:
+            preds: Probability vector over EMOTIONS for the current frame
+            smoother: Smoothing state to update (a face track's); defaults
+                to self.smoother
+            
+        Returns:
+            (emotion, confidence, smoothed) - smoothed is the smoother's
+            probability vector, updated in place on the next call
+        """
+        t0 = time.perf_counter()
+        smoother = smoother if smoother is not None else self.smoother
+        smoothed = smoother.update(preds)
+        idx = smoother.label_index
+        self.perf.record('smooth', time.perf_counter() - t0)
+        return self.EMOTIONS[idx], float(smoothed[idx]), smoothed
+    
+    def reset_smoothing(self):
+        """Forget all smoothing history (the default smoother and every face track)"""
+        self.smoother.reset()
+        self.face_tracks.reset()
     
     def predict(self, frame):
+        with self._predict_lock:
+            return self._predict_unlocked(frame)
+    
+    def _predict_unlocked(self, frame):
+        self.perf.frame()
+        frame = as_frame(frame)
         
-        # Detect face
-        face_roi, bbox = self.detect_face(frame)
+        # Detect (or track) face
+        face_roi, bbox = self.locate_face(frame)
+        return self.classify_located(frame, face_roi, bbox)
+    
+    def classify_located(self, frame, face_roi, bbox):
+        """
+        Second half of predict(): everything after locate_face()
+        
+        Split out so a pipeline can run detection and classification on
+        different threads (see modules.pipeline).
         
+        Args:
+            frame: Frame the face was located in (None is allowed)
+            face_roi, bbox: locate_face() output for that frame
+            
+        Returns:
+            Result dict, as from predict()
+        """
+        frame = as_frame(frame)
+        now = frame.timestamp if frame is not None else time.monotonic()
         if face_roi is None:
+            self.perf.count('no_face')
+            self.crop_gate.reset()
+            self.face_tracks.update([], now)
             return {
                 'emotion': 'No Face',
                 'confidence': 0.0,
                 'probabilities': {},
+                'smoothed_probabilities': {},
                 'bbox': None,
+                'track_id': None,
                 'face_detected': False
             }
         
-        # Preprocess face
-        preprocessed = self.preprocess_face(face_roi)
+        self.perf.count('faces_found')
+        track = self.face_tracks.update([bbox], now)[0]
         
-        # Predict emotion
-        emotion, confidence, probabilities = self.predict_emotion(preprocessed)
+        # Preprocess face into the reused input buffer
+        preprocessed = self.preprocess_face_into(face_roi)
         
-        # Smooth prediction
-        smoothed_emotion, smoothed_confidence = self.smooth_prediction(emotion, confidence)
+        # Predict emotion, reusing the last result if the crop is unchanged
+        preds = self.crop_gate.lookup(preprocessed)
+        if preds is not None:
+            self.perf.count('gate_hits')
+        else:
+            preds = self.classify_face(preprocessed, face_roi)
+            self.crop_gate.store(preprocessed, preds)
         
+        if preds is None:
+            return {
+                'emotion': 'Neutral',
+                'confidence': 0.0,
+                'probabilities': {},
+                'smoothed_probabilities': {},
+                'bbox': bbox,
+                'track_id': track.track_id,
+                'face_detected': True
+            }
+        return self._track_result(preds, bbox, track)
+    
+    def _track_result(self, preds, bbox, track):
+        """Result dict for one face, smoothed with its track's history"""
+        _, _, probabilities = self._decode_predictions(preds)
+        smoothed_emotion, smoothed_confidence, smoothed = self.smooth_prediction(preds, track.smoother)
         return {
             'emotion': smoothed_emotion,
             'confidence': smoothed_confidence,
             'probabilities': probabilities,
+            'smoothed_probabilities': {self.EMOTIONS[i]: float(smoothed[i]) for i in range(len(self.EMOTIONS))},
             'bbox': bbox,
+            'track_id': track.track_id,
             'face_detected': True
         }
     
-    def draw_results(self, frame, result):
+    def locate_face(self, frame):
+        """
+        Find the face either by full detection or by tracking
+        
+        Full MediaPipe detection runs every `detect_every` frames, or as soon
+        as the tracker loses the face; frames in between only propagate the
+        last bounding box with FaceTracker.
+        
+        Returns:
+            (face_roi, bbox) like detect_face()
+        """
+        if frame is None or frame.size == 0:
+            return None, None
+        frame = as_frame(frame)
+        
+        if self.face_tracker.active and self._frames_since_detection < self.detect_every:
+            t0 = time.perf_counter()
+            bbox, _ = self.face_tracker.update(frame)
+            self.perf.record('track', time.perf_counter() - t0)
+            if bbox is not None:
+                self._frames_since_detection += 1
+                self.track_count += 1
+                return frame.crop(bbox), bbox
+        
+        face_roi, bbox = self.detect_face(frame)
+        self.detection_count += 1
+        self._frames_since_detection = 1
+        if bbox is not None and self.detect_every > 1:
+            self.face_tracker.init(frame, bbox)
+        else:
+            self.face_tracker.reset()
+        return face_roi, bbox
+    
+    def tracking_stats(self):
+        """
+        Detection vs tracking counters for tuning detect_every
+        
+        Returns:
+            dict with detection/track counts, the share of frames served by
+            the tracker and the last template match score
+        """
+        total = self.detection_count + self.track_count
+        return {
+            'detections': self.detection_count,
+            'tracked': self.track_count,
+            'track_ratio': self.track_count / total if total else 0.0,
+            'last_track_score': self.face_tracker.last_score
+        }
+    
+    def stats(self):
+        """
+        Cheap snapshot of the live instrumentation
+        
+        Returns:
+            dict with fps, per-stage latency percentiles (ms) over the last
+            frames, counters (frames, faces_found, no_face, gate_hits, errors)
+            and the tracking, face-track, crop-gate, cascade, interpreter-pool
+            and async-worker counters
+        """
+        snapshot = self.perf.snapshot()
+        snapshot['tracking'] = self.tracking_stats()
+        snapshot['tracks'] = self.face_tracks.stats()
+        snapshot['gate'] = self.crop_gate.stats()
+        if self.cascade is not None:
+            snapshot['cascade'] = self.cascade.stats()
+        if self.backend_pool is not None:
+            snapshot['pool'] = self.backend_pool.stats()
+        snapshot['async'] = self.async_stats()
+        return snapshot
+    
+    def predict_all(self, frame):
+        """
+        Multi-face mode: classify every face in the frame in one batch
+        
+        Args:
+            frame: BGR image or Frame
+            
+        Returns:
+            List of result dicts shaped like predict()'s, one per detected face
+            (empty if no face is found). Each face is matched to a track and
+            smoothed with that track's own history; 'track_id' identifies it
+            across frames.
+        """
+        with self._predict_lock:
+            self.perf.frame()
+            frame = as_frame(frame)
+            faces = self.detect_faces(frame)
+            now = frame.timestamp if frame is not None else time.monotonic()
+            tracks = self.face_tracks.update([bbox for _, bbox in faces], now)
+            if not faces:
+                self.perf.count('no_face')
+                return []
+            self.perf.count('faces_found', len(faces))
+            
+            rois = [roi for roi, _ in faces]
+            batch = self.preprocess_faces(rois)
+            preds = self.classify_faces(batch, rois)
+            if preds is None:
+                return [
+                    {
+                        'emotion': 'Neutral',
+                        'confidence': 0.0,
+                        'probabilities': {},
+                        'smoothed_probabilities': {},
+                        'bbox': bbox,
+                        'track_id': track.track_id,
+                        'face_detected': True
+                    }
+                    for (_, bbox), track in zip(faces, tracks)
+                ]
+            return [self._track_result(row, bbox, track) for row, (_, bbox), track in zip(preds, faces, tracks)]
+    
+    def start_async(self, callback):
+        """
+        Start asynchronous inference on a background worker thread
+        
+        Frames handed over with submit_frame() are processed by predict()
+        off the Kivy main thread; each result is delivered back to the UI
+        through Clock.schedule_once.
+        
+        Args:
+            callback: Called on the Kivy main thread with each predict() result
+        """
+        from kivy.clock import Clock
+        
+        self._result_callback = callback
+        if self._worker is not None and self._worker.is_alive():
+            return
+        
+        self._async_running = True
+        # Each worker gets its own token: one left finishing a predict() after
+        # stop_async() stays stopped even if a new session starts meanwhile
+        self._worker_stop = threading.Event()
+        self._worker = threading.Thread(
+            target=self._inference_loop,
+            args=(Clock, self._worker_stop),
+            name='EmotionAI-worker',
+            daemon=True
+        )
+        self._worker.start()
+    
+    def submit_frame(self, frame):
+        """
+        Hand a frame to the async worker
+        
+        The mailbox holds a single frame: if the worker has not picked up
+        the previous one yet, it is dropped and replaced by this one.
+        
+        Args:
+            frame: Frame from CameraCapture.get_frame() (or a BGR array)
+        """
+        if frame is None:
+            return
+        with self._mailbox_cond:
+            if self._mailbox is not None:
+                self.dropped_frames += 1
+            self._mailbox = frame
+            self.submitted_frames += 1
+            self._mailbox_cond.notify()
+    
+    def _inference_loop(self, clock, stop):
+        """Worker thread: wait for the latest frame, predict, post the result until stop is set"""
+        while True:
+            with self._mailbox_cond:
+                while self._mailbox is None and not stop.is_set():
+                    self._mailbox_cond.wait()
+                if stop.is_set():
+                    return
+                frame = self._mailbox
+                self._mailbox = None
+            
+            t0 = time.perf_counter()
+            result = self.predict(frame)
+            self.async_latency.record(time.perf_counter() - t0)
+            self.processed_frames += 1
+            if stop.is_set():
+                return  # Stopped during predict(); the result belongs to a finished session
+            
+            callback = self._result_callback
+            if callback is not None:
+                clock.schedule_once(lambda dt, cb=callback, r=result: self._deliver(cb, r))
+    
+    def _deliver(self, callback, result):
+        """Runs on the Kivy main thread; ignores results from a stopped session"""
+        if self._async_running and callback is self._result_callback:
+            callback(result)
+    
+    def stop_async(self):
+        """Stop the async worker and discard any pending frame"""
+        with self._mailbox_cond:
+            self._async_running = False
+            if self._worker_stop is not None:
+                self._worker_stop.set()
+            self._mailbox = None
+            self._mailbox_cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+            self._worker = None
+        self._result_callback = None
+    
+    def async_stats(self):
+        """
+        Counters for the async inference mode
+        
+        Returns:
+            dict with submitted, processed and dropped (stale) frame counts
+            and the worker's per-frame latency (ms)
+        """
+        return {
+            'submitted': self.submitted_frames,
+            'processed': self.processed_frames,
+            'dropped': self.dropped_frames,
+            'latency': self.async_latency.snapshot()
+        }
+    
+    def draw_results(self, frame, result, overlay=None):
         """
         Draw emotion prediction results on frame
         
         Args:
-            frame: BGR image to draw on
+            frame: BGR image or Frame (left untouched; a copy is annotated)
             result: Prediction result dictionary from predict()
+            overlay: Also render fps and stage latencies (defaults to overlay_enabled)
             
         Returns:
             annotated_frame: Frame with annotations
         """
-        annotated_frame = frame.copy()
+        annotated_frame = as_frame(frame).bgr.copy()
+        if overlay if overlay is not None else self.overlay_enabled:
+            self._draw_perf_overlay(annotated_frame)
         
         if not result['face_detected']:
             # Draw "No Face Detected" message
@@ -294,7 +1212,25 @@ class EmotionAI:
         
         return annotated_frame
     
+    def _draw_perf_overlay(self, frame):
+        """Render fps and the mean latency of each stage in the bottom-left corner"""
+        lines = [f"{self.perf.fps:.1f} fps"]
+        for stage, hist in self.perf.histograms.items():
+            if hist.count:
+                lines.append(f"{stage}: {hist.mean * 1000.0:.1f} ms")
+        y = frame.shape[0] - 10 - 18 * (len(lines) - 1)
+        for line in lines:
+            cv2.putText(frame, line, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            y += 18
+    
     def cleanup(self):
         """Release resources"""
+        self.stop_async()
+        if self.backend:
+            self.backend.close()
+        if self.cascade is not None:
+            self.cascade.close()
+        if self.backend_pool is not None:
+            self.backend_pool.close()
         if self.face_detection:
             self.face_detection.close()
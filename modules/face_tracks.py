@@ -0,0 +1,135 @@
+import numpy as np
+
+from modules.smoothing import create_smoother
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise intersection over union of two sets of (x, y, w, h) boxes
+
+    Args:
+        boxes_a: (N, 4) array
+        boxes_b: (M, 4) array
+
+    Returns:
+        (N, M) float array
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(1, -1, 4)
+    iw = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    ih = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class FaceTrack:
+    """One face followed across frames, with its own smoothing history"""
+
+    def __init__(self, track_id, bbox, smoother, now):
+        self.track_id = track_id
+        self.bbox = tuple(bbox)
+        self.smoother = smoother
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+
+    def update(self, bbox, now):
+        self.bbox = tuple(bbox)
+        self.last_seen = now
+        self.hits += 1
+
+
+class FaceTrackManager:
+    """
+    Assigns stable track IDs to detected faces by IoU matching
+
+    Every update() matches the new boxes against the live tracks in one
+    vectorized IoU computation followed by a greedy best-pair assignment;
+    unmatched boxes start new tracks. Each track owns a smoother, so two
+    children in front of the camera never share a smoothing history.
+    Tracks not seen for `max_age` seconds are dropped, and at most
+    `max_tracks` are kept (the least recently seen is evicted first), so
+    memory stays bounded however many people pass through.
+    """
+
+    def __init__(self, num_classes, smoothing='window', window=5, iou_threshold=0.3, max_age=1.0,
+                 max_tracks=8):
+        """
+        Args:
+            num_classes: Length of the probability vectors being smoothed
+            smoothing: Smoothing strategy for each track (see create_smoother)
+            window: Smoother window per track
+            iou_threshold: Minimum IoU for a box to continue an existing track
+            max_age: Seconds a track survives without being matched
+            max_tracks: Upper bound on live tracks
+        """
+        self.num_classes = num_classes
+        self.smoothing = smoothing
+        self.window = window
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.max_tracks = max(1, int(max_tracks))
+        self.tracks = []
+        self._next_id = 1
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def update(self, bboxes, now):
+        """
+        Match this frame's face boxes to tracks
+
+        Args:
+            bboxes: List of (x, y, w, h) boxes detected in the frame
+            now: Frame timestamp in seconds (time.monotonic() clock)
+
+        Returns:
+            List of FaceTrack, one per box, in the same order
+        """
+        self._expire(now)
+        assigned = [None] * len(bboxes)
+        if self.tracks and bboxes:
+            ious = iou_matrix([t.bbox for t in self.tracks], bboxes)
+            # Greedy: take the best remaining (track, box) pair until none clears the threshold
+            for _ in range(min(ious.shape)):
+                t, b = np.unravel_index(np.argmax(ious), ious.shape)
+                if ious[t, b] < self.iou_threshold:
+                    break
+                self.tracks[t].update(bboxes[b], now)
+                assigned[b] = self.tracks[t]
+                ious[t, :] = -1.0
+                ious[:, b] = -1.0
+
+        for i, bbox in enumerate(bboxes):
+            if assigned[i] is None:
+                assigned[i] = self._create(bbox, now)
+        return assigned
+
+    def _create(self, bbox, now):
+        if len(self.tracks) >= self.max_tracks:
+            oldest = min(self.tracks, key=lambda t: t.last_seen)
+            self.tracks.remove(oldest)
+            self.evicted += 1
+        smoother = create_smoother(self.smoothing, self.num_classes, window=self.window)
+        track = FaceTrack(self._next_id, bbox, smoother, now)
+        self._next_id += 1
+        self.tracks.append(track)
+        self.created += 1
+        return track
+
+    def _expire(self, now):
+        alive = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+        self.expired += len(self.tracks) - len(alive)
+        self.tracks = alive
+
+    def reset(self):
+        self.tracks = []
+
+    def stats(self):
+        return {
+            'active': len(self.tracks),
+            'created': self.created,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
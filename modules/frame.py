@@ -0,0 +1,125 @@
+import threading
+import time
+import cv2
+
+
+class Frame:
+    """
+    One captured camera frame plus its derived views
+
+    CameraCapture wraps every frame it reads in a Frame and hands the same
+    object to the display and to EmotionAI. Derived views (RGB, grayscale,
+    mirrored, downscaled pyramid levels) are computed on first access, at
+    most once per frame, and cached; later readers on any thread get the
+    cached array. All arrays are marked read-only so a consumer cannot
+    corrupt what the others see; copy a view before drawing on it.
+
+    Views are named 'bgr', 'rgb' and 'gray'. Downscaled views are derived
+    from the downscaled BGR image, so a small grayscale copy never needs a
+    full-resolution conversion.
+    """
+
+    _CONVERSIONS = {
+        'rgb': cv2.COLOR_BGR2RGB,
+        'gray': cv2.COLOR_BGR2GRAY,
+    }
+
+    def __init__(self, bgr, timestamp=None, index=0):
+        """
+        Args:
+            bgr: BGR image; Frame takes a read-only view, the caller's array
+                is left writable
+            timestamp: Capture time (time.monotonic()); defaults to now
+            index: Sequence number of the frame in its stream
+        """
+        self.bgr = _readonly(bgr)
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.index = index
+        self._views = {}
+        self._lock = threading.RLock()
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+    @property
+    def size(self):
+        return self.bgr.size
+
+    @property
+    def rgb(self):
+        return self.view('rgb')
+
+    @property
+    def gray(self):
+        return self.view('gray')
+
+    def view(self, name='bgr', size=None):
+        """
+        Full-resolution or resized view of the frame
+
+        Args:
+            name: 'bgr', 'rgb' or 'gray'
+            size: Optional (width, height) to resize to (INTER_AREA)
+
+        Returns:
+            Read-only uint8 array
+        """
+        if size is not None and tuple(size) == (self.bgr.shape[1], self.bgr.shape[0]):
+            size = None
+        if name == 'bgr' and size is None:
+            return self.bgr
+        key = (name, None if size is None else tuple(size))
+        cached = self._views.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is None:
+                if size is None:
+                    cached = cv2.cvtColor(self.bgr, self._CONVERSIONS[name])
+                elif name == 'bgr':
+                    cached = cv2.resize(self.bgr, key[1], interpolation=cv2.INTER_AREA)
+                else:
+                    cached = cv2.cvtColor(self.view('bgr', size), self._CONVERSIONS[name])
+                cached = self._views[key] = _readonly(cached)
+        return cached
+
+    def scaled(self, scale, name='bgr'):
+        """View resized by a factor (e.g. 0.25 for a quarter-resolution copy)"""
+        h, w = self.bgr.shape[:2]
+        return self.view(name, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))))
+
+    def pyramid(self, level, name='bgr'):
+        """Pyramid level: level 0 is the full frame, each level halves the resolution"""
+        return self.scaled(0.5 ** level, name)
+
+    def mirrored(self, name='rgb'):
+        """Horizontally flipped view, as shown on screen"""
+        key = ('mirrored', name)
+        cached = self._views.get(key)
+        if cached is None:
+            source = self.view(name)
+            with self._lock:
+                cached = self._views.get(key)
+                if cached is None:
+                    cached = self._views[key] = _readonly(cv2.flip(source, 1))
+        return cached
+
+    def crop(self, bbox, name='bgr'):
+        """Read-only (x, y, w, h) crop of a full-resolution view (no copy)"""
+        x, y, w, h = bbox
+        return self.view(name)[y:y+h, x:x+w]
+
+
+def _readonly(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def as_frame(frame):
+    """Wrap a BGR array in a Frame; Frames and None pass through unchanged"""
+    if frame is None or isinstance(frame, Frame):
+        return frame
+    return Frame(frame)
@@ -0,0 +1,140 @@
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from modules.frame import Frame
+from modules.instrumentation import LatencyHistogram
+
+
+class FrameGrabber:
+    """
+    Reads an opened FrameSource on its own thread into preallocated buffers
+
+    The grab thread decodes each frame straight into a back buffer, wraps
+    it in a Frame (capture timestamp and sequence number included) and
+    publishes it by swapping a single reference. get_frame() therefore
+    never waits on camera I/O and never copies: it returns the newest
+    completed Frame.
+
+    Two buffers (front and back) are allocated from the first frame. A
+    buffer is only refilled once no Frame over it is referenced any more,
+    so a Frame a consumer still holds (the inference worker, say) is
+    never overwritten underneath it; if every buffer is still held, one
+    more is added, up to max_buffers. Keep the Frame rather than bare
+    arrays taken from it (.bgr, crop()) when using them later.
+    """
+
+    def __init__(self, source, buffers=2, max_buffers=6, retry_interval=0.1):
+        """
+        Args:
+            source: Opened FrameSource; the caller releases it after stop()
+            buffers: Frame buffers allocated up front
+            max_buffers: Buffers kept at most when consumers hold on to
+                frames; beyond that the source allocates each frame
+            retry_interval: Seconds to wait after a failed read
+        """
+        self.source = source
+        self.buffers = max(2, int(buffers))
+        self.max_buffers = max(self.buffers, int(max_buffers))
+        self.retry_interval = retry_interval
+
+        self._slots = []  # [buffer, weakref to the Frame last written into it]
+        self._front = None  # Newest completed Frame
+        self._thread = None
+        self.running = False
+
+        self.sequence = 0
+        self.failures = 0
+        self.extra_buffers = 0  # Added because consumers still held every buffer
+        self.unbuffered_frames = 0  # Allocated by the source with max_buffers in use
+        self.read_latency = LatencyHistogram()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name='FrameGrabber', daemon=True)
+        self._thread.start()
+
+    def get_frame(self):
+        """
+        Newest captured frame, without copying
+
+        Returns:
+            Frame (with .timestamp and .index) or None before the first frame
+        """
+        return self._front
+
+    def stop(self, timeout=1.0):
+        """Stop the grab thread; the source is left open for the caller to release"""
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._front = None
+
+    def _run(self):
+        failed = False
+        while self.running:
+            start = time.perf_counter()
+            frame = self._grab()
+            if frame is None:
+                self.failures += 1
+                if not failed:
+                    print(f"[WARN] Failed to read a frame from {self.source.describe()}; retrying")
+                failed = True
+                time.sleep(self.retry_interval)
+                continue
+            failed = False
+            self.read_latency.record(time.perf_counter() - start)
+            self._front = frame  # The swap: readers see the old or the new Frame, never a partial one
+
+    def _grab(self):
+        slot = self._free_slot()
+        buffer = slot[0] if slot is not None else None
+        ok, image = self.source.read(buffer)
+        if not ok:
+            return None
+        if isinstance(image, Frame):
+            return image  # The source hands out its own Frames
+        timestamp = time.monotonic()
+
+        if image is not buffer:
+            # First frame or a new resolution: this array becomes the first buffer
+            if not self._slots or self._slots[0][0].shape != image.shape:
+                self._slots = [[image, None]] + [[np.empty_like(image), None] for _ in range(self.buffers - 1)]
+                slot = self._slots[0]
+            else:
+                slot = None
+                self.unbuffered_frames += 1
+
+        frame = Frame(image, timestamp=timestamp, index=self.sequence)
+        self.sequence += 1
+        if slot is not None:
+            slot[1] = weakref.ref(frame)
+        return frame
+
+    def _free_slot(self):
+        """Buffer no live Frame refers to (the front Frame always counts as live)"""
+        for slot in self._slots:
+            if slot[1] is None or slot[1]() is None:
+                return slot
+        if not self._slots or len(self._slots) >= self.max_buffers:
+            return None
+        slot = [np.empty_like(self._slots[0][0]), None]
+        self._slots.append(slot)
+        self.extra_buffers += 1
+        return slot
+
+    def stats(self):
+        """Frames grabbed, read failures, buffer use and read time (ms)"""
+        return {
+            'frames': self.sequence,
+            'failures': self.failures,
+            'buffers': len(self._slots),
+            'extra_buffers': self.extra_buffers,
+            'unbuffered_frames': self.unbuffered_frames,
+            'read': self.read_latency.snapshot()
+        }
@@ -0,0 +1,223 @@
+import time
+import cv2
+import numpy as np
+from pathlib import Path
+
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+class FrameSource:
+    """
+    Where CameraCapture gets its frames from
+
+    All sources share the cv2.VideoCapture-style read() contract: it
+    returns (ok, frame) with a BGR frame, and ok is False once the source
+    is exhausted or failed. Like cv2's read(image), an `out` array of the
+    right shape is filled in place and returned as the frame; otherwise
+    (no `out`, or a different resolution) a new array is returned.
+    """
+
+    # True for sources that deliver frames in real time (a webcam, or a file
+    # replayed at its own frame rate)
+    realtime = True
+
+    def open(self):
+        """Open the source; returns True on success"""
+        raise NotImplementedError
+
+    def is_opened(self):
+        raise NotImplementedError
+
+    def read(self, out=None):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class DeviceSource(FrameSource):
+    """Live camera device through cv2.VideoCapture"""
+
+    def __init__(self, index=0, width=640, height=480, fps=30):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.capture = None
+
+    def open(self):
+        self.capture = cv2.VideoCapture(self.index)
+        if not self.capture.isOpened():
+            return False
+        # Set camera properties for better performance
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self.capture.set(cv2.CAP_PROP_FPS, self.fps)
+        return True
+
+    def is_opened(self):
+        return self.capture is not None and self.capture.isOpened()
+
+    def read(self, out=None):
+        if self.capture is None:
+            return False, None
+        return self.capture.read(out)
+
+    def release(self):
+        if self.capture:
+            self.capture.release()
+            self.capture = None
+
+    def describe(self):
+        return f"camera {self.index}"
+
+
+class VideoFileSource(FrameSource):
+    """
+    Recorded video file
+
+    With realtime=True, read() behaves like a camera: it waits until the
+    next frame is due at the file's frame rate and skips frames if the
+    caller falls behind. With realtime=False every frame is returned in
+    order as fast as the caller reads, which makes runs deterministic.
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = Path(path)
+        self.realtime = realtime
+        self.loop = loop
+        self.capture = None
+        self.file_fps = 30.0
+        self._start_time = None
+        self._next_index = 0
+
+    def open(self):
+        self.capture = cv2.VideoCapture(str(self.path))
+        if not self.capture.isOpened():
+            return False
+        self.file_fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self._start_time = None
+        self._next_index = 0
+        return True
+
+    def is_opened(self):
+        return self.capture is not None and self.capture.isOpened()
+
+    def read(self, out=None):
+        if self.capture is None:
+            return False, None
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._start_time is None:
+                self._start_time = now
+            due = self._start_time + self._next_index / self.file_fps
+            if due > now:
+                time.sleep(due - now)
+            else:
+                # Behind schedule: drop frames the way a live camera would
+                target = int((now - self._start_time) * self.file_fps)
+                while self._next_index < target and self.capture.grab():
+                    self._next_index += 1
+
+        ret, frame = self.capture.read(out)
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._start_time = None
+            self._next_index = 0
+            ret, frame = self.capture.read(out)
+        if ret:
+            self._next_index += 1
+        return ret, frame
+
+    def release(self):
+        if self.capture:
+            self.capture.release()
+            self.capture = None
+
+    def describe(self):
+        return f"video {self.path.name}"
+
+
+class ImageFolderSource(FrameSource):
+    """
+    Folder of still images, read in sorted file-name order
+
+    With fps set, frames are paced like a camera; with fps=None each read()
+    returns the next image immediately.
+    """
+
+    def __init__(self, path, fps=None, loop=False):
+        self.path = Path(path)
+        self.fps = fps
+        self.realtime = fps is not None
+        self.loop = loop
+        self.files = []
+        self._index = 0
+        self._next_due = None
+
+    def open(self):
+        self.files = sorted(p for p in self.path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        self._index = 0
+        self._next_due = None
+        return bool(self.files)
+
+    def is_opened(self):
+        return bool(self.files)
+
+    def read(self, out=None):
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_due is not None and self._next_due > now:
+                time.sleep(self._next_due - now)
+            self._next_due = max(now, self._next_due or now) + 1.0 / self.fps
+
+        # Try each file at most once per call so unreadable files cannot spin forever
+        for _ in range(len(self.files)):
+            if self._index >= len(self.files):
+                if not self.loop:
+                    break
+                self._index = 0
+            path = self.files[self._index]
+            self._index += 1
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                if out is not None and out.shape == frame.shape:
+                    np.copyto(out, frame)
+                    return True, out
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.files = []
+
+    def describe(self):
+        return f"images {self.path}"
+
+
+def open_source(spec, realtime=True, loop=False, fps=30):
+    """
+    Build a frame source from a loose specification
+
+    Args:
+        spec: Camera index (int or digit string), video file path or image
+            folder path; an existing FrameSource is returned unchanged
+        realtime: Pace file and folder sources like a live camera
+        loop: Restart file and folder sources when they run out
+        fps: Camera frame rate, and folder pacing rate when realtime
+
+    Returns:
+        An unopened FrameSource
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return DeviceSource(int(spec), fps=fps)
+    path = Path(spec)
+    if path.is_dir():
+        return ImageFolderSource(path, fps=fps if realtime else None, loop=loop)
+    return VideoFileSource(path, realtime=realtime, loop=loop)
@@ -0,0 +1,438 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from modules.frame import Frame, as_frame
+from modules.instrumentation import LatencyHistogram
+
+
+class SharedFrameRing:
+    """
+    Fixed number of uint8 frame slots in one SharedMemory block
+
+    The UI process writes a frame into a slot once; the worker process
+    maps the same block and reads the slot in place, so frames cross the
+    process boundary without pickling or copying. Only the slot index and
+    the frame shape travel over the pipe. Each slot holds up to
+    `slot_bytes`, so frames of different sizes share one ring as long as
+    they fit.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        """
+        Args:
+            slots: Number of frame slots
+            slot_bytes: Capacity of each slot (height * width * channels)
+            name: Attach to an existing block by name (None creates one)
+        """
+        self.slots = slots
+        self.slot_bytes = int(slot_bytes)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * self.slot_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def spec(self):
+        """Picklable (slots, slot_bytes, name) for attaching from another process"""
+        return self.slots, self.slot_bytes, self.shm.name
+
+    def fits(self, shape):
+        return int(np.prod(shape)) <= self.slot_bytes
+
+    def view(self, slot, shape):
+        """uint8 array of the given shape over the start of a slot (no copy)"""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, image):
+        np.copyto(self.view(slot, image.shape), image)
+
+    def close(self):
+        """Unmap the block (views must be gone); the owner also frees it"""
+        if self.shm is None:
+            return
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+def _worker_main(conn, ring_spec, ai_kwargs):
+    """
+    Inference process: attach to the ring, run EmotionAI on every slot
+    index received, send back the result
+
+    Messages in: (slot, index, timestamp, shape), or None to exit.
+    Messages out: ('ready', pid) once the model is loaded, then
+    ('result', slot, index, predict_seconds, result) per frame.
+    """
+    from modules.emotion_ai import EmotionAI
+
+    slots, slot_bytes, name = ring_spec
+    ring = SharedFrameRing(slots, slot_bytes, name=name)
+    ai = EmotionAI(**ai_kwargs)
+    try:
+        conn.send(('ready', os.getpid()))
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            slot, index, timestamp, shape = message
+            t0 = time.perf_counter()
+            result = ai.predict(Frame(ring.view(slot, shape), timestamp=timestamp, index=index))
+            conn.send(('result', slot, index, time.perf_counter() - t0, result))
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        ai.cleanup()
+        ring.close()
+
+
+def _start_without_main(process):
+    """
+    Start a spawned process without re-running the parent's main script
+
+    spawn normally imports the parent's __main__ file in the child; for
+    main.py that would import Kivy and open a second window. The worker
+    only needs modules.inference_process, so the script path is hidden
+    while the child is prepared.
+    """
+    main = sys.modules['__main__']
+    main_path = main.__dict__.pop('__file__', None)
+    try:
+        process.start()
+    finally:
+        if main_path is not None:
+            main.__file__ = main_path
+
+
+class InferenceProcess:
+    """
+    EmotionAI running in a separate process behind the async interface
+
+    A drop-in for the start_async() / submit_frame() / stop_async() side of
+    EmotionAI. submit_frame() copies the frame into a free slot of a
+    SharedFrameRing and returns at once; a supervisor thread hands slot
+    indices to the worker over a Pipe, one frame in flight at a time, and
+    posts results back through Clock.schedule_once. As with the in-process
+    mailbox the newest frame wins: a frame still waiting when a newer one
+    arrives is dropped.
+
+    Inference (and any crash or hang in the native model code) is isolated
+    from the UI process. If the worker dies or stops answering, the
+    supervisor starts a new one, backing off after repeated failures; the
+    frame it was working on is lost, later frames continue as before.
+    """
+
+    def __init__(self, ai_kwargs=None, slots=3, result_timeout=10.0, start_timeout=120.0, max_restarts=5):
+        """
+        Args:
+            ai_kwargs: Keyword arguments for EmotionAI in the worker
+            slots: Frame slots in the shared ring (at least 2: one being
+                read by the worker, one for the newest frame)
+            result_timeout: Seconds a frame may take before the worker is
+                considered hung and restarted
+            start_timeout: Seconds allowed for the worker to load its model
+            max_restarts: Consecutive failed restarts before giving up
+        """
+        self.ai_kwargs = dict(ai_kwargs or {})
+        self.slots = max(2, int(slots))
+        self.result_timeout = result_timeout
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self._context = multiprocessing.get_context('spawn')  # Forking a process with live TF/MediaPipe threads is unsafe
+
+        self._lock = threading.Lock()
+        self._ring = None
+        self._process = None
+        self._conn = None
+        self._ready = False
+        self._started_at = 0.0
+        self._supervisor = None
+        self._running = False
+        self._result_callback = None
+        self._clock = None
+        self._session = 0  # Bumped by start_async(); results from earlier sessions are dropped
+
+        # Slot bookkeeping, guarded by _lock
+        self._next_slot = 0
+        self._in_flight = None  # (slot, index, sent_at, session)
+        self._pending = None  # (slot, index, timestamp, shape)
+        self._oversized = None  # Newest frame, waiting for the supervisor to build a ring it fits in
+
+        self.submitted_frames = 0
+        self.processed_frames = 0
+        self.dropped_frames = 0  # Replaced while waiting for the worker
+        self.lost_frames = 0  # In flight when the worker died
+        self.restarts = 0
+        self._failures = 0  # Consecutive worker failures without a result
+        self.failed = False
+        self.async_latency = LatencyHistogram()  # Submit-to-result time, read by rate controllers
+        self.worker_latency = LatencyHistogram()  # predict() time inside the worker
+
+    def start_async(self, callback):
+        """
+        Start delivering results to callback on the Kivy main thread
+
+        The worker process itself is started with the first frame, once
+        the frame size (and so the ring layout) is known.
+        """
+        from kivy.clock import Clock
+
+        self._clock = Clock
+        with self._lock:
+            self._session += 1
+            self._result_callback = callback
+            if self._in_flight is not None:
+                # Left in the worker by the last session; nobody watched it
+                # while stopped, so its result timeout starts now
+                slot, index, _, session = self._in_flight
+                self._in_flight = (slot, index, time.monotonic(), session)
+        if self._supervisor is not None and self._supervisor.is_alive():
+            return
+        self._running = True
+        self._supervisor = threading.Thread(target=self._supervise, name='InferenceProcess-supervisor', daemon=True)
+        self._supervisor.start()
+
+    def submit_frame(self, frame):
+        """
+        Copy a frame into the shared ring for the worker; never blocks on inference
+
+        Args:
+            frame: Frame from CameraCapture.get_frame() (or a BGR array)
+        """
+        if frame is None or not self._running or self.failed:
+            return
+        frame = as_frame(frame)
+        with self._lock:
+            self.submitted_frames += 1
+            if self._pending is not None or self._oversized is not None:
+                self.dropped_frames += 1
+            if self._oversized is not None or self._ring is None or not self._ring.fits(frame.shape):
+                # A bigger ring needs a new worker to map it; the supervisor
+                # builds both, so this thread never waits for a process
+                self._pending = None
+                self._oversized = frame
+                return
+            slot = self._free_slot()
+            self._ring.write(slot, frame.bgr)
+            self._pending = (slot, frame.index, frame.timestamp, frame.shape)
+            self._dispatch()
+
+    def _free_slot(self):
+        """Next slot round the ring that the worker is not reading"""
+        busy = self._in_flight[0] if self._in_flight is not None else None
+        slot = self._next_slot
+        if slot == busy:
+            slot = (slot + 1) % self.slots
+        self._next_slot = (slot + 1) % self.slots
+        return slot
+
+    def _dispatch(self):
+        """Send the pending frame if the worker is idle (caller holds _lock)"""
+        if self._pending is None or self._in_flight is not None or not self._ready:
+            return
+        slot, index, timestamp, shape = self._pending
+        try:
+            self._conn.send((slot, index, timestamp, shape))
+        except (OSError, ValueError):
+            return  # Worker gone; the supervisor restarts it and retries
+        self._pending = None
+        self._in_flight = (slot, index, time.monotonic(), self._session)
+
+    def _grow_ring(self):
+        """
+        Replace the ring with one the oversized frame fits in and queue that
+        frame (supervisor thread, caller holds _lock)
+
+        Returns:
+            (worker, ring) that were retired, for _retire() outside the lock
+        """
+        frame, self._oversized = self._oversized, None
+        retired = (self._detach_worker(), self._ring)
+        capacity = max(frame.size, self._ring.slot_bytes if self._ring is not None else 0)
+        self._ring = SharedFrameRing(self.slots, capacity)
+        self._next_slot = 0
+        slot = self._free_slot()
+        self._ring.write(slot, frame.bgr)
+        self._pending = (slot, frame.index, frame.timestamp, frame.shape)
+        return retired
+
+    def _retire(self, worker, ring):
+        """Stop a detached worker, then free the ring it had mapped (without _lock)"""
+        self._join_worker(*worker)
+        if ring is not None:
+            ring.close()
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self._ring.spec(), self.ai_kwargs),
+            name='EmotionAI-process',
+            daemon=True
+        )
+        _start_without_main(process)
+        child_conn.close()
+        self._process, self._conn = process, parent_conn
+        self._ready = False
+        self._started_at = time.monotonic()
+
+    def _detach_worker(self):
+        """Forget the current worker (caller holds _lock); returns (process, conn) for _join_worker()"""
+        process, conn = self._process, self._conn
+        self._process, self._conn, self._ready = None, None, False
+        if self._in_flight is not None:
+            self.lost_frames += 1
+            self._in_flight = None
+        return process, conn
+
+    @staticmethod
+    def _join_worker(process, conn, timeout=2.0):
+        """
+        Ask a detached worker to exit, killing it if it does not; called
+        without _lock so submit_frame() never waits on it
+
+        Returns:
+            The worker's exit code (None if there was no worker)
+        """
+        if process is None:
+            return None
+        try:
+            conn.send(None)
+        except (OSError, ValueError):
+            pass
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join(timeout)
+        conn.close()
+        return process.exitcode
+
+    def _supervise(self, poll_interval=0.1):
+        """Supervisor thread: (re)start the worker, collect results, watch for hangs"""
+        retry_at = 0.0
+        while self._running:
+            retired = None
+            with self._lock:
+                if self._oversized is not None:
+                    retired = self._grow_ring()
+                conn = self._conn
+                if conn is None and self._ring is not None and not self.failed and time.monotonic() >= retry_at:
+                    self._start_worker()
+                    conn = self._conn
+            if retired is not None:
+                self._retire(*retired)
+            if conn is None:
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                message = conn.recv() if conn.poll(poll_interval) else None
+            except (EOFError, OSError):
+                message = 'died'
+            dead = None
+            with self._lock:
+                if conn is not self._conn:
+                    continue  # Replaced meanwhile (new frame size)
+                if message is not None and message != 'died':
+                    self._handle(message)  # A result that did arrive is never mistaken for a hang
+                elif message == 'died' or self._hung():
+                    dead = self._detach_worker()
+                    delay = self._backoff()
+            if dead is not None:
+                # Exit code is only known once the process has been joined
+                exitcode = self._join_worker(*dead, timeout=0.5)
+                if self.failed:
+                    print(f"[ERROR] Inference process failed {self._failures} times in a row; giving up")
+                else:
+                    print(f"[WARN] Inference process stopped (exit code {exitcode}); restarting in {delay:.1f}s")
+                    retry_at = time.monotonic() + delay
+
+    def _hung(self):
+        now = time.monotonic()
+        if not self._ready:
+            return now - self._started_at > self.start_timeout or not self._process.is_alive()
+        return self._in_flight is not None and now - self._in_flight[2] > self.result_timeout
+
+    def _backoff(self):
+        """Count a worker failure (caller holds _lock); returns the delay before the next start"""
+        self._failures += 1
+        self.restarts += 1
+        if self._failures > self.max_restarts:
+            self.failed = True
+            return 0.0
+        return min(8.0, 0.5 * 2 ** (self._failures - 1))
+
+    def _handle(self, message):
+        """Process one worker message (caller holds _lock)"""
+        if message[0] == 'ready':
+            self._ready = True
+            print(f"[OK] Inference process {message[1]} ready")
+            self._dispatch()
+            return
+        _, slot, index, predict_seconds, result = message
+        if self._in_flight is None or self._in_flight[:2] != (slot, index):
+            return
+        _, _, sent_at, session = self._in_flight
+        self._in_flight = None
+        self._failures = 0
+        self._dispatch()
+        if session != self._session:
+            return  # Submitted before the last stop_async(): the worker is healthy, the result stale
+        self.async_latency.record(time.monotonic() - sent_at)
+        self.worker_latency.record(predict_seconds)
+        self.processed_frames += 1
+        callback = self._result_callback
+        if callback is not None:
+            self._clock.schedule_once(lambda dt, cb=callback, r=result, s=session: self._deliver(cb, r, s))
+
+    def _deliver(self, callback, result, session):
+        """Runs on the Kivy main thread; ignores results from a stopped or earlier session"""
+        if self._running and session == self._session:
+            callback(result)
+
+    def stop_async(self):
+        """Stop delivering results and discard any pending frame; the worker keeps its model loaded"""
+        self._running = False
+        if self._supervisor is not None:
+            self._supervisor.join(timeout=1.0)
+            self._supervisor = None
+        with self._lock:
+            self._pending = None
+            self._oversized = None
+        self._result_callback = None
+
+    def async_stats(self):
+        """
+        Counters for the out-of-process inference mode
+
+        Returns:
+            dict with submitted, processed, dropped and lost frame counts,
+            worker restarts, submit-to-result and worker latency (ms)
+        """
+        return {
+            'submitted': self.submitted_frames,
+            'processed': self.processed_frames,
+            'dropped': self.dropped_frames,
+            'lost': self.lost_frames,
+            'restarts': self.restarts,
+            'worker_pid': self._process.pid if self._process is not None else None,
+            'failed': self.failed,
+            'latency': self.async_latency.snapshot(),
+            'worker_latency': self.worker_latency.snapshot()
+        }
+
+    def cleanup(self):
+        """Stop the worker process and free the shared ring"""
+        self.stop_async()
+        with self._lock:
+            worker = self._detach_worker()
+            ring, self._ring = self._ring, None
+        self._retire(worker, ring)
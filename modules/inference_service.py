@@ -0,0 +1,475 @@
+import collections
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from modules.frame import as_frame
+from modules.instrumentation import LatencyHistogram
+from modules.labels import EMOTIONS
+from modules.pipeline import BoundedQueue
+from modules.smoothing import create_smoother
+
+DEFAULT_ADDRESS = 'unix:/tmp/neuropy-emotion.sock'
+
+# Fallback secret for Unix sockets only, whose socket file is private to its owner
+LOCAL_AUTHKEY = b'neuropy-local'
+
+
+def parse_address(spec):
+    """
+    Turn 'unix:/path/to.sock', 'tcp:host:port' or 'host:port' into a
+    multiprocessing.connection address
+    """
+    if spec.startswith('unix:'):
+        return spec[len('unix:'):]
+    if spec.startswith('tcp:'):
+        spec = spec[len('tcp:'):]
+    host, _, port = spec.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def service_authkey(address):
+    """
+    Shared secret for a service address, from NEUROPY_SERVICE_KEY
+
+    Messages are pickled, so anyone who can connect can run code in the
+    service. Over TCP the key is therefore mandatory. A Unix socket falls
+    back to LOCAL_AUTHKEY, because the service creates the socket file
+    readable by its own user only.
+
+    Args:
+        address: Parsed address (see parse_address)
+
+    Raises:
+        ValueError: TCP address without NEUROPY_SERVICE_KEY
+    """
+    key = os.environ.get('NEUROPY_SERVICE_KEY')
+    if key:
+        return key.encode()
+    if isinstance(address, str):
+        return LOCAL_AUTHKEY
+    raise ValueError("NEUROPY_SERVICE_KEY must be set to a shared secret for a TCP service address")
+
+
+class _Request:
+    """One client request waiting for a batch slot"""
+
+    __slots__ = ('crops', 'bboxes', 'arrived', 'done', 'results', 'error', 'queue_time')
+
+    def __init__(self, crops, bboxes):
+        self.crops = crops
+        self.bboxes = bboxes
+        self.arrived = time.monotonic()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+        self.queue_time = 0.0
+
+    def fail(self, reason):
+        """Answer the waiting handler with an error instead of results"""
+        self.error = reason
+        self.done.set()
+
+
+class EmotionInferenceService:
+    """
+    One shared EmotionAI serving several clients over a local socket
+
+    Every client connection gets a handler thread. 'classify' requests
+    carry BGR face crops; 'predict' requests carry a whole frame, which the
+    handler runs through face detection first (one detector, serialized by
+    a lock, overlapping with classification of other requests). The crops
+    are then queued for the batcher threads. Each gathers concurrent
+    requests for at most `max_wait` seconds after the first one arrives (or
+    until `max_batch` faces, or a request from every connected client, are
+    waiting) and classifies them all in one model invocation.
+
+    Results are unsmoothed; smoothing history belongs to each client (see
+    EmotionServiceClient).
+    """
+
+    def __init__(self, ai, address=DEFAULT_ADDRESS, max_batch=8, max_wait=0.01, queue_size=64, authkey=None,
+                 workers=1):
+        """
+        Args:
+            ai: EmotionAI instance to serve
+            address: 'unix:/path', 'tcp:host:port' or 'host:port'
+            max_batch: Most faces classified in one invocation
+            max_wait: Latency budget (seconds) a request may wait for others to join its batch
+            queue_size: Requests queued before handlers block (backpressure)
+            authkey: Connection secret (defaults to service_authkey(), which
+                refuses TCP addresses without NEUROPY_SERVICE_KEY)
+            workers: Batcher threads; with an EmotionAI interpreter pool
+                (interpreters > 1) their batches run in parallel
+        """
+        self.ai = ai
+        self.address = parse_address(address)
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self.authkey = authkey if authkey is not None else service_authkey(self.address)
+        self.requests = BoundedQueue(queue_size, 'block')
+        self._detect_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.workers = max(1, int(workers))
+        self._listener = None
+        self._batchers = []
+        self.running = False
+
+        self.queue_time = LatencyHistogram()  # Arrival to start of its batch
+        self.inference_time = LatencyHistogram()  # Preprocess + invoke per batch
+        self.detect_time = LatencyHistogram()
+        self.batch_sizes = collections.Counter()  # Faces per invocation
+        self.requests_per_batch = collections.Counter()
+        self.clients = 0
+        self.total_clients = 0
+        self._claimed = 0  # Requests taken off the queue by batchers and not answered yet
+        self.served = 0
+        self.errors = 0
+
+    def serve_forever(self):
+        """Accept clients until stop() is called"""
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.unlink(self.address)  # Stale socket from a previous run
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if isinstance(self.address, str):
+            os.chmod(self.address, 0o600)  # Socket file for this user only: other local users cannot connect
+        self.running = True
+        self._batchers = [threading.Thread(target=self._batch_loop, name=f'service-batcher-{i}', daemon=True)
+                          for i in range(self.workers)]
+        for batcher in self._batchers:
+            batcher.start()
+        print(f"[OK] Emotion service listening on {self._listener.address} "
+              f"(batches of up to {self.max_batch}, {self.max_wait * 1000:.0f} ms budget)")
+        try:
+            while self.running:
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    break  # Listener closed by stop()
+                except Exception as e:
+                    print(f"[WARN] Rejected client: {e}")
+                    continue
+                threading.Thread(target=self._handle_client, args=(conn,), name='service-client', daemon=True).start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        # Handlers wait on their requests without a timeout; answer the ones no batcher will take
+        for request in self.requests.close(discard=True):
+            request.fail("Service is shutting down")
+        if self._listener is not None:
+            self._listener.close()
+
+    def _handle_client(self, conn):
+        with self._stats_lock:
+            self.clients += 1
+            self.total_clients += 1
+        try:
+            while self.running:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = self._dispatch(message)
+                except Exception as e:
+                    self.errors += 1
+                    reply = {'error': str(e)}
+                conn.send(reply)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            conn.close()
+            with self._stats_lock:
+                self.clients -= 1
+
+    def _dispatch(self, message):
+        op = message.get('op')
+        if op == 'stats':
+            return self.stats()
+        if op == 'classify':
+            crops = [c for c in message['crops'] if c is not None and c.size > 0]
+            bboxes = [None] * len(crops)
+        elif op == 'predict':
+            t0 = time.perf_counter()
+            with self._detect_lock:
+                faces = self.ai.detect_faces(as_frame(message['frame']))
+            self.detect_time.record(time.perf_counter() - t0)
+            crops = [roi for roi, _ in faces]
+            bboxes = [bbox for _, bbox in faces]
+        else:
+            raise ValueError(f"Unknown operation '{op}'")
+
+        request = _Request(crops, bboxes)
+        if crops:
+            if not self.requests.put(request):
+                raise RuntimeError("Service is shutting down")
+            request.done.wait()
+            if request.error is not None:
+                raise RuntimeError(request.error)
+        return {'faces': request.results or [], 'queue_ms': request.queue_time * 1000.0}
+
+    def _batch_loop(self):
+        """Batcher thread: gather requests within the latency budget, classify them together"""
+        carry = None
+        while self.running:
+            first = carry if carry is not None else self._claim(0.5)
+            carry = None
+            if first is None:
+                continue
+            batch, faces = [first], len(first.crops)
+            deadline = first.arrived + self.max_wait
+            # Each connection has at most one request outstanding, so once every
+            # client's request is in a batch there is nobody left to wait for
+            while faces < self.max_batch and self._claimed < self.clients:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                request = self._claim(remaining)
+                if request is None:
+                    break
+                if faces + len(request.crops) > self.max_batch:
+                    carry = request  # Starts the next batch
+                    break
+                batch.append(request)
+                faces += len(request.crops)
+            try:
+                self._run_batch(batch, faces)
+            except Exception as e:
+                # Handlers wait on their requests without a timeout: never leave one unanswered
+                for request in batch:
+                    if not request.done.is_set():
+                        request.fail(f"Batch failed: {e}")
+            with self._stats_lock:
+                self._claimed -= len(batch)
+        if carry is not None:
+            carry.fail("Service is shutting down")
+
+    def _claim(self, timeout):
+        """Next queued request, counted as taken by a batcher until its batch is done"""
+        request = self.requests.get(timeout=timeout)
+        if request is not None:
+            with self._stats_lock:
+                self._claimed += 1
+        return request
+
+    def _run_batch(self, batch, faces):
+        start = time.monotonic()
+        for request in batch:
+            request.queue_time = start - request.arrived
+
+        crops = [crop for request in batch for crop in request.crops]
+        t0 = time.perf_counter()
+        preds = self.ai.classify_faces(self.ai.preprocess_faces(crops), crops)
+        elapsed = time.perf_counter() - t0
+        with self._stats_lock:  # Several batchers may finish at once
+            for request in batch:
+                self.queue_time.record(request.queue_time)
+            self.inference_time.record(elapsed)
+            self.batch_sizes[faces] += 1
+            self.requests_per_batch[len(batch)] += 1
+            self.served += len(batch)
+            if preds is None:
+                self.errors += len(batch)  # Answered with the empty fallback below
+
+        row = 0
+        for request in batch:
+            results = []
+            for bbox in request.bboxes:
+                if preds is None:
+                    results.append({'emotion': 'Neutral', 'confidence': 0.0, 'probabilities': {}, 'bbox': bbox})
+                else:
+                    emotion, confidence, probabilities = self.ai._decode_predictions(preds[row])
+                    results.append({'emotion': emotion, 'confidence': confidence,
+                                    'probabilities': probabilities, 'bbox': bbox})
+                row += 1
+            request.results = results
+            request.done.set()
+
+    def stats(self):
+        """
+        Queue time, batch composition and latency figures
+
+        Returns:
+            dict with queue/inference/detection latency (ms), histograms of
+            faces and requests per batch, mean batch size and client counts
+        """
+        batches = sum(self.batch_sizes.values())
+        return {
+            'clients': self.clients,
+            'total_clients': self.total_clients,
+            'served': self.served,
+            'errors': self.errors,
+            'batches': batches,
+            'mean_batch_size': sum(n * c for n, c in self.batch_sizes.items()) / batches if batches else 0.0,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            'requests_per_batch': dict(sorted(self.requests_per_batch.items())),
+            'queue': self.queue_time.snapshot(),
+            'inference': self.inference_time.snapshot(),
+            'detect': self.detect_time.snapshot(),
+            'queue_depth': self.requests.stats()
+        }
+
+
+class EmotionServiceClient:
+    """
+    Client side of EmotionInferenceService
+
+    classify() and predict_faces() are plain blocking calls. For the app,
+    start_async() / submit_frame() / stop_async() mirror EmotionAI's async
+    interface: a worker thread sends the newest frame, smooths the largest
+    face's probabilities locally and returns an EmotionAI.predict()-style
+    result, so a kiosk needs neither TensorFlow nor MediaPipe loaded.
+    """
+
+    EMOTIONS = EMOTIONS
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, smoothing='window', history_size=5):
+        self.address = parse_address(address)
+        self.authkey = authkey if authkey is not None else service_authkey(self.address)
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self.smoother = create_smoother(smoothing, len(self.EMOTIONS), window=history_size)
+
+        # Asynchronous mode: single-slot mailbox, latest frame wins (as in EmotionAI)
+        self._mailbox = None
+        self._mailbox_cond = threading.Condition()
+        self._worker = None
+        self._async_running = False
+        self._result_callback = None
+        self.submitted_frames = 0
+        self.processed_frames = 0
+        self.dropped_frames = 0
+        self.async_latency = LatencyHistogram()  # Round trip per frame, read by rate controllers
+
+    def _call(self, message):
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = Client(self.address, authkey=self.authkey)
+            try:
+                self._conn.send(message)
+                reply = self._conn.recv()
+            except (EOFError, OSError):
+                self._conn.close()
+                self._conn = None  # Reconnect on the next call
+                raise
+        if 'error' in reply:
+            raise RuntimeError(f"Emotion service: {reply['error']}")
+        return reply
+
+    def classify(self, crops):
+        """Classify BGR face crops; returns one result dict per non-empty crop"""
+        return self._call({'op': 'classify', 'crops': list(crops)})['faces']
+
+    def predict_faces(self, frame):
+        """Detect and classify every face in a frame; returns one result dict per face"""
+        frame = as_frame(frame)
+        return self._call({'op': 'predict', 'frame': frame.bgr})['faces']
+
+    def predict(self, frame):
+        """EmotionAI.predict()-style result for the largest face, smoothed on this side"""
+        faces = self.predict_faces(frame)
+        if not faces:
+            self.smoother.reset()
+            return {'emotion': 'No Face', 'confidence': 0.0, 'probabilities': {},
+                    'smoothed_probabilities': {}, 'bbox': None, 'track_id': None, 'face_detected': False}
+        face = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
+        if not face['probabilities']:
+            return dict(face, smoothed_probabilities={}, track_id=None, face_detected=True)
+        probs = np.array([face['probabilities'][e] for e in self.EMOTIONS], dtype=np.float32)
+        smoothed = self.smoother.update(probs)
+        idx = self.smoother.label_index
+        return {
+            'emotion': self.EMOTIONS[idx],
+            'confidence': float(smoothed[idx]),
+            'probabilities': face['probabilities'],
+            'smoothed_probabilities': {e: float(smoothed[i]) for i, e in enumerate(self.EMOTIONS)},
+            'bbox': face['bbox'],
+            'track_id': None,
+            'face_detected': True
+        }
+
+    def service_stats(self):
+        return self._call({'op': 'stats'})
+
+    def start_async(self, callback):
+        """Run predict() on a worker thread; results reach callback on the Kivy main thread"""
+        from kivy.clock import Clock
+
+        self._result_callback = callback
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._async_running = True
+        self._worker = threading.Thread(target=self._inference_loop, args=(Clock,), name='EmotionService-client',
+                                        daemon=True)
+        self._worker.start()
+
+    def submit_frame(self, frame):
+        """Hand the newest frame to the worker; an unsent older frame is dropped"""
+        if frame is None:
+            return
+        with self._mailbox_cond:
+            if self._mailbox is not None:
+                self.dropped_frames += 1
+            self._mailbox = frame
+            self.submitted_frames += 1
+            self._mailbox_cond.notify()
+
+    def _inference_loop(self, clock):
+        while True:
+            with self._mailbox_cond:
+                while self._mailbox is None and self._async_running:
+                    self._mailbox_cond.wait()
+                if not self._async_running:
+                    return
+                frame = self._mailbox
+                self._mailbox = None
+
+            t0 = time.perf_counter()
+            try:
+                result = self.predict(frame)
+            except (OSError, EOFError, RuntimeError) as e:
+                print(f"[WARN] Emotion service unavailable: {e}")
+                time.sleep(1.0)
+                continue
+            self.async_latency.record(time.perf_counter() - t0)
+            self.processed_frames += 1
+            callback = self._result_callback
+            if callback is not None:
+                clock.schedule_once(lambda dt, cb=callback, r=result: self._deliver(cb, r))
+
+    def _deliver(self, callback, result):
+        if self._async_running and callback is self._result_callback:
+            callback(result)
+
+    def stop_async(self):
+        with self._mailbox_cond:
+            self._async_running = False
+            self._mailbox = None
+            self._mailbox_cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+            self._worker = None
+        self._result_callback = None
+
+    def async_stats(self):
+        return {
+            'submitted': self.submitted_frames,
+            'processed': self.processed_frames,
+            'dropped': self.dropped_frames,
+            'latency': self.async_latency.snapshot()
+        }
+
+    def cleanup(self):
+        self.stop_async()
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,114 @@
+import time
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    Rolling window of the most recent latency samples
+
+    Samples go into a preallocated ring buffer with a running sum, so
+    record() is O(1); percentiles are only computed when a snapshot is
+    requested. The buffer is a plain list because scalar reads and writes
+    on it are several times cheaper than on a NumPy array.
+    """
+
+    def __init__(self, window=256):
+        self.samples = [0.0] * window
+        self.window = window
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def record(self, seconds):
+        if self.count == self.window:
+            self.total -= self.samples[self.index]
+        else:
+            self.count += 1
+        self.samples[self.index] = seconds
+        self.total += seconds
+        self.last = seconds
+        self.index = (self.index + 1) % self.window
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self):
+        """Latency summary in milliseconds over the current window"""
+        if not self.count:
+            return {'count': 0}
+        p50, p95, p99 = np.percentile(self.samples[:self.count], [50, 95, 99]) * 1000.0
+        return {
+            'count': self.count,
+            'last_ms': self.last * 1000.0,
+            'mean_ms': self.mean * 1000.0,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+        }
+
+    def reset(self):
+        self.samples = [0.0] * self.window
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+
+class PipelineStats:
+    """
+    Per-stage latency histograms and event counters for the emotion pipeline
+
+    Callers time a stage with time.perf_counter() and pass the elapsed
+    seconds to record(); with `enabled` False both record() and count() are
+    no-ops.
+    """
+
+    STAGES = ('color_convert', 'detect', 'track', 'crop', 'resize', 'invoke', 'smooth')
+    COUNTERS = ('frames', 'faces_found', 'no_face', 'gate_hits', 'errors')
+
+    def __init__(self, window=256, enabled=True):
+        self.enabled = enabled
+        self.histograms = {stage: LatencyHistogram(window) for stage in self.STAGES}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self._frame_times = LatencyHistogram(window)
+        self._last_frame = None
+
+    def record(self, stage, seconds):
+        if self.enabled:
+            self.histograms[stage].record(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def frame(self):
+        """Mark the start of a new frame (drives the fps estimate)"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self._frame_times.record(now - self._last_frame)
+        self._last_frame = now
+        self.counters['frames'] += 1
+
+    @property
+    def fps(self):
+        mean = self._frame_times.mean
+        return 1.0 / mean if mean > 0 else 0.0
+
+    def snapshot(self):
+        """Copy of the current counters plus latency percentiles per stage"""
+        return {
+            'fps': self.fps,
+            'stages': {stage: hist.snapshot() for stage, hist in self.histograms.items()},
+            'counters': dict(self.counters),
+        }
+
+    def reset(self):
+        for hist in self.histograms.values():
+            hist.reset()
+        self._frame_times.reset()
+        self._last_frame = None
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
@@ -0,0 +1,4 @@
+# Class order of the mini_xception models' leading outputs. Kept free of
+# heavy imports so tools and service clients can use it without loading
+# TensorFlow or MediaPipe.
+EMOTIONS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Neutral', 'Sad', 'Surprise']
@@ -0,0 +1,237 @@
+import json
+import os
+import numpy as np
+from pathlib import Path
+
+from modules.backends import DEFAULT_CACHE_PATH, _cache_key, available_backends, benchmark_backend
+
+
+# Selection rules per device profile: optional latency budget plus what to optimize
+DEVICE_PROFILES = {
+    'pi': {'max_latency_ms': 5.0, 'prefer': 'accuracy'},
+    'low_power': {'prefer': 'latency'},
+    'desktop': {'prefer': 'accuracy'},
+}
+
+# Written by the dataset evaluation tool: {"<file name>": accuracy, ...}
+ACCURACY_FILE = 'model_accuracy.json'
+
+
+def _rss_bytes():
+    """Current resident set size of this process, or None if it cannot be read"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelVariant:
+    """One model file from the mini_xception family and what we know about it"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.stem
+        self.format = self.path.suffix.lstrip('.').lower()
+        self.file_size = self.path.stat().st_size
+        self.backend_name = None
+        self.input_shape = None
+        self.input_dtype = None
+        self.input_quantization = None  # (scale, zero_point)
+        self.latency_ms = None
+        self.memory_bytes = None
+        self.accuracy = None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'path': str(self.path),
+            'format': self.format,
+            'file_size': self.file_size,
+            'backend': self.backend_name,
+            'input_shape': list(self.input_shape) if self.input_shape else None,
+            'input_dtype': np.dtype(self.input_dtype).name if self.input_dtype is not None else None,
+            'input_quantization': list(self.input_quantization) if self.input_quantization else None,
+            'latency_ms': self.latency_ms,
+            'memory_bytes': self.memory_bytes,
+            'accuracy': self.accuracy,
+        }
+
+    def __repr__(self):
+        return f"ModelVariant({self.path.name!r}, input={self.input_shape}, latency_ms={self.latency_ms})"
+
+
+class ModelRegistry:
+    """
+    Discovers the model variants in models/ and picks one per device profile
+
+    discover() reads each file's input shape, dtype and quantization,
+    measure() times every variant on this machine (results are cached next
+    to the backend choices), and select() applies a profile.
+    """
+
+    def __init__(self, models_dir='models', cache_path=DEFAULT_CACHE_PATH.with_name('models.json')):
+        self.models_dir = Path(models_dir)
+        self.cache_path = Path(cache_path)
+        self.variants = []
+
+    def discover(self):
+        """Find every loadable model file and read its input details"""
+        self.variants = []
+        accuracy = self._load_accuracy()
+        for path in sorted(self.models_dir.glob('*')):
+            variant = self._load_variant(path)
+            if variant is not None:
+                variant.accuracy = accuracy.get(path.name)
+                self.variants.append(variant)
+        return self.variants
+
+    def _load_variant(self, path):
+        """ModelVariant with the input details of path, or None if no backend can load it"""
+        path = Path(path)
+        backends = available_backends(path) if path.is_file() else []
+        if not backends:
+            return None
+        try:
+            backend = backends[0](path)
+        except Exception as e:
+            print(f"[WARN] Skipping {path.name}: {e}")
+            return None
+        variant = ModelVariant(path)
+        variant.backend_name = backend.name
+        variant.input_shape = backend.input_shape
+        variant.input_dtype = backend.input_dtype
+        variant.input_quantization = tuple(backend.input_quantization)
+        backend.close()
+        return variant
+
+    def _load_accuracy(self):
+        try:
+            with open(self.models_dir / ACCURACY_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def measure(self, runs=50, refresh=False, variants=None):
+        """
+        Measure latency (median ms for one face) and memory (RSS growth while
+        loading and running) for every variant (or just `variants`) on this
+        machine
+        """
+        if variants is None:
+            if not self.variants:
+                self.discover()
+            variants = self.variants
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+        rng = np.random.default_rng(0)
+        for variant in variants:
+            key = _cache_key(variant.path)
+            if key in cache and not refresh:
+                variant.latency_ms = cache[key]['latency_ms']
+                variant.memory_bytes = cache[key]['memory_bytes']
+                continue
+
+            rss_before = _rss_bytes()
+            backend = available_backends(variant.path)[0](variant.path)
+            batch = rng.integers(0, 256, size=(1,) + backend.input_shape, dtype=np.uint8)
+            variant.latency_ms, _ = benchmark_backend(backend, batch, runs=runs)
+            rss_after = _rss_bytes()
+            backend.close()
+            if rss_before is not None and rss_after is not None:
+                variant.memory_bytes = max(0, rss_after - rss_before)
+            cache[key] = {'latency_ms': variant.latency_ms, 'memory_bytes': variant.memory_bytes}
+            print(f"[BENCH] {variant.path.name}: {variant.latency_ms:.2f} ms")
+
+        try:
+            os.makedirs(self.cache_path.parent, exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+        except OSError as e:
+            print(f"[WARN] Could not write model cache {self.cache_path}: {e}")
+        return variants
+
+    def get(self, name):
+        """Look up a variant by file name or stem"""
+        for variant in self.variants:
+            if name in (variant.name, variant.path.name):
+                return variant
+        return None
+
+    def select(self, profile='pi'):
+        """
+        Pick a variant for a device profile
+
+        Args:
+            profile: Name in DEVICE_PROFILES, or a dict with optional
+                'max_latency_ms' and 'prefer' ('latency' or 'accuracy')
+
+        Returns:
+            ModelVariant, or None if no variant fits
+        """
+        if isinstance(profile, str):
+            try:
+                profile = DEVICE_PROFILES[profile]
+            except KeyError:
+                raise ValueError(f"Unknown device profile '{profile}', expected one of {sorted(DEVICE_PROFILES)}")
+        if not self.variants:
+            self.discover()
+        max_latency = profile.get('max_latency_ms')
+        if max_latency is not None and any(v.latency_ms is None for v in self.variants):
+            self.measure()
+
+        candidates = [v for v in self.variants
+                      if max_latency is None or (v.latency_ms is not None and v.latency_ms <= max_latency)]
+        if not candidates:
+            return None
+
+        if profile.get('prefer', 'accuracy') == 'latency':
+            if any(v.latency_ms is None for v in candidates):
+                self.measure()
+            return min(candidates, key=lambda v: v.latency_ms)
+        # Unknown accuracy ranks below any measured one; file size breaks ties
+        return max(candidates, key=lambda v: (v.accuracy is not None, v.accuracy or 0.0, v.file_size))
+
+    def cascade_variant(self, main_path):
+        """
+        Pick the cheap first-pass model for a cascade in front of main_path
+
+        Only integer-quantized TFLite files qualify, and only if their
+        measured latency (measure(), cached per machine) is below the main
+        model's; the fastest one wins. File size is no guide here: a float
+        file can be smaller than a quantized one and still run slower.
+
+        Returns:
+            ModelVariant, or None if no quantized variant is faster than the main model
+        """
+        main_path = Path(main_path)
+        main = self._load_variant(main_path)
+        if main is None:
+            return None
+        candidates = []
+        for path in sorted(self.models_dir.glob('*.tflite')):
+            if path.resolve() == main_path.resolve():
+                continue
+            variant = self._load_variant(path)
+            if variant is not None and _is_quantized(variant):
+                candidates.append(variant)
+        if not candidates:
+            return None
+        self.measure(variants=[main] + candidates)
+        faster = [v for v in candidates if v.latency_ms < main.latency_ms]
+        return min(faster, key=lambda v: v.latency_ms) if faster else None
+
+
+def _is_quantized(variant):
+    """Integer input with a quantization scale, i.e. an integer-quantized model"""
+    scale = variant.input_quantization[0] if variant.input_quantization else 0.0
+    return np.issubdtype(variant.input_dtype, np.integer) and scale > 0
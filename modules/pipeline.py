@@ -0,0 +1,358 @@
+import collections
+import threading
+import time
+
+from modules.frame import Frame, as_frame
+from modules.frame_source import FrameSource
+from modules.instrumentation import LatencyHistogram
+
+
+class BoundedQueue:
+    """
+    Fixed-capacity hand-off between two pipeline stages
+
+    When the queue is full, put() either discards the oldest queued item
+    ('drop_oldest': consumers always see the freshest frames, the producer
+    never waits) or waits for room ('block': nothing is lost and a slow
+    stage throttles the ones before it). Closing the queue wakes every
+    waiter; get() then drains what is left and returns None.
+    """
+
+    POLICIES = ('drop_oldest', 'block')
+
+    def __init__(self, maxsize=2, policy='drop_oldest'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {self.POLICIES}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item):
+        """Queue an item; returns False if the queue was closed"""
+        with self._cond:
+            if self.policy == 'block':
+                while len(self._items) >= self.maxsize and not self.closed:
+                    self._cond.wait()
+            elif len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            if self.closed:
+                return False
+            self._items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Next item, or None once the queue is closed and empty (or on timeout)"""
+        with self._cond:
+            while not self._items and not self.closed:
+                if not self._cond.wait(timeout):
+                    return None
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self, discard=False):
+        """
+        Stop accepting items; with discard, also drop the ones still queued
+
+        Returns:
+            List of the discarded items (empty without discard)
+        """
+        with self._cond:
+            self.closed = True
+            discarded = []
+            if discard:
+                discarded = list(self._items)
+                self._items.clear()
+            self._cond.notify_all()
+            return discarded
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            'depth': len(self._items),
+            'max_depth': self.max_depth,
+            'capacity': self.maxsize,
+            'policy': self.policy,
+            'put': self.put_count,
+            'dropped': self.dropped
+        }
+
+
+class PipelineStage:
+    """
+    One worker thread: take an item from `inbox`, run fn on it, pass the
+    result to `outbox`
+
+    fn returning None drops the item. When the inbox is closed and drained
+    the stage closes its outbox, so end-of-stream flows down the pipeline.
+    """
+
+    def __init__(self, name, fn, inbox, outbox=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.latency = LatencyHistogram()
+        self.processed = 0
+        self.errors = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                item = self.inbox.get()
+                if item is None:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    out = self.fn(item)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[ERROR] Pipeline stage {self.name}: {e}")
+                    continue
+                self.latency.record(time.perf_counter() - t0)
+                self.processed += 1
+                if out is not None and self.outbox is not None:
+                    self.outbox.put(out)
+        finally:
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        snapshot = self.latency.snapshot()
+        snapshot['processed'] = self.processed
+        snapshot['errors'] = self.errors
+        return snapshot
+
+
+class EmotionPipeline:
+    """
+    Staged capture -> detect -> classify execution of EmotionAI
+
+    Each stage runs on its own thread and hands over through a
+    BoundedQueue, so detection of frame N+1 overlaps with classification of
+    frame N (and with capture of frame N+2). Detection runs
+    EmotionAI.locate_face() and classification runs
+    EmotionAI.classify_located(); the two touch disjoint EmotionAI state,
+    so do not call predict() on the same instance while the pipeline runs.
+
+    With a `source`, the pipeline reads frames itself and keeps the newest
+    one in `latest_frame` for display (see display_source()); without one,
+    frames are fed with submit(). The capture stage can be throttled with
+    set_rates(): it reads at most capture_fps frames per second and passes
+    a frame on to detection at most once per detect_interval, so a rate
+    controller or an idle scene slows inference down like the async mode.
+    """
+
+    def __init__(self, ai, source=None, callback=None, queue_size=2, policy='drop_oldest',
+                 capture_fps=None, detect_interval=0.0):
+        """
+        Args:
+            ai: EmotionAI instance to run
+            source: Optional FrameSource for the capture stage (opened by start())
+            callback: Called with every result dict, on the classify thread
+            queue_size: Capacity of each inter-stage queue
+            policy: 'drop_oldest' (live use) or 'block' (process every frame)
+            capture_fps: Maximum source reads per second (None = as fast as
+                the source delivers)
+            detect_interval: Minimum seconds between frames sent to detection
+                (0 = every captured frame)
+        """
+        self.ai = ai
+        self.source = source
+        self.callback = callback
+        self.queue_size = queue_size
+        self.policy = policy
+        self.capture_fps = capture_fps
+        self.detect_interval = detect_interval
+        self._next_detect = 0.0
+        self.throttled = 0  # Captured frames not sent to detection
+        self.latest_frame = None
+        self.end_to_end = LatencyHistogram()  # Capture timestamp to result
+        self.frame_count = 0
+        self.running = False
+        self._build()
+
+    def _build(self):
+        self.frames = BoundedQueue(self.queue_size, self.policy)  # capture -> detect
+        self.faces = BoundedQueue(self.queue_size, self.policy)  # detect -> classify
+        self.stages = [
+            PipelineStage('detect', self._detect, self.frames, self.faces),
+            PipelineStage('classify', self._classify, self.faces),
+        ]
+        self.capture_latency = LatencyHistogram()
+        self._capture_thread = None
+
+    def start(self):
+        """Start the stage threads (and open the source); returns False if the source cannot be opened"""
+        if self.running:
+            return True
+        if self.source is not None and not self.source.open():
+            print(f"[ERROR] Pipeline could not open {self.source.describe()}")
+            return False
+        self._build()
+        self._next_detect = 0.0
+        self.running = True
+        for stage in self.stages:
+            stage.start()
+        if self.source is not None:
+            self._capture_thread = threading.Thread(target=self._capture_loop, name='pipeline-capture', daemon=True)
+            self._capture_thread.start()
+        return True
+
+    def submit(self, frame):
+        """Feed one frame into the detect stage (for pipelines without a source)"""
+        if not self.running or frame is None:
+            return False
+        return self.frames.put(as_frame(frame))
+
+    def set_rates(self, capture_fps=None, detect_interval=0.0):
+        """Change the capture rate and the detection interval while running"""
+        self.capture_fps = capture_fps
+        self.detect_interval = detect_interval
+
+    def detect_next(self):
+        """Send the next captured frame to detection regardless of detect_interval"""
+        self._next_detect = 0.0
+
+    def _capture_loop(self):
+        next_read = time.monotonic()
+        try:
+            while self.running:
+                fps = self.capture_fps  # Read once: set_rates() may change it from the UI thread
+                if fps:
+                    now = time.monotonic()
+                    if next_read > now:
+                        time.sleep(next_read - now)
+                    next_read = max(now, next_read) + 1.0 / fps
+                t0 = time.perf_counter()
+                ret, image = self.source.read()
+                if not ret:
+                    if not self.source.realtime:
+                        return  # Recording exhausted: let the stages drain
+                    time.sleep(0.01)
+                    continue
+                frame = Frame(image, index=self.frame_count)
+                self.frame_count += 1
+                self.capture_latency.record(time.perf_counter() - t0)
+                self.latest_frame = frame
+                if frame.timestamp < self._next_detect:
+                    self.throttled += 1
+                    continue
+                self._next_detect = frame.timestamp + self.detect_interval
+                self.frames.put(frame)
+        finally:
+            self.frames.close()
+
+    def _detect(self, frame):
+        face_roi, bbox = self.ai.locate_face(frame)
+        return frame, face_roi, bbox
+
+    def _classify(self, item):
+        frame, face_roi, bbox = item
+        self.ai.perf.frame()
+        result = self.ai.classify_located(frame, face_roi, bbox)
+        self.end_to_end.record(time.monotonic() - frame.timestamp)
+        if self.callback is not None:
+            self.callback(result)
+        return None
+
+    def wait(self, timeout=None):
+        """Block until every stage has drained (end of a recording); returns True if they did"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for stage in self.stages:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            stage.join(remaining)
+        return not any(stage.alive for stage in self.stages)
+
+    def stop(self):
+        """Stop all stages, discarding queued frames, and release the source"""
+        if not self.running:
+            return
+        self.running = False
+        self.frames.close(discard=True)
+        self.faces.close(discard=True)
+        if self._capture_thread is not None:
+            self._capture_thread.join(timeout=1.0)
+            self._capture_thread = None
+        for stage in self.stages:
+            stage.join(timeout=1.0)
+        if self.source is not None:
+            self.source.release()
+
+    def display_source(self):
+        """FrameSource that serves latest_frame, for a CameraCapture showing the pipeline's frames"""
+        return PipelineDisplaySource(self)
+
+    def stats(self):
+        """
+        Per-stage latency (ms) and throughput, per-queue depth and drops,
+        and the capture-to-result latency
+        """
+        stages = {'capture': self.capture_latency.snapshot()}
+        stages['capture']['processed'] = self.frame_count
+        stages['capture']['throttled'] = self.throttled
+        for stage in self.stages:
+            stages[stage.name] = stage.stats()
+        return {
+            'stages': stages,
+            'queues': {'capture->detect': self.frames.stats(), 'detect->classify': self.faces.stats()},
+            'end_to_end': self.end_to_end.snapshot()
+        }
+
+
+class PipelineDisplaySource(FrameSource):
+    """
+    Read side of a running EmotionPipeline: read() returns the newest captured Frame
+
+    Reads faster than the pipeline captures return the same Frame again;
+    CameraCapture recognizes it by its index and skips it.
+    """
+
+    realtime = True
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def open(self):
+        return self.pipeline.start()
+
+    def is_opened(self):
+        return self.pipeline.running
+
+    def read(self, out=None):
+        frame = self.pipeline.latest_frame
+        return frame is not None, frame
+
+    def release(self):
+        self.pipeline.stop()
+
+    def describe(self):
+        return f"pipeline ({self.pipeline.source.describe() if self.pipeline.source else 'submit'})"
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+
+
+def preprocess_bgr_into(face_roi, out, scratch=None):
+    """
+    Preprocess one BGR face crop into a preallocated grayscale image
+
+    The crop is resized first and converted to grayscale second, so only
+    size x size pixels go through the color conversion. With `scratch`
+    given, nothing is allocated.
+
+    Args:
+        face_roi: BGR face crop of any size
+        out: (size, size) uint8 array to fill, e.g. batch[i, :, :, 0]
+        scratch: Optional (size, size, 3) uint8 array for the resized color crop
+
+    Returns:
+        out
+    """
+    h, w = out.shape[:2]
+    if scratch is None:
+        scratch = np.empty((h, w, 3), dtype=np.uint8)
+    cv2.resize(face_roi, (w, h), dst=scratch, interpolation=cv2.INTER_AREA)
+    cv2.cvtColor(scratch, cv2.COLOR_BGR2GRAY, dst=out)
+    return out
+
+
+def preprocess_bgr_batch(face_rois, size, out=None):
+    """
+    Preprocess BGR face crops into one (N, size, size, 1) uint8 batch
+
+    Together with preprocess_bgr_into() this is the single implementation
+    of the model's preprocessing: INTER_AREA resize to (size, size), then
+    grayscale conversion, uint8 pixels, NHWC layout with one channel.
+    Backends then map the pixels to their model's input encoding with
+    input_lut(). EmotionAI, the backend parity check and the offline
+    evaluation all use it, so live and offline numbers come from identical
+    inputs. Grayscale images loaded as BGR (equal channels) convert back
+    to exactly their gray levels.
+
+    Args:
+        face_rois: Sequence of BGR crops, or an (N, h, w, 3) uint8 array
+        size: Model input height/width
+        out: Optional preallocated (N, size, size, 1) uint8 array to fill
+
+    Returns:
+        uint8 array of shape (N, size, size, 1)
+    """
+    n = len(face_rois)
+    if out is None:
+        out = np.empty((n, size, size, 1), dtype=np.uint8)
+
+    # Already at model resolution (e.g. FER-2013's 48x48 faces): one conversion for the whole batch
+    if isinstance(face_rois, np.ndarray) and face_rois.shape[1:] == (size, size, 3):
+        cv2.cvtColor(face_rois.reshape(n * size, size, 3), cv2.COLOR_BGR2GRAY, dst=out.reshape(n * size, size))
+        return out
+
+    scratch = np.empty((size, size, 3), dtype=np.uint8)
+    for i, roi in enumerate(face_rois):
+        preprocess_bgr_into(roi, out[i, :, :, 0], scratch)
+    return out
+
+
+def input_value_range(dtype, quantization=(0.0, 0)):
+    """
+    Real-valued range the model expects gray levels 0-255 to map onto
+
+    Mini-Xception is trained on pixels scaled to [-1, 1], which is what
+    float models get. A quantized input's calibration range tells which
+    scaling its model was converted with: one that cannot represent
+    negative values was calibrated on [0, 1]. Integer inputs without
+    quantization parameters take raw pixels.
+
+    Returns:
+        (low, high) for gray levels 0 and 255
+    """
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.integer):
+        return -1.0, 1.0
+    scale, zero_point = quantization
+    if not scale:
+        return 0.0, 255.0
+    return (0.0, 1.0) if (np.iinfo(dtype).min - zero_point) * scale >= 0 else (-1.0, 1.0)
+
+
+def input_lut(dtype, quantization=(0.0, 0), value_range=None):
+    """
+    256-entry table from gray level to the model's exact input encoding
+
+    Gray level g becomes low + g * (high - low) / 255; for quantized
+    inputs that value is then quantized with the tensor's scale and zero
+    point (rounded, saturated to the dtype's range).
+
+    Args:
+        dtype: Model input dtype (float32, int8, uint8, ...)
+        quantization: (scale, zero_point) of the input tensor; scale 0 = not quantized
+        value_range: (low, high) override; defaults to input_value_range()
+
+    Returns:
+        (256,) array of `dtype`
+    """
+    dtype = np.dtype(dtype)
+    low, high = value_range if value_range is not None else input_value_range(dtype, quantization)
+    values = low + np.arange(256, dtype=np.float64) * ((high - low) / 255.0)
+    if not np.issubdtype(dtype, np.integer):
+        return values.astype(dtype)
+    scale, zero_point = quantization
+    if scale:
+        values = np.round(values / scale + zero_point)
+    info = np.iinfo(dtype)
+    return np.clip(values, info.min, info.max).astype(dtype)
+
+
+def apply_input_lut(gray, lut, out=None):
+    """
+    Encode an (N, H, W, 1) uint8 batch for the model in one cv2.LUT pass
+
+    Args:
+        gray: uint8 batch from the preprocess_* functions
+        lut: Table from input_lut()
+        out: Optional contiguous (N, H, W, 1) array of lut's dtype to fill,
+            e.g. the interpreter's input tensor
+
+    Returns:
+        out
+    """
+    if out is None:
+        out = np.empty(gray.shape, dtype=lut.dtype)
+    rows = gray.shape[0] * gray.shape[1]
+    cv2.LUT(gray.reshape(rows, -1), lut, dst=out.reshape(rows, -1))
+    return out
@@ -0,0 +1,134 @@
+import collections
+import os
+import time
+
+
+def _cpu_percent_reader():
+    """
+    Return a function giving CPU utilisation (0-1) since its previous call
+
+    Uses psutil's system-wide figure when installed; otherwise falls back
+    to this process's CPU time over wall time, spread across all cores.
+    """
+    try:
+        import psutil
+        psutil.cpu_percent(None)  # Prime the counter
+        return lambda: psutil.cpu_percent(None) / 100.0
+    except ImportError:
+        pass
+
+    cores = os.cpu_count() or 1
+    state = {'cpu': time.process_time(), 'wall': time.monotonic()}
+
+    def read():
+        cpu, wall = time.process_time(), time.monotonic()
+        elapsed = wall - state['wall']
+        load = (cpu - state['cpu']) / (elapsed * cores) if elapsed > 0 else 0.0
+        state['cpu'], state['wall'] = cpu, wall
+        return min(1.0, load)
+    return read
+
+
+class AdaptiveRateController:
+    """
+    Picks the camera display rate and the inference interval from measurements
+
+    Every update() compares the measured UI frame rate and CPU load with
+    the targets and moves both rates: additive-increase while there is
+    headroom, multiplicative back-off under load (the rates drop fast when
+    the device struggles and recover gradually). The inference interval
+    never goes below `latency_headroom` times the measured inference
+    latency, so the worker is not handed frames faster than it can finish
+    them. All values stay within the configured floors and ceilings.
+    """
+
+    def __init__(self, target_ui_fps=30.0, min_camera_fps=10, max_camera_fps=30,
+                 min_inference_interval=0.1, max_inference_interval=1.0,
+                 cpu_high=0.85, cpu_low=0.6, latency_headroom=1.5, history=32):
+        """
+        Args:
+            target_ui_fps: Kivy frame rate to hold
+            min_camera_fps, max_camera_fps: Floor and ceiling for the display rate
+            min_inference_interval, max_inference_interval: Floor and ceiling
+                (seconds) between inference submissions
+            cpu_high: CPU load (0-1) above which rates back off
+            cpu_low: CPU load below which rates may speed up
+            latency_headroom: Minimum interval as a multiple of inference latency
+            history: Number of recent decisions kept for inspection
+        """
+        self.target_ui_fps = target_ui_fps
+        self.min_camera_fps = min_camera_fps
+        self.max_camera_fps = max_camera_fps
+        self.min_inference_interval = min_inference_interval
+        self.max_inference_interval = max_inference_interval
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.latency_headroom = latency_headroom
+
+        # Start at the display ceiling and the historical 0.2 s interval; measurements take it from there
+        self.camera_fps = max_camera_fps
+        self.inference_interval = min(max_inference_interval, max(min_inference_interval, 0.2))
+        self.last_measurement = {}
+        self.reason = 'initial'
+        self.adjustments = 0
+        self.history = collections.deque(maxlen=history)
+        self._read_cpu = _cpu_percent_reader()
+
+    def update(self, ui_fps, inference_latency, cpu_load=None):
+        """
+        Feed one round of measurements and recompute the rates
+
+        Args:
+            ui_fps: Measured UI frame rate (e.g. Clock.get_fps())
+            inference_latency: Mean seconds per inference
+            cpu_load: CPU utilisation 0-1 (measured here when None)
+
+        Returns:
+            True if camera_fps or inference_interval changed
+        """
+        if cpu_load is None:
+            cpu_load = self._read_cpu()
+        self.last_measurement = {'ui_fps': ui_fps, 'inference_latency': inference_latency, 'cpu_load': cpu_load}
+        camera_fps, interval = self.camera_fps, self.inference_interval
+
+        ui_lagging = 0 < ui_fps < 0.9 * self.target_ui_fps
+        if ui_lagging or cpu_load > self.cpu_high:
+            reason = 'ui lagging' if ui_lagging else 'cpu high'
+            camera_fps = camera_fps * 0.75
+            interval = interval * 1.5
+        elif cpu_load < self.cpu_low and (ui_fps == 0 or ui_fps >= 0.95 * self.target_ui_fps):
+            reason = 'headroom'
+            camera_fps = camera_fps + 2
+            interval = interval - 0.05
+        else:
+            reason = 'steady'
+
+        # Never submit faster than the model can keep up with
+        if inference_latency and interval < inference_latency * self.latency_headroom:
+            interval = inference_latency * self.latency_headroom
+            reason = 'inference latency'
+
+        camera_fps = int(round(min(self.max_camera_fps, max(self.min_camera_fps, camera_fps))))
+        interval = round(min(self.max_inference_interval, max(self.min_inference_interval, interval)), 3)
+        changed = camera_fps != self.camera_fps or interval != self.inference_interval
+        self.camera_fps, self.inference_interval, self.reason = camera_fps, interval, reason
+        if changed:
+            self.adjustments += 1
+            self.history.append(dict(self.last_measurement, time=time.monotonic(), reason=reason,
+                                     camera_fps=camera_fps, inference_interval=interval))
+        return changed
+
+    def stats(self):
+        """Current choice, the measurements behind it and the recent decisions"""
+        return {
+            'camera_fps': self.camera_fps,
+            'inference_interval': self.inference_interval,
+            'reason': self.reason,
+            'adjustments': self.adjustments,
+            'measurement': dict(self.last_measurement),
+            'limits': {
+                'camera_fps': (self.min_camera_fps, self.max_camera_fps),
+                'inference_interval': (self.min_inference_interval, self.max_inference_interval)
+            },
+            'history': list(self.history)
+        }
@@ -0,0 +1,179 @@
+import numpy as np
+
+
+class ProbabilitySmoother:
+    """
+    Base class for temporal smoothing of emotion probability vectors
+
+    Keeps the most recent `window` probability vectors in a preallocated
+    NumPy ring buffer and a preallocated output vector. Subclasses update the
+    smoothed probabilities in place, so update() is O(1) in the window size
+    and does not allocate per frame.
+    """
+
+    def __init__(self, num_classes, window=5):
+        """
+        Args:
+            num_classes: Length of each probability vector
+            window: Number of recent frames kept in the ring buffer
+        """
+        self.num_classes = num_classes
+        self.window = max(1, int(window))
+        self.buffer = np.zeros((self.window, num_classes), dtype=np.float32)
+        self.smoothed = np.zeros(num_classes, dtype=np.float32)
+        self.index = 0  # Next ring buffer slot to write
+        self.count = 0  # Number of valid rows in the ring buffer
+
+    def _push(self, probs):
+        """Write probs into the ring buffer; returns the row that was evicted (or None)"""
+        evicted = self.buffer[self.index] if self.count == self.window else None
+        if evicted is not None:
+            self._evict(evicted)
+        self.buffer[self.index] = probs
+        self.index = (self.index + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+
+    def _evict(self, row):
+        """Hook called with a row just before it is overwritten"""
+        pass
+
+    def update(self, probs):
+        """
+        Add one frame of probabilities
+
+        Args:
+            probs: float array of length num_classes
+
+        Returns:
+            The smoothed probability vector (updated in place; copy it to keep it)
+        """
+        raise NotImplementedError
+
+    @property
+    def label_index(self):
+        """Index of the currently reported class"""
+        return int(np.argmax(self.smoothed))
+
+    def reset(self):
+        self.buffer.fill(0)
+        self.smoothed.fill(0)
+        self.index = 0
+        self.count = 0
+
+
+class EMASmoother(ProbabilitySmoother):
+    """Exponential moving average over probability vectors"""
+
+    def __init__(self, num_classes, window=5, alpha=None):
+        """
+        Args:
+            alpha: EMA weight of the newest frame; defaults to 2 / (window + 1)
+        """
+        super().__init__(num_classes, window)
+        self.alpha = alpha if alpha is not None else 2.0 / (self.window + 1)
+        self._scratch = np.zeros(num_classes, dtype=np.float32)
+
+    def update(self, probs):
+        first = self.count == 0
+        self._push(probs)
+        if first:
+            np.copyto(self.smoothed, probs)
+        else:
+            np.multiply(probs, self.alpha, out=self._scratch)
+            self.smoothed *= (1.0 - self.alpha)
+            self.smoothed += self._scratch
+        return self.smoothed
+
+
+class WindowMeanSmoother(ProbabilitySmoother):
+    """Mean of the last `window` probability vectors, kept as a running sum"""
+
+    def __init__(self, num_classes, window=5):
+        super().__init__(num_classes, window)
+        self._sum = np.zeros(num_classes, dtype=np.float64)
+        # float64 staging row: mixed-dtype in-place ufuncs allocate a cast buffer per call
+        self._row = np.zeros(num_classes, dtype=np.float64)
+
+    def _evict(self, row):
+        np.copyto(self._row, row)
+        self._sum -= self._row
+
+    def update(self, probs):
+        self._push(probs)
+        np.copyto(self._row, probs)
+        self._sum += self._row
+        np.multiply(self._sum, 1.0 / self.count, out=self._row)
+        np.copyto(self.smoothed, self._row, casting='unsafe')
+        return self.smoothed
+
+    def reset(self):
+        super().reset()
+        self._sum.fill(0)
+
+
+class HysteresisSmoother(ProbabilitySmoother):
+    """
+    Sticky label on top of another smoother
+
+    The reported label only switches when another class beats it by at
+    least `margin` in the inner smoother's probabilities.
+    """
+
+    def __init__(self, num_classes, window=5, margin=0.15, inner=None):
+        """
+        Args:
+            margin: Probability lead a new class needs before the label switches
+            inner: Smoother producing the probabilities (defaults to EMASmoother)
+        """
+        super().__init__(num_classes, window)
+        self.margin = margin
+        self.inner = inner if inner is not None else EMASmoother(num_classes, window)
+        # Share the inner smoother's buffers instead of keeping a second copy
+        self.buffer = self.inner.buffer
+        self.smoothed = self.inner.smoothed
+        self._label = None
+
+    def update(self, probs):
+        smoothed = self.inner.update(probs)
+        self.count = self.inner.count
+        self.index = self.inner.index
+        candidate = int(np.argmax(smoothed))
+        if self._label is None or smoothed[candidate] - smoothed[self._label] >= self.margin:
+            self._label = candidate
+        return smoothed
+
+    @property
+    def label_index(self):
+        if self._label is None:
+            return super().label_index
+        return self._label
+
+    def reset(self):
+        self.inner.reset()
+        self.index = 0
+        self.count = 0
+        self._label = None
+
+
+SMOOTHERS = {
+    'ema': EMASmoother,
+    'window': WindowMeanSmoother,
+    'hysteresis': HysteresisSmoother,
+}
+
+
+def create_smoother(strategy, num_classes, window=5, **kwargs):
+    """
+    Build a smoother by name
+
+    Args:
+        strategy: One of 'ema', 'window' or 'hysteresis'
+        num_classes: Length of each probability vector
+        window: Ring buffer length
+        **kwargs: Strategy-specific options (alpha, margin, ...)
+    """
+    try:
+        smoother_class = SMOOTHERS[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown smoothing strategy '{strategy}', expected one of {sorted(SMOOTHERS)}")
+    return smoother_class(num_classes, window=window, **kwargs)
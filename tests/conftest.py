@@ -0,0 +1,18 @@
+import os
+import time
+
+# Kivy parses sys.argv and logs to the console on import; neither is wanted under pytest
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+
+def wait_for(condition, timeout=10.0, tick=None):
+    """Poll condition() until it is true; tick() runs between polls (e.g. Clock.tick)"""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if tick is not None:
+            tick()
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
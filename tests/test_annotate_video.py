@@ -0,0 +1,9 @@
+import pytest
+
+from annotate_video import concat_segments
+
+
+def test_concat_without_segments_reports_an_error(tmp_path):
+    with pytest.raises(IOError, match="could be decoded"):
+        concat_segments([str(tmp_path / 'segment_0000.mp4')], tmp_path / 'out.mp4', 30.0, (64, 48))
+    assert not (tmp_path / 'out.mp4').exists()
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from modules import backends
+from modules.backends import InferenceBackend, select_backend, top1_agreement
+
+MODELS = Path(__file__).resolve().parent.parent / 'models'
+
+
+def _fake_backend(name, reference=False, flip=0.0, noise=0.0):
+    """Backend class scoring a face by its mean gray level; `flip` of the rows get another label"""
+
+    class Fake(InferenceBackend):
+        suffixes = ('.tflite',)
+
+        def __init__(self, model_path):
+            super().__init__(model_path)
+            self.input_shape = (48, 48, 1)
+
+        @classmethod
+        def available(cls):
+            return True
+
+        def run(self, batch):
+            labels = batch.reshape(len(batch), -1).mean(axis=1).astype(int) % 7
+            flipped = np.arange(len(batch)) < int(round(flip * len(batch)))
+            labels = np.where(flipped, (labels + 1) % 7, labels)
+            preds = np.full((len(batch), 7), 0.05 + noise, dtype=np.float32)
+            preds[np.arange(len(batch)), labels] = 0.7
+            return preds
+
+    Fake.name = name
+    Fake.reference = reference
+    return Fake
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = tmp_path / 'model.tflite'
+    path.write_bytes(b'not a real model')
+    return path
+
+
+def test_top1_agreement():
+    reference = np.eye(4, dtype=np.float32)
+    assert top1_agreement(reference + 0.1, reference) == 1.0
+    assert top1_agreement(reference[::-1], reference) == 0.0
+    assert top1_agreement(reference[:, :3], reference) == 0.0
+
+
+def test_backends_are_checked_against_the_designated_reference(model, tmp_path, monkeypatch):
+    # The reference is listed last and is not the first to load
+    monkeypatch.setattr(backends, 'BACKENDS', [
+        _fake_backend('close', noise=0.04),  # Different probabilities, same labels
+        _fake_backend('wrong', flip=0.5),
+        _fake_backend('ref', reference=True),
+    ])
+    select_backend(model, cache_path=tmp_path / 'cache.json', runs=1)
+
+    results = backends._load_cache(tmp_path / 'cache.json')[backends._cache_key(model)]['results']
+    assert results['ref']['agreement'] == 1.0
+    assert results['close']['parity']
+    assert not results['wrong']['parity']
+
+
+def test_parity_batch_reads_images(tmp_path):
+    import cv2
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f'{i}.png'), np.full((30, 20, 3), 40 * i, dtype=np.uint8))
+
+    batch = backends.parity_batch(48, [tmp_path])
+
+    assert batch.shape == (3, 48, 48, 1)
+    assert [int(face[0, 0, 0]) for face in batch] == [0, 40, 80]
+
+
+@pytest.mark.parametrize('name, shape', [
+    ('mini_xception.tflite', (48, 48, 1)),
+    ('mini_xception ha.tflite', (64, 64, 1)),
+])
+def test_tflite_input_shape_from_the_file(name, shape, monkeypatch):
+    # No interpreter may be built for it
+    monkeypatch.setattr(backends.TFLiteBackend, '__init__', None)
+    monkeypatch.setattr(backends.TFLiteRuntimeBackend, '__init__', None)
+    assert backends._tflite_input_shape(MODELS / name) == shape
+
+
+def test_tflite_input_shape_of_other_files(tmp_path):
+    garbage = tmp_path / 'garbage.tflite'
+    garbage.write_bytes(b'\x00' * 16)
+    assert backends._tflite_input_shape(garbage) is None
+    assert backends._tflite_input_shape(MODELS / 'mini_xception.h5') is None
@@ -0,0 +1,49 @@
+import numpy as np
+
+from modules.camera import CameraCapture
+from modules.frame import Frame
+from modules.frame_source import FrameSource
+
+
+def test_get_frame_array_returns_the_bgr_array():
+    camera = CameraCapture()
+    assert camera.get_frame_array() is None
+
+    image = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    camera.current_frame = Frame(image)
+
+    shared = camera.get_frame_array()
+    private = camera.get_frame_array(copy=True)
+    assert isinstance(camera.get_frame(), Frame)
+    np.testing.assert_array_equal(shared, image)
+    assert not shared.flags.writeable
+    assert private.flags.writeable and not np.shares_memory(private, image)
+
+
+class _LatestFrameSource(FrameSource):
+    """Like PipelineDisplaySource: every read returns the newest Frame"""
+
+    realtime = True
+
+    def __init__(self):
+        self.frame = None
+
+    def read(self, out=None):
+        return self.frame is not None, self.frame
+
+
+def test_repeated_source_frames_are_counted_and_gated_once():
+    source = _LatestFrameSource()
+    camera = CameraCapture(frame_source=source, motion_threshold=1.0)
+    camera.capture, camera.is_running = source, True
+    gated = []
+    camera._update_motion = lambda frame, now: gated.append(frame.index)
+
+    for index in (0, 1):
+        source.frame = Frame(np.full((120, 160, 3), 50 * index, dtype=np.uint8), index=index)
+        for _ in range(3):  # Display ticks outpace the pipeline's capture
+            camera.update_frame(0)
+
+    assert camera.frame_count == 2
+    assert gated == [0, 1]
+    camera.is_running = False
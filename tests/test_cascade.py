@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from modules.backends import InferenceBackend
+from modules.emotion_ai import ModelCascade
+from modules.labels import EMOTIONS
+from modules.preprocessing import preprocess_bgr_batch
+
+
+class _TableBackend(InferenceBackend):
+    """Scores a face by its top-left gray level: row v of `table`"""
+
+    name = 'table'
+
+    def __init__(self, table, size=48):
+        super().__init__('table.tflite')
+        self.input_shape = (size, size, 1)
+        self.table = np.asarray(table, dtype=np.float32)
+        self.faces = []
+
+    def run(self, batch):
+        self.faces.extend(face.copy() for face in batch)
+        return self.table[batch[:, 0, 0, 0]]
+
+
+# Row per test face: (scores, decision at margin 0.2 / confidence 0.5)
+CASES = [
+    ([0.05, 0.05, 0.05, 0.7, 0.05, 0.05, 0.05], 'keep'),  # Confident, top-1 in the middle
+    ([0.9, 0.02, 0.02, 0.02, 0.02, 0.01, 0.01], 'keep'),  # Confident, top-1 first
+    ([0.01, 0.01, 0.01, 0.02, 0.02, 0.03, 0.9], 'keep'),  # Confident, top-1 last
+    ([0.05, 0.45, 0.4, 0.05, 0.02, 0.02, 0.01], 'escalate'),  # Runner-up too close
+    ([0.4, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1], 'escalate'),  # Top-1 below min_confidence
+]
+
+
+def _faces(size=48):
+    return np.stack([np.full((size, size, 1), i, dtype=np.uint8) for i in range(len(CASES))])
+
+
+def _cascade(size=48):
+    return ModelCascade(_TableBackend([scores for scores, _ in CASES], size), len(EMOTIONS))
+
+
+@pytest.mark.parametrize('row', range(len(CASES)))
+def test_single_decision_matches_expected(row):
+    scores, decision = CASES[row]
+    probs = _cascade().run(_faces()[row:row + 1])
+
+    assert (probs is not None) == (decision == 'keep')
+    if probs is not None:
+        assert int(np.argmax(probs)) == int(np.argmax(scores))
+        np.testing.assert_allclose(probs, scores)  # The top-1 slot is restored after the search
+
+
+def test_single_and_batch_decisions_agree():
+    cascade, faces = _cascade(), _faces()
+    single = []
+    for row in range(len(faces)):
+        probs = cascade.run(faces[row:row + 1])
+        single.append(None if probs is None else int(np.argmax(probs)))
+
+    preds, escalate = cascade.run_batch(faces)
+
+    assert [s is None for s in single] == escalate.tolist()
+    for row, label in enumerate(single):
+        if label is not None:
+            assert label == int(np.argmax(preds[row]))
+    assert cascade.escalations == 2 * sum(decision == 'escalate' for _, decision in CASES)
+
+
+def test_small_model_with_another_size_gets_the_original_crop():
+    rng = np.random.default_rng(0)
+    roi = rng.integers(0, 4, (120, 100, 3), dtype=np.uint8)  # Gray levels index CASES
+    main_face = preprocess_bgr_batch([roi], 48)
+    cascade = _cascade(size=64)
+
+    cascade.run(main_face, roi)
+    cascade.run_batch(main_face, [roi])
+
+    expected = preprocess_bgr_batch([roi], 64)[0]
+    assert len(cascade.backend.faces) == 2
+    for face in cascade.backend.faces:
+        np.testing.assert_array_equal(face, expected)
@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+import pytest
+
+from kivy.clock import Clock
+
+from modules.emotion_ai import EmotionAI
+from modules.frame import Frame
+from tests.conftest import wait_for
+
+
+@pytest.fixture(scope='module')
+def shared_ai():
+    ai = EmotionAI(instrument=False)
+    yield ai
+    ai.cleanup()
+
+
+@pytest.fixture
+def ai(shared_ai, monkeypatch):
+    """The shared EmotionAI with predict() replaced: it echoes the frame index once `gate` is set"""
+    gate = threading.Event()
+    started = []
+
+    def predict(frame):
+        started.append(frame.index)
+        gate.wait(5.0)
+        return {'index': frame.index}
+
+    monkeypatch.setattr(shared_ai, 'predict', predict)
+    shared_ai.gate, shared_ai.started = gate, started
+    shared_ai.submitted_frames = shared_ai.processed_frames = shared_ai.dropped_frames = 0
+    yield shared_ai
+    gate.set()
+    shared_ai.stop_async()
+
+
+def _frame(index):
+    return Frame(np.zeros((8, 8, 3), dtype=np.uint8), index=index)
+
+
+def test_newest_frame_wins_while_the_worker_is_busy(ai):
+    results = []
+    ai.start_async(results.append)
+    ai.submit_frame(_frame(1))
+    assert wait_for(lambda: ai.started == [1])
+
+    for index in (2, 3, 4):  # Arrive while frame 1 is in predict()
+        ai.submit_frame(_frame(index))
+    ai.gate.set()
+
+    assert wait_for(lambda: len(results) == 2, tick=Clock.tick)
+    assert results == [{'index': 1}, {'index': 4}]
+    assert ai.async_stats()['dropped'] == 2
+
+
+def test_result_of_a_stopped_session_is_not_delivered(ai):
+    first, second = [], []
+    ai.start_async(first.append)
+    ai.submit_frame(_frame(1))
+    assert wait_for(lambda: ai.started == [1])
+
+    ai.stop_async()  # Frame 1 is still in predict()
+    ai.start_async(second.append)
+    ai.gate.set()
+    ai.submit_frame(_frame(2))
+
+    assert wait_for(lambda: second, tick=Clock.tick)
+    Clock.tick()
+    assert first == []
+    assert second == [{'index': 2}]
+
+
+def test_stop_discards_the_pending_frame(ai):
+    results = []
+    ai.start_async(results.append)
+    ai.submit_frame(_frame(1))
+    assert wait_for(lambda: ai.started == [1])
+    ai.submit_frame(_frame(2))
+
+    ai.stop_async()
+    ai.gate.set()
+
+    assert ai._mailbox is None
+    assert ai.started == [1]
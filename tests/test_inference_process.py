@@ -0,0 +1,106 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from kivy.clock import Clock
+
+from modules import inference_process
+from modules.frame import Frame
+from modules.inference_process import InferenceProcess, SharedFrameRing
+from tests.conftest import wait_for
+
+
+def _echo_worker(conn, ring_spec, ai_kwargs):
+    """Stands in for _worker_main: answers with the frame index and pixel value after a delay"""
+    slots, slot_bytes, name = ring_spec
+    ring = SharedFrameRing(slots, slot_bytes, name=name)
+    try:
+        conn.send(('ready', os.getpid()))
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            slot, index, timestamp, shape = message
+            time.sleep(ai_kwargs.get('delay', 0.0))
+            value = int(ring.view(slot, shape)[0, 0, 0])
+            conn.send(('result', slot, index, 0.0, {'index': index, 'value': value}))
+    except (EOFError, BrokenPipeError):
+        pass
+    finally:
+        ring.close()
+
+
+def _frame(index, value=0, shape=(4, 6, 3)):
+    return Frame(np.full(shape, value, dtype=np.uint8), index=index)
+
+
+@pytest.fixture
+def process(monkeypatch):
+    monkeypatch.setattr(inference_process, '_worker_main', _echo_worker)
+    created = []
+
+    def make(**kwargs):
+        created.append(InferenceProcess(**kwargs))
+        return created[-1]
+
+    yield make
+    for p in created:
+        p.cleanup()
+
+
+def test_results_reach_the_callback(process):
+    p = process(ai_kwargs={'delay': 0.0})
+    results = []
+    p.start_async(results.append)
+    p.submit_frame(_frame(1, value=7))
+
+    assert wait_for(lambda: results, tick=Clock.tick)
+    assert results == [{'index': 1, 'value': 7}]
+    assert p.async_stats()['processed'] == 1
+
+
+def test_restart_after_stop_past_result_timeout_keeps_the_worker(process):
+    p = process(ai_kwargs={'delay': 0.3}, result_timeout=0.5)
+    first, second = [], []
+    p.start_async(first.append)
+    p.submit_frame(_frame(1))
+    assert wait_for(lambda: p._in_flight is not None)
+
+    # Leave the screen with the frame still in the worker, come back later
+    p.stop_async()
+    time.sleep(1.0)
+    p.start_async(second.append)
+    p.submit_frame(_frame(2))
+
+    assert wait_for(lambda: second, tick=Clock.tick)
+    Clock.tick()
+    stats = p.async_stats()
+    assert first == []
+    assert second == [{'index': 2, 'value': 0}]
+    assert stats['restarts'] == 0
+    assert stats['lost'] == 0
+
+
+def test_hung_worker_is_restarted(process):
+    p = process(ai_kwargs={'delay': 1.5}, result_timeout=0.3)
+    p.start_async(lambda result: None)
+    p.submit_frame(_frame(1))
+
+    assert wait_for(lambda: p.restarts >= 1)
+    assert p.lost_frames == 1
+    assert not p.failed
+
+
+def test_larger_frame_grows_the_ring(process):
+    p = process(ai_kwargs={'delay': 0.0})
+    results = []
+    p.start_async(results.append)
+    p.submit_frame(_frame(1, value=3))
+    assert wait_for(lambda: results, tick=Clock.tick)
+
+    p.submit_frame(_frame(2, value=5, shape=(8, 12, 3)))
+    assert wait_for(lambda: len(results) == 2, tick=Clock.tick)
+    assert results[1] == {'index': 2, 'value': 5}
+    assert p._ring.slot_bytes == 8 * 12 * 3
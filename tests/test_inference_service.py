@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from modules.inference_service import EmotionInferenceService, EmotionServiceClient
+from modules.labels import EMOTIONS
+from tests.conftest import wait_for
+
+AUTHKEY = b'neuropy-test'
+
+
+class _FakeAI:
+    """Duck-typed EmotionAI: a crop filled with value v is classified as EMOTIONS[v]"""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.batches = []
+
+    def detect_faces(self, frame):
+        return [(frame.bgr, (0, 0, frame.shape[1], frame.shape[0]))]
+
+    def preprocess_faces(self, crops):
+        if any(crop[0, 0, 0] >= len(EMOTIONS) for crop in crops):
+            raise ValueError("unknown label")
+        return np.array([int(crop[0, 0, 0]) for crop in crops])
+
+    def classify_faces(self, labels, face_rois=None):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(len(labels))
+        return np.eye(len(EMOTIONS), dtype=np.float32)[labels]
+
+    def _decode_predictions(self, probs):
+        idx = int(np.argmax(probs))
+        return EMOTIONS[idx], float(probs[idx]), {e: float(probs[i]) for i, e in enumerate(EMOTIONS)}
+
+
+def _crop(label):
+    return np.full((8, 8, 3), label, dtype=np.uint8)
+
+
+@pytest.fixture
+def serve(tmp_path):
+    started = []
+
+    def make(ai, **kwargs):
+        service = EmotionInferenceService(ai, address=f'unix:{tmp_path}/service.sock', authkey=AUTHKEY, **kwargs)
+        thread = threading.Thread(target=service.serve_forever, daemon=True)
+        thread.start()
+        assert wait_for(lambda: service.running)
+        started.append(service)
+        return service
+
+    yield make
+    for service in started:
+        service.stop()  # The accept loop itself only ends with the (daemon) thread
+
+
+def _client(service):
+    return EmotionServiceClient(f'unix:{service.address}', authkey=AUTHKEY)
+
+
+def test_classify_round_trip(serve):
+    service = serve(_FakeAI())
+    client = _client(service)
+    faces = client.classify([_crop(2), _crop(5)])
+    client.cleanup()
+
+    assert [f['emotion'] for f in faces] == [EMOTIONS[2], EMOTIONS[5]]
+    assert service.stats()['served'] == 1
+
+
+def test_failed_batch_is_answered_and_the_batcher_survives(serve):
+    service = serve(_FakeAI())
+    client = _client(service)
+    with pytest.raises(RuntimeError, match="unknown label"):
+        client.classify([_crop(len(EMOTIONS))])
+    faces = client.classify([_crop(4)])
+    client.cleanup()
+
+    assert faces[0]['emotion'] == EMOTIONS[4]
+    assert service.stats()['errors'] == 1
+
+
+def test_stop_answers_queued_requests(serve):
+    gate = threading.Event()
+    service = serve(_FakeAI(gate), max_wait=0.0)
+    replies = {}
+
+    def call(name, label):
+        client = _client(service)
+        try:
+            replies[name] = client.classify([_crop(label)])
+        except RuntimeError as e:
+            replies[name] = e
+        finally:
+            client.cleanup()
+
+    busy = threading.Thread(target=call, args=('busy', 1), daemon=True)
+    busy.start()
+    assert wait_for(lambda: service._claimed == 1)  # The only batcher is stuck in classify_faces
+    queued = threading.Thread(target=call, args=('queued', 2), daemon=True)
+    queued.start()
+    assert wait_for(lambda: len(service.requests) == 1)
+
+    service.stop()
+    queued.join(timeout=2.0)
+    gate.set()
+    busy.join(timeout=2.0)
+
+    assert not queued.is_alive()
+    assert isinstance(replies['queued'], RuntimeError)
+    assert 'shutting down' in str(replies['queued'])
+    assert replies['busy'][0]['emotion'] == EMOTIONS[1]
+
+
+def test_unix_socket_is_private(serve):
+    service = serve(_FakeAI())
+    assert os.stat(service.address).st_mode & 0o777 == 0o600
+
+
+def _classify_concurrently(service, labels):
+    """One connected client per label, all sending at once; returns the replies and the elapsed time"""
+    clients = [_client(service) for _ in labels]
+    for client in clients:
+        client.service_stats()  # Connect first: the batcher waits for every connected client
+    replies = [None] * len(labels)
+    barrier = threading.Barrier(len(labels))
+
+    def call(i):
+        barrier.wait()
+        replies[i] = clients[i].classify([_crop(labels[i])])
+
+    threads = [threading.Thread(target=call, args=(i,), daemon=True) for i in range(len(labels))]
+    t0 = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10.0)
+    elapsed = time.monotonic() - t0
+    for client in clients:
+        client.cleanup()
+    return replies, elapsed
+
+
+def test_requests_from_every_client_share_one_batch(serve):
+    ai = _FakeAI()
+    service = serve(ai, max_wait=5.0)
+    replies, elapsed = _classify_concurrently(service, [1, 3, 6])
+
+    assert [r[0]['emotion'] for r in replies] == [EMOTIONS[1], EMOTIONS[3], EMOTIONS[6]]
+    assert ai.batches == [3]
+    assert service.stats()['requests_per_batch'] == {3: 1}
+    assert elapsed < 5.0  # Closed as soon as every client was in, not at the deadline
+
+
+def test_batch_is_capped_at_max_batch(serve):
+    ai = _FakeAI()
+    service = serve(ai, max_batch=2, max_wait=0.2)
+    replies, _ = _classify_concurrently(service, [0, 2, 4])
+
+    assert [r[0]['emotion'] for r in replies] == [EMOTIONS[0], EMOTIONS[2], EMOTIONS[4]]
+    assert ai.batches == [2, 1]  # The request that did not fit starts the next batch
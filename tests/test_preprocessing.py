@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+from modules.preprocessing import preprocess_bgr_batch, preprocess_bgr_into
+
+
+def test_offline_batch_matches_the_live_path():
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 256, shape, dtype=np.uint8) for shape in ((120, 90, 3), (48, 48, 3), (30, 70, 3))]
+
+    batch = preprocess_bgr_batch(crops, 48)
+
+    for crop, face in zip(crops, batch):
+        live = np.empty((48, 48), dtype=np.uint8)
+        np.testing.assert_array_equal(face[:, :, 0], preprocess_bgr_into(crop, live))
+
+
+def test_stacked_batch_at_model_size_matches_per_crop():
+    rng = np.random.default_rng(1)
+    stacked = rng.integers(0, 256, (5, 48, 48, 3), dtype=np.uint8)
+    out = np.zeros((8, 48, 48, 1), dtype=np.uint8)
+
+    batch = preprocess_bgr_batch(stacked, 48, out=out[:5])
+
+    assert np.shares_memory(batch, out)
+    np.testing.assert_array_equal(batch, preprocess_bgr_batch(list(stacked), 48))
+
+
+def test_gray_image_loaded_as_bgr_keeps_its_gray_levels():
+    gray = np.random.default_rng(2).integers(0, 256, (48, 48), dtype=np.uint8)
+    bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)  # What IMREAD_COLOR makes of a gray file
+
+    np.testing.assert_array_equal(preprocess_bgr_batch(bgr[np.newaxis], 48)[0, :, :, 0], gray)